@@ -2,4 +2,9 @@
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gcagolfapp_backend.settings')
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up because it loads the app's models
+from golf_metrics_app.realtime import ShotStreamApplication  # noqa: E402
+
+application = ShotStreamApplication(django_application)
@@ -36,6 +36,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # ADD THIS FIRST
+    'golf_metrics_app.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,10 +75,13 @@ TEMPLATES = [
 WSGI_APPLICATION = 'gcagolfapp_backend.wsgi.application'
 
 # Database
+# The app is served by Uvicorn (ASGI), where sync code runs on changing executor
+# threads and persistent connections pile up, one per thread; Django recommends
+# closing them after each request there, hence DB_CONN_MAX_AGE defaults to 0.
 DATABASES = {
     'default': dj_database_url.config(
         default=f"postgres://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}",
-        conn_max_age=600
+        conn_max_age=int(os.getenv('DB_CONN_MAX_AGE', '0'))
     )
 }
 if not DATABASES['default'].get('NAME'):
@@ -122,4 +126,116 @@ SPECTACULAR_SETTINGS = {
     'DESCRIPTION': 'API for collecting and retrieving golf launch monitor data.',
     'VERSION': '1.0.0',
     'SERVE_INCLUDE_SCHEMA': False,
-}
\ No newline at end of file
+}
+
+# Launch monitor bulk ingest
+GOLF_INGEST_MAX_ROWS = int(os.getenv('GOLF_INGEST_MAX_ROWS', '50000'))
+GOLF_INGEST_BATCH_SIZE = int(os.getenv('GOLF_INGEST_BATCH_SIZE', '2000'))
+# Batches at least this large use PostgreSQL COPY instead of bulk_create
+GOLF_INGEST_COPY_THRESHOLD = int(os.getenv('GOLF_INGEST_COPY_THRESHOLD', '500'))
+
+# Streaming shot export: rows fetched per server-side cursor round trip
+GOLF_EXPORT_CHUNK_SIZE = int(os.getenv('GOLF_EXPORT_CHUNK_SIZE', '2000'))
+
+# Real-time shot push channel (Server-Sent Events, served by asgi.py)
+GOLF_REALTIME_PATH = os.getenv('GOLF_REALTIME_PATH', '/api/shots/stream/')
+# Dotted path of the broker class; the default fans out within one worker process
+GOLF_REALTIME_BROKER = os.getenv('GOLF_REALTIME_BROKER', 'golf_metrics_app.realtime.InProcessBroker')
+# Events buffered per subscriber before a slow client is disconnected
+GOLF_REALTIME_QUEUE_SIZE = int(os.getenv('GOLF_REALTIME_QUEUE_SIZE', '256'))
+GOLF_REALTIME_KEEPALIVE_SECONDS = int(os.getenv('GOLF_REALTIME_KEEPALIVE_SECONDS', '15'))
+# Missed shots replayed to a reconnecting client
+GOLF_REALTIME_REPLAY_LIMIT = int(os.getenv('GOLF_REALTIME_REPLAY_LIMIT', '500'))
+
+# Response cache for read-heavy endpoints
+# GOLF_CACHE_BACKEND: 'locmem' (per process, LRU culling), 'file' or 'redis' (needs the redis package)
+GOLF_CACHE_ENABLED = os.getenv('GOLF_CACHE_ENABLED', 'True').lower() == 'true'
+GOLF_CACHE_BACKEND = os.getenv('GOLF_CACHE_BACKEND', 'locmem')
+GOLF_CACHE_LOCATION = os.getenv('GOLF_CACHE_LOCATION', '')
+GOLF_CACHE_TIMEOUT = int(os.getenv('GOLF_CACHE_TIMEOUT', '300'))
+GOLF_CACHE_MAX_ENTRIES = int(os.getenv('GOLF_CACHE_MAX_ENTRIES', '5000'))
+GOLF_CACHE_ALIAS = 'golf_responses'
+
+_GOLF_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'golf-responses'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+_golf_cache_backend, _golf_cache_location = _GOLF_CACHE_BACKENDS[GOLF_CACHE_BACKEND]
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    GOLF_CACHE_ALIAS: {
+        'BACKEND': _golf_cache_backend,
+        'LOCATION': GOLF_CACHE_LOCATION or _golf_cache_location,
+        'TIMEOUT': GOLF_CACHE_TIMEOUT,
+    },
+}
+if GOLF_CACHE_BACKEND != 'redis':
+    CACHES[GOLF_CACHE_ALIAS]['OPTIONS'] = {'MAX_ENTRIES': GOLF_CACHE_MAX_ENTRIES}
+
+# Golfer roster import
+GOLF_ROSTER_MAX_ROWS = int(os.getenv('GOLF_ROSTER_MAX_ROWS', '20000'))
+GOLF_ROSTER_BATCH_SIZE = int(os.getenv('GOLF_ROSTER_BATCH_SIZE', '1000'))
+
+# Shot and golfer lists are rendered from values() rows, byte-identical to the serializers
+GOLF_FAST_SERIALIZATION = os.getenv('GOLF_FAST_SERIALIZATION', 'True').lower() == 'true'
+
+# Shot analytics: tournaments whose column arrays each worker process keeps in memory
+GOLF_ANALYTICS_CACHE_SIZE = int(os.getenv('GOLF_ANALYTICS_CACHE_SIZE', '8'))
+
+# Tournament leaderboards: shots kept per metric / shot type / club board
+GOLF_LEADERBOARD_SIZE = int(os.getenv('GOLF_LEADERBOARD_SIZE', '10'))
+
+# Background jobs: 'worker' leaves them queued for `manage.py run_workers`,
+# 'thread' runs each job on a thread of the web process and 'inline' runs it
+# before the enqueueing request returns
+GOLF_JOB_RUNNER = os.getenv('GOLF_JOB_RUNNER', 'thread')
+# Rows removed or detached per DELETE/UPDATE statement (and per transaction) by bulk deletes
+GOLF_DELETE_BATCH_SIZE = int(os.getenv('GOLF_DELETE_BATCH_SIZE', '5000'))
+# Attempts per job, and the delay before the first retry in seconds (doubling after each failure)
+GOLF_JOB_MAX_ATTEMPTS = int(os.getenv('GOLF_JOB_MAX_ATTEMPTS', '3'))
+GOLF_JOB_RETRY_DELAY = int(os.getenv('GOLF_JOB_RETRY_DELAY', '30'))
+# Running jobs without a progress heartbeat for this many seconds are treated as abandoned
+GOLF_JOB_STALE_SECONDS = int(os.getenv('GOLF_JOB_STALE_SECONDS', '900'))
+# Worker processes started by `manage.py run_workers`
+GOLF_WORKER_PROCESSES = int(os.getenv('GOLF_WORKER_PROCESSES', '2'))
+# Directory background exports are written to
+GOLF_JOB_OUTPUT_DIR = os.getenv('GOLF_JOB_OUTPUT_DIR', str(BASE_DIR / 'job_output'))
+# Per-request latency, SQL and serializer metrics, scraped from /api/_metrics
+GOLF_METRICS_ENABLED = os.getenv('GOLF_METRICS_ENABLED', 'True').lower() == 'true'
+# Requests at least this slow (milliseconds, 0 to disable) are logged with their most repeated SQL
+GOLF_SLOW_REQUEST_MS = int(os.getenv('GOLF_SLOW_REQUEST_MS', '1000'))
+GOLF_SLOW_REQUEST_TOP_SQL = int(os.getenv('GOLF_SLOW_REQUEST_TOP_SQL', '5'))
+# Shots embedded in golfer detail responses by default, and the most ?shot_limit= can ask for
+GOLF_NESTED_SHOT_LIMIT = int(os.getenv('GOLF_NESTED_SHOT_LIMIT', '50'))
+GOLF_NESTED_SHOT_MAX_LIMIT = int(os.getenv('GOLF_NESTED_SHOT_MAX_LIMIT', '500'))
+# Micro-batched single-shot POSTs (?buffered=true): 202 with a provisional ID, written in
+# one bulk insert every GOLF_SHOT_BUFFER_MAX_ROWS shots or GOLF_SHOT_BUFFER_MAX_DELAY_MS
+GOLF_SHOT_BUFFER_ENABLED = os.getenv('GOLF_SHOT_BUFFER_ENABLED', 'False').lower() == 'true'
+GOLF_SHOT_BUFFER_MAX_ROWS = int(os.getenv('GOLF_SHOT_BUFFER_MAX_ROWS', '200'))
+GOLF_SHOT_BUFFER_MAX_DELAY_MS = int(os.getenv('GOLF_SHOT_BUFFER_MAX_DELAY_MS', '50'))
+# 'memory' (lost if the process dies), 'spill' (append-only spill file, survives a process
+# crash) or 'fsync' (spill file synced to disk before the 202, survives power loss)
+GOLF_SHOT_BUFFER_DURABILITY = os.getenv('GOLF_SHOT_BUFFER_DURABILITY', 'spill')
+GOLF_SHOT_BUFFER_SPILL_DIR = os.getenv('GOLF_SHOT_BUFFER_SPILL_DIR', str(BASE_DIR / 'shot_buffer'))
+# Shots waiting to be written before POSTs are refused with 503
+GOLF_SHOT_BUFFER_MAX_PENDING = int(os.getenv('GOLF_SHOT_BUFFER_MAX_PENDING', '20000'))
+# Spill files untouched this long belong to a dead process and are written by the next buffer
+GOLF_SHOT_BUFFER_ORPHAN_SECONDS = int(os.getenv('GOLF_SHOT_BUFFER_ORPHAN_SECONDS', '60'))
+# Attempts at a failing batch before its shots are given up on, and where shots the database
+# refuses are written instead (one NDJSON file per process, each line with the error)
+GOLF_SHOT_BUFFER_MAX_ATTEMPTS = int(os.getenv('GOLF_SHOT_BUFFER_MAX_ATTEMPTS', '5'))
+GOLF_SHOT_BUFFER_DEAD_LETTER_DIR = os.getenv(
+    'GOLF_SHOT_BUFFER_DEAD_LETTER_DIR', str(Path(GOLF_SHOT_BUFFER_SPILL_DIR) / 'dead_letter')
+)
+# Idempotent shot ingestion: ingest keys (and shot IDs) each process remembers in an LRU, and
+# keys tracked by its Bloom filter so unseen submissions skip the duplicate lookup
+GOLF_IDEMPOTENCY_CACHE_SIZE = int(os.getenv('GOLF_IDEMPOTENCY_CACHE_SIZE', '50000'))
+GOLF_IDEMPOTENCY_BLOOM_CAPACITY = int(os.getenv('GOLF_IDEMPOTENCY_BLOOM_CAPACITY', '1000000'))
+
+# Monthly Shot table partitions on PostgreSQL (manage.py manage_shot_partitions): months created
+# ahead of time, and whole months kept attached before finished tournaments are archived (0 keeps all)
+GOLF_SHOT_PARTITION_MONTHS_AHEAD = int(os.getenv('GOLF_SHOT_PARTITION_MONTHS_AHEAD', '3'))
+GOLF_SHOT_PARTITION_RETAIN_MONTHS = int(os.getenv('GOLF_SHOT_PARTITION_RETAIN_MONTHS', '0'))
@@ -26,6 +26,9 @@ class TournamentAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_counts()
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -49,6 +52,9 @@ class GroupAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_golfer_count()
+
     def is_full(self, obj):
         return obj.is_full
 
@@ -95,7 +101,7 @@ class GolferAdmin(admin.ModelAdmin):
 class ShotAdmin(admin.ModelAdmin):
     list_display = ['shot_number', 'golfer', 'shot_type', 'club_used', 'carry_distance', 'total_distance',
                     'is_simulated', 'timestamp']
-    list_filter = ['shot_type', 'club_used', 'is_simulated', 'timestamp', 'golfer__group__tournament']
+    list_filter = ['shot_type', 'club_used', 'is_simulated', 'timestamp', 'tournament']
     search_fields = ['shot_number', 'golfer__first_name', 'golfer__last_name', 'golfer__golfer_id', 'notes']
     readonly_fields = ['created_at', 'updated_at', 'smash_factor', 'tournament', 'group']
     raw_id_fields = ['golfer']
@@ -0,0 +1,332 @@
+﻿import threading
+from collections import Counter
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, Min, Q, Sum
+
+from . import leaderboards
+from .models import AGGREGATE_METRICS, Shot, ShotAggregate
+
+# ShotAggregate key field -> Shot lookup that produces it
+BUCKET_LOOKUPS = {
+    'golfer_id': 'golfer_id',
+    'group_id': 'group_id',
+    'tournament_id': 'tournament_id',
+    'club_used': 'club_used',
+    'shot_type': 'shot_type',
+}
+KEY_FIELDS = list(BUCKET_LOOKUPS)
+STRING_KEY_FIELDS = ('club_used', 'shot_type')
+
+# Absolute difference tolerated by the consistency checker (SQLite sums in floating point)
+SUM_TOLERANCE = Decimal('0.01')
+
+_state = threading.local()
+
+
+@contextmanager
+def suspended():
+    """Skip per-shot maintenance while a bulk operation refreshes buckets itself"""
+    previous = getattr(_state, 'suspended', False)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def is_suspended():
+    return getattr(_state, 'suspended', False)
+
+
+def _bucket_key(values):
+    """Build the sentinel-normalized key tuple for a row of key values"""
+    return tuple(
+        values[name] or ('' if name in STRING_KEY_FIELDS else 0)
+        for name in KEY_FIELDS
+    )
+
+
+def _shot_filter(key):
+    """Q object selecting the shots that belong to a bucket key"""
+    query = Q()
+    for name, value in zip(KEY_FIELDS, key):
+        lookup = BUCKET_LOOKUPS[name]
+        if name == 'club_used' and not value:
+            query &= Q(club_used__isnull=True) | Q(club_used='')
+        elif not value:
+            query &= Q(**{f'{lookup}__isnull': True})
+        else:
+            query &= Q(**{lookup: value})
+    return query
+
+
+class BucketDelta:
+    """Accumulated change to one bucket from added and removed shots"""
+
+    def __init__(self):
+        self.count = 0
+        self.metric_counts = Counter()
+        self.sums = {metric: Decimal(0) for metric in AGGREGATE_METRICS}
+        self.sums_sq = {metric: Decimal(0) for metric in AGGREGATE_METRICS}
+        self.added = {metric: [] for metric in AGGREGATE_METRICS}
+        self.removed = {metric: [] for metric in AGGREGATE_METRICS}
+
+    def add(self, values, sign):
+        self.count += sign
+        for metric in AGGREGATE_METRICS:
+            value = values.get(metric)
+            if value is None:
+                continue
+            value = Decimal(value)
+            self.metric_counts[metric] += sign
+            self.sums[metric] += sign * value
+            self.sums_sq[metric] += sign * value * value
+            (self.added if sign > 0 else self.removed)[metric].append(value)
+
+
+def _entries_for_queryset(queryset):
+    """Return (key, metric values) pairs for the shots in ``queryset``"""
+    rows = queryset.values(*BUCKET_LOOKUPS.values(), *AGGREGATE_METRICS)
+    return [
+        (_bucket_key({name: row[lookup] for name, lookup in BUCKET_LOOKUPS.items()}), row)
+        for row in rows
+    ]
+
+
+def entries_for_shots(shots):
+    """Return (key, metric values) pairs for in-memory shots with their placement set"""
+    return [
+        (
+            _bucket_key({name: getattr(shot, name) for name in KEY_FIELDS}),
+            {metric: getattr(shot, metric) for metric in AGGREGATE_METRICS}
+        )
+        for shot in shots
+    ]
+
+
+def entries_for_pk(pk):
+    """Return the stored (key, metric values) pair for one shot, or None"""
+    entries = _entries_for_queryset(Shot.objects.filter(pk=pk))
+    return entries[0] if entries else None
+
+
+def apply(added=(), removed=()):
+    """Fold added and removed (key, values) entries into the stored buckets"""
+    deltas = {}
+    for entries, sign in ((added, 1), (removed, -1)):
+        for key, values in entries:
+            deltas.setdefault(key, BucketDelta()).add(values, sign)
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        # Lock buckets in a stable order so concurrent writers cannot deadlock
+        for key in sorted(deltas):
+            _apply_delta(key, deltas[key])
+
+
+def _apply_delta(key, delta):
+    bucket, _ = ShotAggregate.objects.select_for_update().get_or_create(**dict(zip(KEY_FIELDS, key)))
+    bucket.shot_count += delta.count
+    if bucket.shot_count <= 0:
+        bucket.delete()
+        return
+
+    stale_extremes = []
+    for metric in AGGREGATE_METRICS:
+        count = getattr(bucket, f'{metric}_count') + delta.metric_counts[metric]
+        setattr(bucket, f'{metric}_count', count)
+        setattr(bucket, f'{metric}_sum', getattr(bucket, f'{metric}_sum') + delta.sums[metric])
+        setattr(bucket, f'{metric}_sum_sq', getattr(bucket, f'{metric}_sum_sq') + delta.sums_sq[metric])
+
+        current_min = getattr(bucket, f'{metric}_min')
+        current_max = getattr(bucket, f'{metric}_max')
+        if count <= 0:
+            setattr(bucket, f'{metric}_min', None)
+            setattr(bucket, f'{metric}_max', None)
+            continue
+        # Removing the current extreme means the new one has to be read back
+        if any(
+            current_min is None or current_max is None or value <= current_min or value >= current_max
+            for value in delta.removed[metric]
+        ):
+            stale_extremes.append(metric)
+            continue
+        candidates = delta.added[metric] + [value for value in (current_min, current_max) if value is not None]
+        if candidates:
+            setattr(bucket, f'{metric}_min', min(candidates))
+            setattr(bucket, f'{metric}_max', max(candidates))
+
+    if stale_extremes:
+        extremes = {}
+        for metric in stale_extremes:
+            extremes[f'{metric}_min'] = Min(metric)
+            extremes[f'{metric}_max'] = Max(metric)
+        for name, value in Shot.objects.filter(_shot_filter(key)).aggregate(**extremes).items():
+            setattr(bucket, name, value)
+    bucket.save()
+
+
+def compute_buckets(queryset):
+    """Aggregate ``queryset`` into unsaved ShotAggregate rows, one per bucket"""
+    annotations = {'shot_count': Count('id')}
+    for metric in AGGREGATE_METRICS:
+        annotations[f'{metric}_count'] = Count(metric)
+        annotations[f'{metric}_sum'] = Sum(metric, output_field=DecimalField(max_digits=20, decimal_places=2))
+        annotations[f'{metric}_sum_sq'] = Sum(
+            F(metric) * F(metric), output_field=DecimalField(max_digits=24, decimal_places=4)
+        )
+        annotations[f'{metric}_min'] = Min(metric)
+        annotations[f'{metric}_max'] = Max(metric)
+
+    rows = queryset.order_by().values(*BUCKET_LOOKUPS.values()).annotate(**annotations)
+    buckets = {}
+    for row in rows:
+        key = _bucket_key({name: row[lookup] for name, lookup in BUCKET_LOOKUPS.items()})
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = ShotAggregate(**dict(zip(KEY_FIELDS, key)))
+        # NULL and '' clubs share a bucket, so rows are merged rather than assigned
+        bucket.shot_count += row['shot_count']
+        for metric in AGGREGATE_METRICS:
+            for suffix in ('count', 'sum', 'sum_sq'):
+                name = f'{metric}_{suffix}'
+                setattr(bucket, name, getattr(bucket, name) + (row[name] or 0))
+            for suffix, pick in (('min', min), ('max', max)):
+                name = f'{metric}_{suffix}'
+                values = [value for value in (getattr(bucket, name), row[name]) if value is not None]
+                setattr(bucket, name, pick(values) if values else None)
+    return list(buckets.values())
+
+
+def refresh_golfers(golfer_ids):
+    """Recompute every bucket of the given golfers; None covers shots without a golfer"""
+    golfer_ids = set(golfer_ids)
+    assigned = [golfer_id for golfer_id in golfer_ids if golfer_id]
+    bucket_filter = Q(golfer_id__in=assigned)
+    shot_filter = Q(golfer_id__in=assigned)
+    if None in golfer_ids or 0 in golfer_ids:
+        bucket_filter |= Q(golfer_id=0)
+        shot_filter |= Q(golfer__isnull=True)
+
+    with transaction.atomic():
+        stale = ShotAggregate.objects.filter(bucket_filter)
+        tournament_ids = set(stale.values_list('tournament_id', flat=True))
+        stale.delete()
+        buckets = ShotAggregate.objects.bulk_create(compute_buckets(Shot.objects.filter(shot_filter)))
+        # Leaderboards rank the same shots, so the tournaments they moved in or out of are rebuilt
+        leaderboards.invalidate(tournament_ids | {bucket.tournament_id for bucket in buckets})
+
+
+def golfers_in_buckets(**filters):
+    """Golfer IDs (None for unassigned) that have buckets matching ``filters``"""
+    return {
+        golfer_id or None
+        for golfer_id in ShotAggregate.objects.filter(**filters).values_list('golfer_id', flat=True).distinct()
+    }
+
+
+def rebuild_all(batch_size=1000):
+    """Discard the aggregate store and rebuild it from the Shot table"""
+    with transaction.atomic():
+        ShotAggregate.objects.all().delete()
+        buckets = compute_buckets(Shot.objects.all())
+        ShotAggregate.objects.bulk_create(buckets, batch_size=batch_size)
+        leaderboards.invalidate()
+    return len(buckets)
+
+
+def run_rebuild(job, batch_size=1000):
+    """Job handler for rebuild_aggregates"""
+    return {'bucket_count': rebuild_all(batch_size=batch_size)}
+
+
+def find_inconsistencies():
+    """Compare stored buckets with a fresh computation and describe every difference"""
+    expected = {_bucket_key(vars(bucket)): bucket for bucket in compute_buckets(Shot.objects.all())}
+    stored = {_bucket_key(vars(bucket)): bucket for bucket in ShotAggregate.objects.all()}
+
+    problems = []
+    for key in sorted(set(expected) | set(stored)):
+        if key not in stored:
+            problems.append({'bucket': key, 'problem': 'missing'})
+            continue
+        if key not in expected:
+            problems.append({'bucket': key, 'problem': 'unexpected'})
+            continue
+        mismatched = []
+        names = ['shot_count'] + [
+            f'{metric}_{suffix}'
+            for metric in AGGREGATE_METRICS
+            for suffix in ('count', 'sum', 'sum_sq', 'min', 'max')
+        ]
+        for name in names:
+            want = getattr(expected[key], name)
+            have = getattr(stored[key], name)
+            if want is None or have is None:
+                if want != have:
+                    mismatched.append(name)
+            elif abs(Decimal(want) - Decimal(have)) > SUM_TOLERANCE:
+                mismatched.append(name)
+        if mismatched:
+            problems.append({'bucket': key, 'problem': 'mismatch', 'fields': mismatched})
+    return problems
+
+
+def read_statistics(**filters):
+    """Build the ShotViewSet.statistics payload from the buckets matching ``filters``"""
+    totals = Counter()
+    minimums = {}
+    maximums = {}
+    shot_types = Counter()
+    clubs = Counter()
+    club_smash = {}
+
+    for bucket in ShotAggregate.objects.filter(**filters):
+        totals['shots'] += bucket.shot_count
+        shot_types[bucket.shot_type] += bucket.shot_count
+        if bucket.club_used:
+            clubs[bucket.club_used] += bucket.shot_count
+            count, total, highest = club_smash.get(bucket.club_used, (0, 0, None))
+            if bucket.smash_factor_max is not None:
+                highest = bucket.smash_factor_max if highest is None else max(highest, bucket.smash_factor_max)
+            club_smash[bucket.club_used] = (
+                count + bucket.smash_factor_count, total + bucket.smash_factor_sum, highest
+            )
+        for metric in AGGREGATE_METRICS:
+            totals[f'{metric}_count'] += getattr(bucket, f'{metric}_count')
+            totals[f'{metric}_sum'] += getattr(bucket, f'{metric}_sum')
+            for extremes, name, pick in ((minimums, 'min', min), (maximums, 'max', max)):
+                value = getattr(bucket, f'{metric}_{name}')
+                if value is not None:
+                    extremes[metric] = value if metric not in extremes else pick(extremes[metric], value)
+
+    def average(metric):
+        count = totals[f'{metric}_count']
+        return totals[f'{metric}_sum'] / count if count else None
+
+    statistics = {'total_shots': totals['shots']}
+    for metric in AGGREGATE_METRICS:
+        statistics[f'avg_{metric}'] = average(metric)
+    for name, extremes in (('max', maximums), ('min', minimums)):
+        for metric in ('ball_speed', 'carry_distance', 'total_distance', 'smash_factor'):
+            statistics[f'{name}_{metric}'] = extremes.get(metric)
+
+    return {
+        'statistics': statistics,
+        'shot_type_breakdown': [
+            {'shot_type': shot_type, 'count': count} for shot_type, count in shot_types.most_common()
+        ],
+        'club_breakdown': [
+            {
+                'club_used': club,
+                'count': count,
+                'avg_smash_factor': club_smash[club][1] / club_smash[club][0] if club_smash[club][0] else None,
+                'max_smash_factor': club_smash[club][2],
+            }
+            for club, count in clubs.most_common()
+        ],
+    }
@@ -0,0 +1,281 @@
+﻿import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from . import caching
+from .models import Shot
+
+# Launch monitor columns loaded as float32 arrays, each with a validity mask
+METRICS = [
+    'ball_speed', 'club_head_speed', 'launch_angle', 'spin_rate',
+    'carry_distance', 'total_distance', 'side_angle', 'smash_factor',
+]
+DEFAULT_PERCENTILES = [10, 25, 50, 75, 90]
+MAX_BINS = 200
+MIN_ELLIPSE_SHOTS = 3
+
+CLUB_ORDER = [club for club, _ in Shot.CLUB_CHOICES]
+
+
+class AnalyticsError(Exception):
+    pass
+
+
+def _encode(values):
+    """Integer codes and the category list for a column of strings (None becomes -1)"""
+    categories = sorted({value for value in values if value is not None})
+    lookup = {category: code for code, category in enumerate(categories)}
+    return np.fromiter((lookup.get(value, -1) for value in values), dtype=np.int16, count=len(values)), categories
+
+
+def _ids(values):
+    return np.fromiter((-1 if value is None else value for value in values), dtype=np.int64, count=len(values))
+
+
+class ShotColumns:
+    """
+    Columnar snapshot of a tournament's shots (or of all shots).
+
+    Metrics are float32 arrays holding 0 where the value is null, paired with
+    boolean masks marking the values that are present.
+    """
+
+    def __init__(self, rows):
+        columns = list(zip(*rows)) if rows else [()] * (5 + len(METRICS))
+        golfer, group, hole, shot_type, club, *metrics = columns
+        self.size = len(rows)
+        self.golfer = _ids(golfer)
+        self.group = _ids(group)
+        self.hole = np.fromiter((0 if value is None else value for value in hole), dtype=np.int16, count=self.size)
+        self.shot_type, self.shot_types = _encode(shot_type)
+        self.club, self.clubs = _encode(club)
+        self.values = {}
+        self.valid = {}
+        for name, column in zip(METRICS, metrics):
+            array = np.array(column, dtype=np.float32)
+            valid = ~np.isnan(array)
+            array[~valid] = 0
+            self.values[name] = array
+            self.valid[name] = valid
+
+    @classmethod
+    def load(cls, tournament_id=None):
+        shots = Shot.objects.all()
+        if tournament_id is not None:
+            shots = shots.for_tournament(tournament_id)
+        # Cast in the database so rows arrive as floats instead of Decimals
+        rows = list(shots.values_list(
+            'golfer_id', 'group_id', 'hole_number', 'shot_type', 'club_used',
+            *[Cast(name, FloatField()) for name in METRICS]
+        ))
+        return cls(rows)
+
+    @property
+    def nbytes(self):
+        arrays = [self.golfer, self.group, self.hole, self.shot_type, self.club,
+                  *self.values.values(), *self.valid.values()]
+        return sum(array.nbytes for array in arrays)
+
+    def select(self, golfer_id=None, group_id=None, unassigned=False, shot_type=None, club_used=None,
+               hole_number=None):
+        """Boolean mask of the shots matching the filters"""
+        mask = np.ones(self.size, dtype=bool)
+        if golfer_id is not None:
+            mask &= self.golfer == golfer_id
+        if group_id is not None:
+            mask &= self.group == group_id
+        if unassigned:
+            mask &= self.golfer == -1
+        if shot_type is not None:
+            mask &= self._category_mask(self.shot_type, self.shot_types, shot_type)
+        if club_used is not None:
+            mask &= self._category_mask(self.club, self.clubs, club_used)
+        if hole_number is not None:
+            mask &= self.hole == hole_number
+        return mask
+
+    @staticmethod
+    def _category_mask(codes, categories, value):
+        if value not in categories:
+            return np.zeros(len(codes), dtype=bool)
+        return codes == categories.index(value)
+
+
+# Per-process array cache
+#
+# Arrays are kept per tournament together with the shot version counters they
+# were loaded under (see caching.py). Every shot write bumps those counters,
+# so a stale entry is detected on the next read and reloaded.
+
+_columns = OrderedDict()
+_columns_lock = threading.Lock()
+
+
+def get_columns(tournament_id=None):
+    """Return the ShotColumns of a tournament, or of all shots when None"""
+    versions = caching.current_versions(('shot',), tournament_id)
+    with _columns_lock:
+        entry = _columns.get(tournament_id)
+        if entry is not None and entry[0] == versions:
+            _columns.move_to_end(tournament_id)
+            return entry[1]
+
+    columns = ShotColumns.load(tournament_id)
+    with _columns_lock:
+        _columns[tournament_id] = (versions, columns)
+        _columns.move_to_end(tournament_id)
+        while len(_columns) > settings.GOLF_ANALYTICS_CACHE_SIZE:
+            _columns.popitem(last=False)
+    return columns
+
+
+# Vectorized summaries
+
+def _round(value, digits=2):
+    return None if value is None or not math.isfinite(value) else round(float(value), digits)
+
+
+def describe(values, percentiles, bins, digits=2):
+    """Count, mean, standard deviation, range, percentiles and histogram of ``values``"""
+    if not len(values):
+        return {'count': 0}
+    wide = values.astype(np.float64)
+    counts, edges = np.histogram(wide, bins=bins)
+    return {
+        'count': int(len(wide)),
+        'mean': _round(wide.mean(), digits),
+        'std': _round(wide.std(ddof=1), digits) if len(wide) > 1 else None,
+        'min': _round(wide.min(), digits),
+        'max': _round(wide.max(), digits),
+        'percentiles': {
+            f'p{percentile:g}': _round(value, digits)
+            for percentile, value in zip(percentiles, np.percentile(wide, percentiles))
+        },
+        'histogram': {
+            'edges': [_round(edge, digits) for edge in edges],
+            'counts': counts.tolist(),
+        },
+    }
+
+
+def dispersion_ellipse(lateral, carry, confidence):
+    """
+    Confidence ellipse of landing points, in yards.
+
+    ``lateral`` is the offline distance (carry times the sine of the side
+    angle). The axes come from the eigen decomposition of the covariance
+    matrix, scaled by the chi-squared quantile with two degrees of freedom.
+    """
+    if len(carry) < MIN_ELLIPSE_SHOTS:
+        return None
+    points = np.vstack([lateral, carry]).astype(np.float64)
+    eigenvalues, eigenvectors = np.linalg.eigh(np.cov(points))
+    eigenvalues = np.clip(eigenvalues, 0, None)
+    scale = math.sqrt(-2 * math.log(1 - confidence))
+    major = eigenvectors[:, 1]
+    return {
+        'count': int(len(carry)),
+        'confidence': confidence,
+        'center': {'lateral': _round(points[0].mean()), 'carry': _round(points[1].mean())},
+        'semi_major_axis': _round(scale * math.sqrt(eigenvalues[1])),
+        'semi_minor_axis': _round(scale * math.sqrt(eigenvalues[0])),
+        # Angle of the major axis measured from the lateral axis
+        'angle_degrees': _round(math.degrees(math.atan2(major[1], major[0])) % 180),
+        'lateral_std': _round(points[0].std(ddof=1)),
+        'carry_std': _round(points[1].std(ddof=1)),
+    }
+
+
+def landing_points(columns, mask):
+    """(lateral, carry, club code) arrays for selected shots with carry and side angle"""
+    usable = mask & columns.valid['carry_distance'] & columns.valid['side_angle']
+    carry = columns.values['carry_distance'][usable]
+    lateral = carry * np.sin(np.radians(columns.values['side_angle'][usable]))
+    return lateral, carry, columns.club[usable]
+
+
+def club_gapping(columns, mask):
+    """
+    Carry and total distance per club in bag order, with the gap to the next club.
+
+    Medians are taken from one lexsort of (club, carry) instead of a pass per club.
+    """
+    usable = mask & columns.valid['carry_distance'] & (columns.club >= 0)
+    codes = columns.club[usable]
+    if not len(codes):
+        return []
+    carry = columns.values['carry_distance'][usable].astype(np.float64)
+    order = np.lexsort((carry, codes))
+    codes, carry = codes[order], carry[order]
+    present, starts, counts = np.unique(codes, return_index=True, return_counts=True)
+    medians = (carry[starts + (counts - 1) // 2] + carry[starts + counts // 2]) / 2
+    means = np.add.reduceat(carry, starts) / counts
+    spreads = np.sqrt(np.maximum(np.add.reduceat(carry ** 2, starts) / counts - means ** 2, 0))
+
+    with_total = mask & columns.valid['total_distance'] & (columns.club >= 0)
+    total_sums = np.bincount(columns.club[with_total], weights=columns.values['total_distance'][with_total],
+                             minlength=len(columns.clubs))
+    total_counts = np.bincount(columns.club[with_total], minlength=len(columns.clubs))
+
+    rows = []
+    for code, count, median, mean, spread in zip(present, counts, medians, means, spreads):
+        club = columns.clubs[code]
+        rows.append({
+            'club_used': club,
+            'count': int(count),
+            'median_carry': _round(median),
+            'mean_carry': _round(mean),
+            'carry_std': _round(spread),
+            'mean_total': _round(total_sums[code] / total_counts[code]) if total_counts[code] else None,
+        })
+    rows.sort(key=lambda row: CLUB_ORDER.index(row['club_used']) if row['club_used'] in CLUB_ORDER else len(CLUB_ORDER))
+    for row, shorter in zip(rows, rows[1:] + [None]):
+        row['gap_to_next'] = _round(row['median_carry'] - shorter['median_carry']) if shorter else None
+    return rows
+
+
+def analyze(tournament_id=None, filters=None, metrics=None, percentiles=None, bins=20, confidence=0.95):
+    """Distributions, smash factor, dispersion and gapping for the filtered shots of a tournament"""
+    metrics = metrics or METRICS
+    percentiles = percentiles or DEFAULT_PERCENTILES
+    unknown = [name for name in metrics if name not in METRICS]
+    if unknown:
+        raise AnalyticsError(f"Unknown metrics: {', '.join(unknown)}. Choose from: {', '.join(METRICS)}")
+    if any(not 0 <= percentile <= 100 for percentile in percentiles):
+        raise AnalyticsError("Percentiles must be between 0 and 100.")
+    if not 1 <= bins <= MAX_BINS:
+        raise AnalyticsError(f"bins must be between 1 and {MAX_BINS}.")
+    if not 0 < confidence < 1:
+        raise AnalyticsError("confidence must be between 0 and 1.")
+
+    columns = get_columns(tournament_id)
+    mask = columns.select(**(filters or {}))
+
+    lateral, carry, clubs = landing_points(columns, mask)
+    by_club = {}
+    for code in np.unique(clubs[clubs >= 0]):
+        ellipse = dispersion_ellipse(lateral[clubs == code], carry[clubs == code], confidence)
+        if ellipse:
+            by_club[columns.clubs[code]] = ellipse
+
+    return {
+        'tournament_id': tournament_id,
+        'shot_count': int(mask.sum()),
+        'metrics': {
+            name: describe(columns.values[name][mask & columns.valid[name]], percentiles, bins)
+            for name in metrics
+        },
+        'smash_factor': describe(
+            columns.values['smash_factor'][mask & columns.valid['smash_factor']], percentiles, bins
+        ),
+        'dispersion': {
+            'overall': dispersion_ellipse(lateral, carry, confidence),
+            'by_club': by_club,
+        },
+        'club_gapping': club_gapping(columns, mask),
+    }
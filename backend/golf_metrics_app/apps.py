@@ -3,3 +3,6 @@
 class GolfMetricsAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'golf_metrics_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
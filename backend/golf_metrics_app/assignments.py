@@ -0,0 +1,155 @@
+﻿from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from . import aggregates, caching
+from .models import Golfer, Group, Shot
+
+
+class AssignmentError(Exception):
+    pass
+
+
+def lock_groups(group_ids):
+    """Lock the groups in primary-key order so concurrent assignments cannot deadlock"""
+    groups = {
+        group.id: group
+        for group in Group.objects.select_for_update().filter(id__in=group_ids).order_by('id')
+    }
+    missing = set(group_ids) - set(groups)
+    if missing:
+        raise AssignmentError(f"Groups with IDs {sorted(missing)} do not exist.")
+    return groups
+
+
+def golfer_counts(group_ids):
+    return dict(
+        Golfer.objects.filter(group_id__in=group_ids)
+        .order_by()
+        .values('group_id')
+        .annotate(count=Count('id'))
+        .values_list('group_id', 'count')
+    )
+
+
+def _apply_plan(groups, plan, counts, reattribute_shots):
+    """
+    Move golfers into locked groups with a single UPDATE.
+
+    ``plan`` maps group IDs to golfer IDs and ``counts`` holds the golfer
+    counts read after locking. Raises AssignmentError without writing
+    anything if a golfer is missing or a group would overflow.
+    """
+    destinations = {}
+    for group_id, golfer_ids in plan.items():
+        for golfer_id in golfer_ids:
+            if destinations.setdefault(golfer_id, group_id) != group_id:
+                raise AssignmentError(f"Golfer {golfer_id} is assigned to more than one group.")
+
+    current = dict(Golfer.objects.filter(id__in=destinations).values_list('id', 'group_id'))
+    missing = set(destinations) - set(current)
+    if missing:
+        raise AssignmentError(f"Golfers with IDs {sorted(missing)} do not exist.")
+
+    moving = {golfer_id: group_id for golfer_id, group_id in destinations.items() if current[golfer_id] != group_id}
+    final_counts = dict(counts)
+    for golfer_id, group_id in moving.items():
+        final_counts[group_id] = final_counts.get(group_id, 0) + 1
+        if current[golfer_id] in final_counts:
+            final_counts[current[golfer_id]] -= 1
+    for group_id, group in groups.items():
+        incoming = final_counts.get(group_id, 0) - counts.get(group_id, 0)
+        if final_counts.get(group_id, 0) > group.max_golfers:
+            available = max(0, group.max_golfers - counts.get(group_id, 0))
+            raise AssignmentError(
+                f"{group.display_name} only has {available} available spots, "
+                f"but you're trying to assign {incoming} golfers."
+            )
+
+    if moving:
+        if len(groups) == 1:
+            Golfer.objects.filter(id__in=moving).update(group_id=next(iter(groups)))
+        else:
+            Golfer.objects.filter(id__in=moving).update(group_id=Case(
+                *[When(id=golfer_id, then=Value(group_id)) for golfer_id, group_id in moving.items()],
+                output_field=IntegerField()
+            ))
+        caching.bump('golfer')
+
+    attribute_shots(plan, groups, reattribute_shots)
+
+    return {
+        'assigned_count': len(destinations),
+        'moved_count': len(moving),
+        'groups': [
+            {
+                'group_id': group_id,
+                'assigned_count': len(plan.get(group_id, ())),
+                'available_spots': max(0, group.max_golfers - final_counts.get(group_id, 0)),
+            }
+            for group_id, group in groups.items()
+        ],
+    }
+
+
+def attribute_shots(plan, groups, reattribute_shots=False):
+    """
+    Point the shots of newly placed golfers at their group.
+
+    Shots keep the group they were recorded in unless ``reattribute_shots``
+    is set; shots recorded while the golfer had no group always move.
+    """
+    reattributed = set()
+    for group_id, golfer_ids in plan.items():
+        shots = Shot.objects.filter(golfer_id__in=golfer_ids)
+        if not reattribute_shots:
+            shots = shots.filter(group__isnull=True)
+        if shots.attribute_to_group(groups[group_id]):
+            reattributed.update(golfer_ids)
+    if reattributed:
+        caching.bump('shot')
+        aggregates.refresh_golfers(reattributed)
+    return reattributed
+
+
+def assign_golfers(plan, reattribute_shots=False):
+    """Assign golfers to groups (``{group_id: [golfer_id, ...]}``) all or nothing"""
+    plan = {group_id: list(dict.fromkeys(golfer_ids)) for group_id, golfer_ids in plan.items()}
+    with transaction.atomic():
+        groups = lock_groups(plan)
+        return _apply_plan(groups, plan, golfer_counts(groups), reattribute_shots)
+
+
+def auto_fill_tournament(tournament_id, golfer_ids=None, reattribute_shots=False):
+    """
+    Fill the open spots of a tournament's groups in group number order.
+
+    Uses ``golfer_ids`` in the given order, or every active unassigned golfer
+    by name. Golfers that do not fit are reported as unplaced.
+    """
+    with transaction.atomic():
+        group_ids = Group.objects.filter(tournament_id=tournament_id).values_list('id', flat=True)
+        groups = lock_groups(list(group_ids))
+        counts = golfer_counts(groups)
+
+        if golfer_ids is None:
+            candidates = list(
+                Golfer.objects.filter(group__isnull=True, is_active=True)
+                .order_by('last_name', 'first_name', 'id')
+                .values_list('id', flat=True)
+            )
+        else:
+            seated = set(Golfer.objects.filter(group_id__in=groups).values_list('id', flat=True))
+            candidates = [golfer_id for golfer_id in dict.fromkeys(golfer_ids) if golfer_id not in seated]
+
+        plan = {}
+        remaining = iter(candidates)
+        for group in sorted(groups.values(), key=lambda group: group.group_number):
+            spots = group.max_golfers - counts.get(group.id, 0)
+            chosen = [golfer_id for _, golfer_id in zip(range(max(0, spots)), remaining)]
+            if chosen:
+                plan[group.id] = chosen
+        unplaced = list(remaining)
+
+        result = _apply_plan(groups, plan, counts, reattribute_shots)
+        result['unplaced_golfer_ids'] = unplaced
+        return result
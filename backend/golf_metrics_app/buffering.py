@@ -0,0 +1,480 @@
+﻿import atexit
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DataError, IntegrityError, connection
+
+from .ingest import ShotBatchValidator, insert_once
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ('memory', 'spill', 'fsync')
+SEGMENT_SUFFIX = '.ndjson'
+# Provisional IDs remembered per process once their shots are written
+RESOLVED_HISTORY = 10000
+
+
+class BufferFull(Exception):
+    """Raised when GOLF_SHOT_BUFFER_MAX_PENDING shots are already waiting to be written"""
+
+
+class Batch:
+    """Buffered shots written together, and the spill segment holding their payloads"""
+
+    def __init__(self, entries, path=None):
+        # (provisional ID, unsaved Shot) pairs
+        self.entries = entries
+        self.path = path
+        # Failed write attempts so far
+        self.attempts = 0
+
+
+def _reset(shots):
+    """Make shots from a rolled back insert insertable again"""
+    for shot in shots:
+        shot.pk = None
+        shot._state.adding = True
+
+
+class ShotWriteBuffer:
+    """
+    Collect validated single shots in memory and write them with one
+    bulk insert every ``max_rows`` shots or ``max_delay`` seconds.
+
+    Each shot gets a provisional ID when it is accepted. With ``spill`` or
+    ``fsync`` durability its payload is first appended to a segment file in
+    ``spill_dir`` (``fsync`` also syncs it to disk before returning), and the
+    segment is removed once its batch has committed. Segments left behind by
+    a process that died are adopted and written by the next buffer that
+    starts, or by ``manage.py flush_shot_buffer``. A crash between commit and
+    removal replays the batch; shots with an ingest key are then recognised
+    as written, others are written a second time.
+
+    A batch the database refuses is written again one shot at a time, and
+    the shots still refused are appended to a file in ``dead_letter_dir``.
+    Other failures are retried with a doubling delay, ``max_attempts`` times
+    in all before the batch goes to the dead letter file as well.
+    """
+
+    def __init__(self, max_rows, max_delay, durability='spill', spill_dir=None,
+                 max_pending=None, orphan_seconds=60, retry_delay=1.0, max_attempts=5, dead_letter_dir=None):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f'Unknown durability {durability!r}; choose from {", ".join(DURABILITY_MODES)}')
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.durability = durability
+        self.spill_dir = Path(spill_dir) if spill_dir and durability != 'memory' else None
+        self.max_pending = max_pending
+        self.orphan_seconds = orphan_seconds
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.dead_letter_dir = Path(dead_letter_dir) if dead_letter_dir else None
+
+        self.instance_id = uuid.uuid4().hex[:12]
+        self._sequence = itertools.count(1)
+        self._segments = itertools.count(1)
+        self._validator = ShotBatchValidator()
+        self._cond = threading.Condition()
+        self._pending = []
+        self._pending_since = None
+        # Ingest key -> provisional ID of shots not written yet, so retries share one entry
+        self._pending_keys = {}
+        self._segment = None
+        self._retry = []
+        self._retry_at = 0.0
+        self._closing = False
+        self._thread = None
+        self._resolved = OrderedDict()
+        self._stats = {
+            'accepted': 0,
+            'rejected': 0,
+            'written': 0,
+            'duplicates': 0,
+            'flushes': 0,
+            'failed_flushes': 0,
+            'dead_lettered': 0,
+            'recovered': 0,
+            'last_flush_rows': 0,
+            'last_flush_ms': None,
+        }
+        if self.spill_dir:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+
+    # Accepting shots
+
+    def submit(self, row):
+        """
+        Validate one shot payload and queue it.
+
+        Returns (provisional ID, None), or (None, errors) when the payload is
+        invalid. A retry of a shot still waiting gets the provisional ID it
+        was first given. Raises BufferFull when too many shots are waiting.
+        """
+        shots, row_errors = self._validator.validate([row])
+        if row_errors:
+            with self._cond:
+                self._stats['rejected'] += 1
+            return None, row_errors[0]['errors']
+
+        with self._cond:
+            key = shots[0].ingest_key
+            if key and key in self._pending_keys:
+                return self._pending_keys[key], None
+            if self._closing:
+                raise BufferFull('The shot buffer is shutting down.')
+            if self.max_pending and self.pending_count() >= self.max_pending:
+                raise BufferFull(f'{self.max_pending} shots are already waiting to be written.')
+            provisional_id = f'{self.instance_id}-{next(self._sequence)}'
+            if self.spill_dir:
+                self._spill(provisional_id, row)
+            self._pending.append((provisional_id, shots[0]))
+            if key:
+                self._pending_keys[key] = provisional_id
+            self._stats['accepted'] += 1
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            # Wake the writer to start the delay clock, or to write a full batch
+            if len(self._pending) in (1, self.max_rows):
+                self._cond.notify()
+            self._ensure_writer()
+        return provisional_id, None
+
+    def _spill(self, provisional_id, row):
+        """Append a payload to the open segment, opening a new one when needed (lock held)"""
+        if self._segment is None:
+            path = self.spill_dir / f'{self.instance_id}-{next(self._segments):06d}{SEGMENT_SUFFIX}'
+            self._segment = open(path, 'a', encoding='utf-8')
+        line = json.dumps({'provisional_id': provisional_id, 'row': row}, cls=DjangoJSONEncoder)
+        self._segment.write(line + '\n')
+        self._segment.flush()
+        if self.durability == 'fsync':
+            os.fsync(self._segment.fileno())
+
+    def _cut(self):
+        """Take the pending shots and their segment as a batch (lock held)"""
+        path = None
+        if self._segment is not None:
+            path = Path(self._segment.name)
+            self._segment.close()
+            self._segment = None
+        batch = Batch(self._pending, path)
+        self._pending = []
+        self._pending_since = None
+        return batch
+
+    def pending_count(self):
+        return len(self._pending) + sum(len(batch.entries) for batch in self._retry)
+
+    # Writing
+
+    def _ensure_writer(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f'golf-shot-buffer-{self.instance_id}', daemon=True)
+            self._thread.start()
+
+    def _due(self, now):
+        if self._pending and (len(self._pending) >= self.max_rows or now - self._pending_since >= self.max_delay):
+            return True
+        return bool(self._retry) and now >= self._retry_at
+
+    def _wait_timeout(self, now):
+        deadlines = []
+        if self._pending:
+            deadlines.append(self._pending_since + self.max_delay)
+        if self._retry:
+            deadlines.append(self._retry_at)
+        if self.spill_dir:
+            deadlines.append(now + self.orphan_seconds)
+        return max(min(deadlines) - now, 0) if deadlines else None
+
+    def _run(self):
+        try:
+            self.recover()
+            while True:
+                with self._cond:
+                    while not self._closing and not self._due(time.monotonic()):
+                        if not self._cond.wait(self._wait_timeout(time.monotonic())) and not self._pending:
+                            break
+                    batches = self._take_batches()
+                    closing = self._closing
+                if not batches and self.spill_dir:
+                    # Idle: look for segments of processes that died
+                    self.recover()
+                for batch in batches:
+                    self._write(batch)
+                if closing:
+                    return
+        finally:
+            connection.close()
+
+    def _take_batches(self):
+        """Batches due to be written now (lock held)"""
+        batches = []
+        if self._retry and (self._closing or time.monotonic() >= self._retry_at):
+            batches, self._retry = self._retry, []
+        if self._pending:
+            batches.append(self._cut())
+        return batches
+
+    def _write(self, batch):
+        """
+        Insert a batch in one transaction; on failure queue it for a retry.
+        Shots whose submission was already written resolve to the original.
+        Returns the number of shots settled.
+        """
+        shots = [shot for _, shot in batch.entries]
+        started = time.perf_counter()
+        try:
+            created_count, _, duplicates = insert_once(shots, allow_copy=False)
+        except (IntegrityError, DataError):
+            # One bad shot (its golfer deleted meanwhile, say) must not hold back the others
+            logger.warning("The database refused a batch of %s buffered shots; writing them one at a time", len(shots))
+            _reset(shots)
+            return self._write_each(batch)
+        except Exception as e:
+            _reset(shots)
+            connection.close_if_unusable_or_obsolete()
+            return self._requeue(batch, e)
+        shot_ids = [duplicates.get(position, shot.pk) for position, shot in enumerate(shots)]
+        self._settle(batch, shot_ids, created_count, len(duplicates), time.perf_counter() - started)
+        return len(shots)
+
+    def _write_each(self, batch):
+        """Insert a refused batch shot by shot, moving the shots still refused to the dead letter file"""
+        started = time.perf_counter()
+        shot_ids = []
+        created_count = duplicate_count = 0
+        for provisional_id, shot in batch.entries:
+            try:
+                created, _, duplicates = insert_once([shot], allow_copy=False)
+            except (IntegrityError, DataError) as e:
+                _reset([shot])
+                self._dead_letter([(provisional_id, shot)], e)
+                shot_ids.append(None)
+                continue
+            except Exception as e:
+                # Lost the database part way: settle what got through and retry the rest
+                _reset([shot])
+                connection.close_if_unusable_or_obsolete()
+                done = len(shot_ids)
+                self._settle(Batch(batch.entries[:done]), shot_ids, created_count, duplicate_count,
+                             time.perf_counter() - started)
+                rest = Batch(batch.entries[done:], batch.path)
+                rest.attempts = batch.attempts
+                return done + self._requeue(rest, e)
+            created_count += created
+            duplicate_count += len(duplicates)
+            shot_ids.append(duplicates.get(0, shot.pk))
+        self._settle(batch, shot_ids, created_count, duplicate_count, time.perf_counter() - started)
+        return len(shot_ids)
+
+    def _requeue(self, batch, error):
+        """Queue a failed batch for another attempt, or dead letter it once attempts run out"""
+        batch.attempts += 1
+        with self._cond:
+            self._stats['failed_flushes'] += 1
+        if batch.attempts >= self.max_attempts:
+            logger.error("Writing %s buffered shots failed %s times; giving up", len(batch.entries), batch.attempts,
+                         exc_info=error)
+            self._dead_letter(batch.entries, error)
+            self._settle(batch, [None] * len(batch.entries), 0, 0, None)
+            return len(batch.entries)
+        delay = self.retry_delay * 2 ** (batch.attempts - 1)
+        logger.error("Writing %s buffered shots failed; retrying in %ss", len(batch.entries), delay, exc_info=error)
+        if batch.path is not None:
+            # Keeps the segment from looking abandoned to other processes
+            batch.path.touch()
+        with self._cond:
+            self._retry.append(batch)
+            self._retry_at = time.monotonic() + delay
+        return 0
+
+    def _dead_letter(self, entries, error):
+        """Append shots that cannot be written, with the reason, to this buffer's dead letter file"""
+        if self.dead_letter_dir is None:
+            logger.error("Dropping buffered shots %s: %s", ', '.join(entry_id for entry_id, _ in entries), error)
+            return
+        self.dead_letter_dir.mkdir(parents=True, exist_ok=True)
+        path = self.dead_letter_dir / f'{self.instance_id}{SEGMENT_SUFFIX}'
+        with open(path, 'a', encoding='utf-8') as dead_letter:
+            for provisional_id, shot in entries:
+                row = {field.attname: getattr(shot, field.attname)
+                       for field in shot._meta.concrete_fields if not field.primary_key}
+                record = {'provisional_id': provisional_id, 'error': str(error), 'row': row}
+                dead_letter.write(json.dumps(record, cls=DjangoJSONEncoder) + '\n')
+        logger.error("Moved %s buffered shots to %s: %s", len(entries), path, error)
+
+    def _settle(self, batch, shot_ids, created_count, duplicate_count, elapsed):
+        """Record the outcome of a finished batch; a None shot ID marks a dead lettered shot"""
+        if batch.path is not None:
+            batch.path.unlink(missing_ok=True)
+        with self._cond:
+            for (provisional_id, shot), shot_id in zip(batch.entries, shot_ids):
+                self._resolved[provisional_id] = shot_id
+                if shot.ingest_key and self._pending_keys.get(shot.ingest_key) == provisional_id:
+                    del self._pending_keys[shot.ingest_key]
+            while len(self._resolved) > RESOLVED_HISTORY:
+                self._resolved.popitem(last=False)
+            self._stats['written'] += created_count
+            self._stats['duplicates'] += duplicate_count
+            self._stats['dead_lettered'] += shot_ids.count(None)
+            if elapsed is not None:
+                self._stats['flushes'] += 1
+                self._stats['last_flush_rows'] = len(shot_ids)
+                self._stats['last_flush_ms'] = round(elapsed * 1000, 2)
+
+    def flush(self):
+        """Write everything waiting on the calling thread; returns the number of shots settled"""
+        with self._cond:
+            batches, self._retry = self._retry, []
+            if self._pending:
+                batches.append(self._cut())
+        return sum(self._write(batch) for batch in batches)
+
+    def close(self, timeout=10):
+        """Stop accepting shots and write what is waiting before returning"""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout)
+        else:
+            self.flush()
+        with self._cond:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+
+    # Recovery
+
+    def recover(self, older_than=None):
+        """
+        Adopt spill segments of other buffers untouched for ``older_than``
+        seconds (default ``orphan_seconds``) and queue their shots. A segment
+        is claimed by renaming it, so only one process writes it. Returns the
+        number of shots queued.
+        """
+        if not self.spill_dir:
+            return 0
+        older_than = self.orphan_seconds if older_than is None else older_than
+        cutoff = time.time() - older_than
+        recovered = 0
+        for path in sorted(self.spill_dir.glob(f'*{SEGMENT_SUFFIX}')):
+            if path.name.startswith(self.instance_id):
+                continue
+            try:
+                if path.stat().st_mtime > cutoff:
+                    continue
+                claimed = path.with_name(f'{self.instance_id}-recovered-{next(self._segments):06d}{SEGMENT_SUFFIX}')
+                path.rename(claimed)
+            except FileNotFoundError:
+                # Written, or claimed by another process in the meantime
+                continue
+            batch = self._read_segment(claimed)
+            if batch is None:
+                claimed.unlink(missing_ok=True)
+                continue
+            with self._cond:
+                self._retry.append(batch)
+                self._stats['recovered'] += len(batch.entries)
+            recovered += len(batch.entries)
+            logger.warning("Recovered %s buffered shots from %s", len(batch.entries), path.name)
+        return recovered
+
+    def _read_segment(self, path):
+        """Re-validate the payloads of a spill segment; None when none are usable"""
+        provisional_ids, rows = [], []
+        with open(path, encoding='utf-8') as segment:
+            for line in segment:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line cut short by the crash was never acknowledged
+                    continue
+                provisional_ids.append(record['provisional_id'])
+                rows.append(record['row'])
+        shots, row_errors = self._validator.validate(rows)
+        for row_error in row_errors:
+            logger.error("Dropping recovered shot %s: %s", provisional_ids[row_error['index']], row_error['errors'])
+        rejected = {row_error['index'] for row_error in row_errors}
+        valid_ids = [provisional_id for index, provisional_id in enumerate(provisional_ids) if index not in rejected]
+        return Batch(list(zip(valid_ids, shots)), path) if shots else None
+
+    # Status
+
+    def resolve(self, provisional_id):
+        """
+        Where a provisional ID stands: written (with its shot ID), pending,
+        failed (moved to the dead letter file) or unknown to this process.
+        """
+        with self._cond:
+            if provisional_id in self._resolved:
+                shot_id = self._resolved[provisional_id]
+                return {'status': 'written' if shot_id else 'failed', 'shot_id': shot_id}
+            waiting = itertools.chain(self._pending, *(batch.entries for batch in self._retry))
+            if any(entry_id == provisional_id for entry_id, _ in waiting):
+                return {'status': 'pending', 'shot_id': None}
+        return {'status': 'unknown', 'shot_id': None}
+
+    def statistics(self):
+        with self._cond:
+            return {
+                **self._stats,
+                'pending': self.pending_count(),
+                'durability': self.durability,
+                'max_rows': self.max_rows,
+                'max_delay_ms': round(self.max_delay * 1000),
+            }
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def is_enabled():
+    return settings.GOLF_SHOT_BUFFER_ENABLED
+
+
+def from_settings():
+    """A ShotWriteBuffer configured by the GOLF_SHOT_BUFFER_* settings"""
+    return ShotWriteBuffer(
+        max_rows=settings.GOLF_SHOT_BUFFER_MAX_ROWS,
+        max_delay=settings.GOLF_SHOT_BUFFER_MAX_DELAY_MS / 1000,
+        durability=settings.GOLF_SHOT_BUFFER_DURABILITY,
+        spill_dir=settings.GOLF_SHOT_BUFFER_SPILL_DIR,
+        max_pending=settings.GOLF_SHOT_BUFFER_MAX_PENDING,
+        orphan_seconds=settings.GOLF_SHOT_BUFFER_ORPHAN_SECONDS,
+        max_attempts=settings.GOLF_SHOT_BUFFER_MAX_ATTEMPTS,
+        dead_letter_dir=settings.GOLF_SHOT_BUFFER_DEAD_LETTER_DIR,
+    )
+
+
+def get_buffer():
+    """Return the process-wide shot buffer, creating it on first use"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = from_settings()
+                atexit.register(_buffer.close)
+    return _buffer
+
+
+def shutdown():
+    """Write what is buffered and drop the process-wide buffer"""
+    global _buffer
+    with _buffer_lock:
+        buffer, _buffer = _buffer, None
+    if buffer is not None:
+        atexit.unregister(buffer.close)
+        buffer.close()
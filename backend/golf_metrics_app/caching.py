@@ -0,0 +1,185 @@
+﻿import hashlib
+import threading
+import time
+from collections import Counter
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+
+from .models import SequenceCounter
+
+VERSION_PREFIX = 'golf:v'
+RESPONSE_PREFIX = 'golf:r'
+
+_counters = Counter()
+_counters_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[settings.GOLF_CACHE_ALIAS]
+
+
+# Version counters
+#
+# Every model scope ('tournament', 'group', 'golfer', 'shot') has an epoch and
+# one counter per tournament plus '*' for unscoped reads. A cached response
+# embeds the values it was built from in its key, so bumping a value makes the
+# old entries unreachable instead of deleting them. Changes that cannot name
+# their tournaments bump the epoch, which invalidates the whole scope.
+#
+# The counters are SequenceCounter rows rather than cache entries: writes made
+# by other processes (job workers, management commands, other web workers)
+# must reach every process, and a per-process locmem cache would keep them to
+# the process that made them.
+
+def _epoch_key(scope):
+    return f'{VERSION_PREFIX}:{scope}'
+
+
+def _counter_key(scope, tournament_id):
+    return f'{VERSION_PREFIX}:{scope}:{tournament_id or "*"}'
+
+
+def _increment(keys):
+    # Sorted so concurrent bumps lock the counter rows in the same order
+    with transaction.atomic():
+        for key in sorted(keys):
+            # New counters start from the clock so keys of a reset database never come back
+            SequenceCounter.objects.allocate(key, seed=time.time_ns)
+
+
+def bump(scope, tournament_ids=None):
+    """
+    Invalidate cached responses depending on ``scope`` once the transaction commits.
+
+    With ``tournament_ids`` only responses for those tournaments (and unscoped
+    ones) are invalidated; without them every response of the scope is.
+    """
+    if tournament_ids is None:
+        keys = [_epoch_key(scope)]
+    else:
+        keys = {_counter_key(scope, None)}
+        keys.update(_counter_key(scope, tournament_id) for tournament_id in tournament_ids if tournament_id)
+    transaction.on_commit(partial(_increment, keys))
+
+
+def current_versions(scopes, tournament_id=None):
+    """Read the version values a response for ``tournament_id`` depends on"""
+    keys = []
+    for scope in scopes:
+        keys += [_epoch_key(scope), _counter_key(scope, tournament_id)]
+    counters = SequenceCounter.objects.filter(scope__in=keys)
+    values = dict(counters.values_list('scope', 'last_value'))
+    missing = [key for key in keys if key not in values]
+    if missing:
+        # Started from the clock like _increment; a counter created concurrently is kept and read back
+        SequenceCounter.objects.bulk_create(
+            [SequenceCounter(scope=key, last_value=time.time_ns()) for key in missing], ignore_conflicts=True
+        )
+        values.update(counters.filter(scope__in=missing).values_list('scope', 'last_value'))
+    return [values[key] for key in keys]
+
+
+# Response cache
+
+def _normalized_params(request):
+    return sorted(
+        (name, sorted(values))
+        for name, values in request.query_params.lists()
+        if any(values)
+    )
+
+
+def _count(endpoint, outcome):
+    with _counters_lock:
+        _counters[(endpoint, outcome)] += 1
+
+
+def statistics():
+    """Hit/miss counters of this worker process, per endpoint"""
+    with _counters_lock:
+        snapshot = dict(_counters)
+    endpoints = {}
+    for (endpoint, outcome), count in snapshot.items():
+        endpoints.setdefault(endpoint, {'hits': 0, 'misses': 0, 'not_modified': 0})[outcome] = count
+    for counts in endpoints.values():
+        served = counts['hits'] + counts['not_modified']
+        total = served + counts['misses']
+        counts['hit_ratio'] = round(served / total, 4) if total else None
+    return {
+        'backend': settings.CACHES[settings.GOLF_CACHE_ALIAS]['BACKEND'],
+        'endpoints': endpoints,
+    }
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get('If-None-Match', '')
+    return etag in [tag.strip() for tag in header.split(',')] or header.strip() == '*'
+
+
+def _serve(request, endpoint, entry):
+    if _etag_matches(request, entry['etag']):
+        _count(endpoint, 'not_modified')
+        response = HttpResponseNotModified()
+    else:
+        _count(endpoint, 'hits')
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['ETag'] = entry['etag']
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def cached_response(endpoint, depends_on, tournament_from=None):
+    """
+    Cache a viewset action's rendered response, keyed by endpoint, format,
+    URL kwargs, normalized query parameters and the versions of ``depends_on``.
+
+    ``tournament_from`` names where the tournament scope comes from: ``'pk'``
+    for the URL primary key, or a list of query parameter names.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(view, request, *args, **kwargs):
+            if not settings.GOLF_CACHE_ENABLED:
+                return view_method(view, request, *args, **kwargs)
+
+            if tournament_from == 'pk':
+                tournament_id = kwargs.get('pk')
+            else:
+                tournament_id = next(
+                    (request.query_params[name] for name in tournament_from or () if request.query_params.get(name)),
+                    None
+                )
+            versions = current_versions(depends_on, tournament_id)
+            fingerprint = repr((
+                request.accepted_renderer.format, sorted(kwargs.items()), _normalized_params(request), versions
+            ))
+            key = f'{RESPONSE_PREFIX}:{endpoint}:{hashlib.sha1(fingerprint.encode()).hexdigest()}'
+
+            cache = get_cache()
+            entry = cache.get(key)
+            if entry is not None:
+                return _serve(request, endpoint, entry)
+
+            _count(endpoint, 'misses')
+            response = view_method(view, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+            def store(rendered):
+                etag = '"%s"' % hashlib.md5(rendered.content).hexdigest()
+                rendered['ETag'] = etag
+                rendered['Cache-Control'] = 'no-cache'
+                cache.set(key, {
+                    'etag': etag,
+                    'content': rendered.content,
+                    'content_type': rendered['Content-Type'],
+                })
+
+            response.add_post_render_callback(store)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,153 @@
+﻿from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import Q
+
+from . import aggregates, caching
+from .models import Golfer, Group, Shot, Tournament
+
+# Models a bulk delete can target, by model name
+TARGETS = {model._meta.model_name: model for model in (Tournament, Group, Golfer, Shot)}
+
+# Rows removed before the targets when a bulk delete includes children, in
+# order, as (model, lookups from that model to the target IDs). Anything else
+# pointing at the targets is detached, as their SET_NULL foreign keys would be.
+CHILDREN = {
+    'tournament': [
+        (Shot, ['tournament_id__in', 'golfer__group__tournament_id__in']),
+        (Golfer, ['group__tournament_id__in']),
+        (Group, ['tournament_id__in']),
+    ],
+    'group': [
+        (Shot, ['group_id__in', 'golfer__group_id__in']),
+        (Golfer, ['group_id__in']),
+    ],
+    'golfer': [
+        (Shot, ['golfer_id__in']),
+    ],
+    'shot': [],
+}
+
+
+class Progress:
+    """Rows deleted and detached so far, per model, reported after every chunk"""
+
+    def __init__(self, report=None):
+        self.counts = {'deleted': {}, 'detached': {}}
+        self.report = report
+
+    def add(self, action, model, count):
+        counts = self.counts[action]
+        counts[model._meta.model_name] = counts.get(model._meta.model_name, 0) + count
+        if self.report:
+            self.report(**self.counts)
+
+
+def _run_chunks(statement, queryset, batch_size, on_chunk):
+    """
+    Run ``statement`` (an UPDATE or DELETE of the queryset's table) against
+    at most ``batch_size`` of its rows at a time, each chunk in its own
+    transaction, until a chunk comes back short. The statement must take the
+    rows out of ``queryset``. Returns the number of rows affected.
+    """
+    pk = connection.ops.quote_name(queryset.model._meta.pk.column)
+    # The derived table lets the subquery read the table being modified and carry a LIMIT
+    chunk_sql, params = queryset.order_by().values('pk')[:batch_size].query.sql_with_params()
+    sql = f'{statement} WHERE {pk} IN (SELECT * FROM ({chunk_sql}) chunk)'
+    total = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            count = cursor.rowcount
+        total += count
+        if count:
+            on_chunk(count)
+        if count < batch_size:
+            return total
+
+
+def delete_rows(queryset, progress, batch_size=None):
+    """
+    Chunked ``DELETE ... WHERE id IN (subquery LIMIT n)`` of the queryset's rows.
+
+    Raw SQL: no model instances are loaded and no signals are sent. Rows that
+    reference the deleted ones are detached (SET_NULL) or deleted (CASCADE)
+    first, so the result matches ``queryset.delete()``.
+    """
+    model = queryset.model
+    batch_size = batch_size or settings.GOLF_DELETE_BATCH_SIZE
+    for relation in model._meta.related_objects:
+        if relation.many_to_many:
+            continue
+        related = relation.related_model._base_manager.filter(
+            **{f'{relation.field.name}__in': queryset.values('pk')}
+        )
+        if relation.on_delete is models.SET_NULL:
+            detach_rows(related, relation.field.name, progress, batch_size)
+        elif relation.on_delete is models.CASCADE:
+            delete_rows(related, progress, batch_size)
+        else:
+            raise ValueError(f'{relation.related_model.__name__}.{relation.field.name} cannot be deleted in chunks.')
+
+    table = connection.ops.quote_name(model._meta.db_table)
+    return _run_chunks(
+        f'DELETE FROM {table}', queryset, batch_size,
+        lambda count: progress.add('deleted', model, count)
+    )
+
+
+def detach_rows(queryset, field_name, progress, batch_size=None):
+    """Chunked ``UPDATE ... SET <foreign key> = NULL`` of the queryset's rows"""
+    model = queryset.model
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.get_field(field_name).column)
+    return _run_chunks(
+        f'UPDATE {table} SET {column} = NULL', queryset, batch_size or settings.GOLF_DELETE_BATCH_SIZE,
+        lambda count: progress.add('detached', model, count)
+    )
+
+
+def _affected_golfers(model_name, ids):
+    """Golfers (None for unassigned shots) whose aggregate buckets the delete changes"""
+    if model_name == 'shot':
+        return set(Shot.objects.filter(id__in=ids).values_list('golfer_id', flat=True).distinct())
+    if model_name == 'golfer':
+        return set(ids) | {None}
+    return aggregates.golfers_in_buckets(**{f'{model_name}_id__in': ids}) | {None}
+
+
+def bulk_delete(model_name, ids, delete_children=False, report=None):
+    """
+    Delete the ``model_name`` rows with ``ids`` (and their children) in chunks.
+
+    Each chunk commits on its own, so locks are held for one chunk at a time
+    and progress is visible to other connections; an interrupted delete can
+    simply be run again. Derived data is refreshed once at the end.
+    """
+    progress = Progress(report)
+    ids = list(ids)
+    affected_golfers = _affected_golfers(model_name, ids)
+
+    if delete_children:
+        for model, lookups in CHILDREN[model_name]:
+            delete_rows(model.objects.filter(reduce(or_, [Q(**{lookup: ids}) for lookup in lookups])), progress)
+    deleted_count = delete_rows(TARGETS[model_name].objects.filter(id__in=ids), progress)
+
+    with transaction.atomic():
+        aggregates.refresh_golfers(affected_golfers)
+    # Raw deletes send no signals, so cached responses are invalidated here
+    for name in ('tournament', 'group', 'golfer', 'shot'):
+        caching.bump(name)
+
+    return {
+        'model': model_name,
+        'deleted_count': deleted_count,
+        **progress.counts,
+    }
+
+
+def run_bulk_delete(job, model, ids, delete_children=False):
+    """Job handler for bulk_delete"""
+    return bulk_delete(model, ids, delete_children, report=job.report)
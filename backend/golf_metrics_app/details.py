@@ -0,0 +1,64 @@
+﻿from django.conf import settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import replace_query_param
+
+from .fastpath import get_plan
+from .models import Shot
+from .pagination import KeysetPageNumberPagination
+from .serializers import ShotSerializer
+
+# Newest first; id makes the order unique so windows never overlap
+SHOT_WINDOW_ORDERING = ('-timestamp', '-id')
+SHOT_CURSOR_PARAM = 'shots_cursor'
+SHOT_LIMIT_PARAM = 'shot_limit'
+
+
+def shot_window_limit(request):
+    """Window size from ?shot_limit=, capped at GOLF_NESTED_SHOT_MAX_LIMIT"""
+    value = request.query_params.get(SHOT_LIMIT_PARAM)
+    if not value:
+        return settings.GOLF_NESTED_SHOT_LIMIT
+    try:
+        limit = int(value)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        raise ValidationError({SHOT_LIMIT_PARAM: 'Must be a positive integer.'})
+    return min(limit, settings.GOLF_NESTED_SHOT_MAX_LIMIT)
+
+
+def shot_window(shots, request):
+    """
+    Serialize the latest ``shot_limit`` of ``shots`` following ?shots_cursor=.
+
+    The window is one keyset query on (timestamp, id), so a golfer's 50,000th
+    shot costs the same as their first. Returns the serialized shots and the
+    URL of the next (older) window, or None after the last one.
+    """
+    limit = shot_window_limit(request)
+    fields = [name.lstrip('-') for name in SHOT_WINDOW_ORDERING]
+    token = request.query_params.get(SHOT_CURSOR_PARAM)
+    if token:
+        values = KeysetPageNumberPagination.decode_cursor(token, Shot, fields)
+        shots = shots.filter(KeysetPageNumberPagination.seek_filter(SHOT_WINDOW_ORDERING, values))
+    shots = shots.order_by(*SHOT_WINDOW_ORDERING)
+
+    plan = get_plan(ShotSerializer) if settings.GOLF_FAST_SERIALIZATION else None
+    if plan is not None:
+        rows = list(plan.values(shots, fields)[:limit + 1])
+    else:
+        rows = list(shots.select_related('golfer', 'group', 'tournament')[:limit + 1])
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+
+    next_url = None
+    if has_next:
+        last = rows[-1]
+        next_url = replace_query_param(
+            request.build_absolute_uri(), SHOT_CURSOR_PARAM,
+            KeysetPageNumberPagination.encode_cursor([
+                last[field] if isinstance(last, dict) else getattr(last, field) for field in fields
+            ])
+        )
+    data = plan.serialize(rows) if plan is not None else ShotSerializer(rows, many=True).data
+    return data, next_url
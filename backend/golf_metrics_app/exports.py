@@ -0,0 +1,227 @@
+﻿import csv
+import io
+import os
+from datetime import date, datetime
+from itertools import islice
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+from .models import Shot
+
+# (output column, queryset lookup) pairs for shot exports
+SHOT_EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('golfer', 'golfer_id'),
+    ('group', 'group_id'),
+    ('tournament', 'tournament_id'),
+    ('shot_number', 'shot_number'),
+    ('hole_number', 'hole_number'),
+    ('shot_type', 'shot_type'),
+    ('club_used', 'club_used'),
+    ('ball_speed', 'ball_speed'),
+    ('club_head_speed', 'club_head_speed'),
+    ('launch_angle', 'launch_angle'),
+    ('spin_rate', 'spin_rate'),
+    ('carry_distance', 'carry_distance'),
+    ('total_distance', 'total_distance'),
+    ('side_angle', 'side_angle'),
+    ('smash_factor', 'smash_factor'),
+    ('is_simulated', 'is_simulated'),
+    ('launch_monitor_id', 'launch_monitor_id'),
+    ('notes', 'notes'),
+    ('timestamp', 'timestamp'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+
+def _iter_chunks(queryset, chunk_size):
+    """Yield lists of value tuples read through a server-side cursor"""
+    lookups = [lookup for _, lookup in SHOT_EXPORT_COLUMNS]
+    rows = queryset.values_list(*lookups).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _stream_csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in SHOT_EXPORT_COLUMNS])
+    for chunk in chunks:
+        writer.writerows([_csv_value(value) for value in row] for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _stream_ndjson(chunks):
+    names = [name for name, _ in SHOT_EXPORT_COLUMNS]
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for chunk in chunks:
+        yield ''.join(encoder.encode(dict(zip(names, row))) + '\n' for row in chunk)
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose contents are handed off after every batch"""
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _arrow_schema(pa):
+    """Build an explicit Arrow schema so every record batch has the same types"""
+    fields = []
+    for name, lookup in SHOT_EXPORT_COLUMNS:
+        if lookup in ('id', 'golfer_id', 'group_id', 'tournament_id'):
+            arrow_type = pa.int64()
+        else:
+            field = Shot._meta.get_field(lookup)
+            if isinstance(field, models.DecimalField):
+                arrow_type = pa.decimal128(field.max_digits, field.decimal_places)
+            elif isinstance(field, models.DateTimeField):
+                arrow_type = pa.timestamp('us', tz='UTC')
+            elif isinstance(field, models.BooleanField):
+                arrow_type = pa.bool_()
+            elif isinstance(field, models.IntegerField):
+                arrow_type = pa.int64()
+            else:
+                arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def _stream_arrow(chunks, file_format):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(pa)
+    sink = _DrainableSink()
+    if file_format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    for chunk in chunks:
+        columns = list(zip(*chunk))
+        batch = pa.record_batch(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+            schema=schema
+        )
+        if file_format == 'parquet':
+            writer.write_batch(batch)
+        else:
+            writer.write(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def arrow_available():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def _stream_async(parts):
+    """Drive a synchronous export from the event loop, one chunk per thread hop"""
+    # Thread sensitive, so every chunk is read on the thread holding the cursor
+    read = sync_to_async(next, thread_sensitive=True)
+    while True:
+        part = await read(parts, None)
+        if part is None:
+            return
+        yield part
+
+
+def stream_shots(queryset, file_format, asynchronous=False):
+    """
+    Return an iterator producing the export of ``queryset`` in ``file_format``.
+
+    With ``asynchronous`` it is an async iterator: under ASGI Django reads a
+    synchronous StreamingHttpResponse into memory before sending any of it.
+    """
+    chunks = _iter_chunks(queryset, settings.GOLF_EXPORT_CHUNK_SIZE)
+    if file_format == 'csv':
+        parts = _stream_csv(chunks)
+    elif file_format == 'ndjson':
+        parts = _stream_ndjson(chunks)
+    else:
+        parts = _stream_arrow(chunks, file_format)
+    return _stream_async(parts) if asynchronous else parts
+
+
+def export_extension(file_format):
+    return 'arrows' if file_format == 'arrow' else file_format
+
+
+def export_path(job_id, file_format):
+    """Where the export_shots job ``job_id`` writes its file"""
+    return Path(settings.GOLF_JOB_OUTPUT_DIR) / f'shots-{job_id}.{export_extension(file_format)}'
+
+
+def run_export(job, filters, file_format):
+    """
+    Job handler for export_shots: write the filtered export to
+    GOLF_JOB_OUTPUT_DIR, reporting the bytes written after every chunk.
+
+    The file is written under a temporary name and renamed when complete, so
+    a download never sees a partial export.
+    """
+    path = export_path(job.pk, file_format)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + '.part')
+    queryset = Shot.objects.filter_by_params(filters).order_by('-timestamp', 'shot_number')
+    written = 0
+    try:
+        with open(partial, 'wb') as output:
+            for chunk in stream_shots(queryset, file_format):
+                data = chunk.encode() if isinstance(chunk, str) else chunk
+                output.write(data)
+                written += len(data)
+                job.report(bytes_written=written)
+        os.replace(partial, path)
+    finally:
+        if partial.exists():
+            partial.unlink()
+    return {
+        'file_name': f'shots.{export_extension(file_format)}',
+        'content_type': EXPORT_CONTENT_TYPES[file_format],
+        'bytes': written,
+    }
@@ -0,0 +1,271 @@
+﻿import decimal
+import json
+from operator import itemgetter
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import fields as drf_fields, relations
+from rest_framework.response import Response
+from django.utils import timezone
+from rest_framework.settings import ISO_8601, api_settings
+
+from .fieldsets import FieldSelectionMixin
+from .instrumentation import timed_serialization
+from .models import Golfer, Group
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Columns read by the model properties serializers expose; the property itself
+# is evaluated on a namespace holding just these values
+PROPERTY_COLUMNS = {
+    Golfer: {
+        'full_name': ['first_name', 'last_name'],
+        'age': ['date_of_birth'],
+    },
+    Group: {
+        'display_name': ['nickname', 'group_number'],
+    },
+}
+
+# Properties that are shortcuts through relations
+PROPERTY_RELATIONS = {
+    Golfer: {
+        'tournament': ['group', 'tournament'],
+    },
+}
+
+# Field classes whose to_representation returns database values unchanged
+_IDENTITY_FIELDS = (
+    drf_fields.CharField,
+    drf_fields.IntegerField,
+    drf_fields.BooleanField,
+    drf_fields.ChoiceField,
+)
+
+
+# Marks a field the serializer would leave out of the row
+_SKIP = object()
+
+
+class Unsupported(Exception):
+    """A serializer field the fast path cannot reproduce exactly"""
+
+
+def dumps(data):
+    """Encode ``data`` exactly like DRF's JSONRenderer with default settings"""
+    if orjson is not None:
+        content = orjson.dumps(data)
+    else:
+        content = json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode()
+    # JSONRenderer escapes these for JavaScript compatibility
+    return content.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+def _decimal_converter(field):
+    """DecimalField.to_representation with the quantize context built once"""
+    if field.normalize_output or field.localize or field.decimal_places is None or \
+            not getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING):
+        return field.to_representation
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return f'{value.quantize(exponent, rounding=rounding, context=context):f}'
+    return convert
+
+
+class _DateTimeConverter:
+    """DateTimeField.to_representation with the output timezone looked up once per response"""
+
+    def __init__(self, field):
+        self.field = field
+
+    def bind(self):
+        field = self.field
+        field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if field_timezone is None:
+            return field.to_representation
+
+        def convert(value):
+            if isinstance(value, str) or timezone.is_naive(value):
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return convert
+
+
+def _converter(field):
+    """Return the function turning a non-null column value into the field's output, or None for as-is"""
+    if isinstance(field, relations.PrimaryKeyRelatedField):
+        if field.pk_field is not None:
+            raise Unsupported(field.field_name)
+        return None
+    if isinstance(field, relations.RelatedField) or isinstance(field, drf_fields.SerializerMethodField):
+        raise Unsupported(field.field_name)
+    if isinstance(field, drf_fields.DecimalField):
+        return _decimal_converter(field)
+    if isinstance(field, drf_fields.DateTimeField):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        if isinstance(output_format, str) and output_format.lower() == ISO_8601:
+            return _DateTimeConverter(field)
+    if isinstance(field, _IDENTITY_FIELDS) and not isinstance(field, drf_fields.MultipleChoiceField):
+        return None
+    return field.to_representation
+
+
+class RowPlan:
+    """
+    A serializer's read path compiled against ``values()`` rows.
+
+    Each output field becomes a getter over the row dict plus a converter
+    taken from the serializer field, so rows are serialized without model
+    instances or per-field attribute lookups. Raises Unsupported when a field
+    cannot be rendered byte-for-byte like the serializer.
+    """
+
+    def __init__(self, serializer_class, field_names=None):
+        serializer = serializer_class()
+        self.model = serializer.Meta.model
+        self.columns = {self.model._meta.pk.name}
+        self.steps = []
+        for name, field in serializer.fields.items():
+            if field.write_only or (field_names is not None and name not in field_names):
+                continue
+            self.steps.append((name, self._getter(field, field.source.split('.')), _converter(field)))
+
+    def _getter(self, field, parts):
+        """Build a row getter for a dotted serializer source"""
+        model = self.model
+        prefix = []
+        nullable = None
+        while parts:
+            part, parts = parts[0], parts[1:]
+            if part in PROPERTY_RELATIONS.get(model, {}):
+                parts = PROPERTY_RELATIONS[model][part] + parts
+                continue
+            path = '__'.join(prefix + [part])
+            if part in PROPERTY_COLUMNS.get(model, {}) and not parts:
+                return self._guard(self._property_getter(model, part, prefix), field, nullable)
+            try:
+                model_field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                raise Unsupported(path)
+            if not model_field.concrete:
+                raise Unsupported(path)
+            self.columns.add(path)
+            if not parts:
+                return self._guard(itemgetter(path), field, nullable)
+            if not model_field.many_to_one and not model_field.one_to_one:
+                raise Unsupported(path)
+            nullable = path
+            prefix.append(part)
+            model = model_field.related_model
+        raise Unsupported('.'.join(prefix))
+
+    def _property_getter(self, model, name, prefix):
+        prop = getattr(model, name)
+        names = PROPERTY_COLUMNS[model][name]
+        paths = ['__'.join(prefix + [column]) for column in names]
+        self.columns.update(paths)
+
+        def get(row):
+            return prop.fget(SimpleNamespace(**{column: row[path] for column, path in zip(names, paths)}))
+        return get
+
+    @staticmethod
+    def _guard(getter, field, nullable):
+        """
+        Reproduce Field.get_attribute when the source crosses a null foreign
+        key: the field's default, None if it allows null, otherwise no key.
+        """
+        if nullable is None:
+            return getter
+        if field.default is not drf_fields.empty:
+            missing = field.get_default()
+        elif field.allow_null:
+            missing = None
+        else:
+            missing = _SKIP
+        return lambda row: missing if row[nullable] is None else getter(row)
+
+    def values(self, queryset, extra=()):
+        """``queryset`` as dict rows holding every column the plan reads"""
+        return queryset.values(*sorted(self.columns | set(extra)))
+
+    def serialize(self, rows):
+        rows = list(rows)
+        steps = [
+            (name, get, convert.bind() if isinstance(convert, _DateTimeConverter) else convert)
+            for name, get, convert in self.steps
+        ]
+        results = []
+        with timed_serialization():
+            for row in rows:
+                item = {}
+                for name, get, convert in steps:
+                    value = get(row)
+                    if value is _SKIP:
+                        continue
+                    item[name] = value if value is None or convert is None else convert(value)
+                results.append(item)
+        return results
+
+
+class FastJSONResponse(Response):
+    """A Response encoded with dumps() instead of the negotiated renderer"""
+
+    @property
+    def rendered_content(self):
+        self['Content-Type'] = 'application/json'
+        return dumps(self.data)
+
+
+_plans = {}
+
+
+def get_plan(serializer_class, field_names=None):
+    """Compiled plan for a serializer and field selection, or None when unsupported"""
+    key = (serializer_class, tuple(field_names) if field_names is not None else None)
+    if key not in _plans:
+        try:
+            _plans[key] = RowPlan(serializer_class, field_names)
+        except Unsupported:
+            _plans[key] = None
+    return _plans[key]
+
+
+class FastListMixin(FieldSelectionMixin):
+    """
+    Serve JSON list responses from ``values()`` rows instead of serializer instances.
+
+    The output is byte-identical to the regular list response; other renderers
+    and serializers the plan cannot reproduce use the regular path.
+    """
+
+    def get_row_plan(self):
+        if not settings.GOLF_FAST_SERIALIZATION or self.request.accepted_renderer.format != 'json':
+            return None
+        return get_plan(self.get_serializer_class(), self.get_selected_fields())
+
+    def list(self, request, *args, **kwargs):
+        plan = self.get_row_plan()
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        ordering = [name.lstrip('-') for name in getattr(self, 'keyset_ordering', None) or ()]
+        rows = plan.values(self.filter_queryset(self.get_queryset()), ordering)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            payload = self.get_paginated_response(plan.serialize(page)).data
+        else:
+            payload = plan.serialize(rows)
+        return FastJSONResponse(self.to_layout(payload))
@@ -0,0 +1,175 @@
+﻿from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+# Actions whose responses honour ?fields= / ?omit= and get a pruned queryset
+SPARSE_ACTIONS = ('list', 'retrieve', 'unassigned')
+
+COLUMNAR_LAYOUT = 'columns'
+
+_field_sources = {}
+
+
+def serializer_field_sources(serializer_class):
+    """Map a serializer class's field names, in output order, to their sources"""
+    if serializer_class not in _field_sources:
+        _field_sources[serializer_class] = {
+            name: field.source for name, field in serializer_class().fields.items()
+        }
+    return _field_sources[serializer_class]
+
+
+def _split_param(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def _relations_for(model, path):
+    """
+    Return the select_related paths needed to load ``path`` (a ``__`` lookup
+    ending in a concrete field), or None when the path cannot be loaded by
+    column selection alone.
+    """
+    parts = path.split('__')
+    relations = []
+    for position, part in enumerate(parts):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete:
+            return None
+        if position == len(parts) - 1:
+            return relations
+        if not field.many_to_one and not field.one_to_one:
+            return None
+        relations.append('__'.join(parts[:position + 1]))
+        model = field.related_model
+    return relations
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin dropping the fields not named in ``context['fields']``.
+
+    Serializers can list the columns a computed field reads in
+    ``field_dependencies`` so views can load only those columns.
+    """
+    field_dependencies = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = self.context.get('fields')
+        if selected is not None:
+            for name in set(self.fields) - set(selected):
+                self.fields.pop(name)
+
+
+class FieldSelectionMixin:
+    """
+    ViewSet mixin for sparse fieldsets and the columnar list layout.
+
+    ``?fields=a,b`` keeps only the named fields and ``?omit=a,b`` drops them.
+    The queryset is then narrowed with ``only()`` and joins are limited to the
+    relations the remaining fields read, so unrequested joins never run.
+    ``?layout=columns`` returns list results as one array per field.
+    """
+    fields_query_param = 'fields'
+    omit_query_param = 'omit'
+    layout_query_param = 'layout'
+
+    def get_selected_fields(self):
+        """Field names to render, or None for the serializer's full field set"""
+        if not hasattr(self, '_selected_fields'):
+            self._selected_fields = self._parse_selected_fields()
+        return self._selected_fields
+
+    def _parse_selected_fields(self):
+        if getattr(self, 'action', None) not in SPARSE_ACTIONS:
+            return None
+        params = self.request.query_params
+        requested = _split_param(params.get(self.fields_query_param, ''))
+        omitted = _split_param(params.get(self.omit_query_param, ''))
+        if not requested and not omitted:
+            return None
+
+        available = list(serializer_field_sources(self.get_serializer_class()))
+        unknown = [name for name in requested + omitted if name not in available]
+        if unknown:
+            raise ValidationError({
+                'fields': [f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(available)}."]
+            })
+        selected = [name for name in available if (not requested or name in requested) and name not in omitted]
+        if not selected:
+            raise ValidationError({'fields': ['At least one field must be selected.']})
+        return selected
+
+    def wants_fields(self, *names):
+        """Whether any of ``names`` will be rendered"""
+        selected = self.get_selected_fields()
+        return selected is None or any(name in selected for name in names)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        selected = self.get_selected_fields()
+        if selected is not None:
+            context['fields'] = selected
+        return context
+
+    def select_fields(self, queryset):
+        """
+        Restrict ``queryset`` to the columns and joins the selected fields read.
+
+        Leaves the queryset untouched when no selection was made or a selected
+        field reads something that cannot be expressed as columns.
+        """
+        selected = self.get_selected_fields()
+        if selected is None:
+            return queryset
+
+        serializer_class = self.get_serializer_class()
+        dependencies = getattr(serializer_class, 'field_dependencies', {})
+        sources = serializer_field_sources(serializer_class)
+        model = queryset.model
+        paths = {model._meta.pk.name}
+        paths.update(name.lstrip('-') for name in getattr(self, 'keyset_ordering', None) or ())
+        for name in selected:
+            if name in dependencies:
+                paths.update(dependencies[name])
+            elif sources[name] != '*':
+                paths.add(sources[name].replace('.', '__'))
+
+        relations = set()
+        for path in paths:
+            needed = _relations_for(model, path)
+            if needed is None:
+                return queryset
+            relations.update(needed)
+
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*relations)
+        # Related objects are only loaded through their foreign keys
+        return queryset.only(*paths, *relations)
+
+    def to_layout(self, payload):
+        """Rearrange list ``payload`` (a page envelope or a plain list) for the requested layout"""
+        if self.request.query_params.get(self.layout_query_param) != COLUMNAR_LAYOUT:
+            return payload
+        paginated = isinstance(payload, dict)
+        rows = payload['results'] if paginated else payload
+        names = self.get_selected_fields() or list(serializer_field_sources(self.get_serializer_class()))
+        columns = {name: [row.get(name) for row in rows] for name in names}
+        if not paginated:
+            return {'layout': COLUMNAR_LAYOUT, 'row_count': len(rows), 'results': columns}
+        return {
+            **{key: value for key, value in payload.items() if key != 'results'},
+            'layout': COLUMNAR_LAYOUT,
+            'row_count': len(rows),
+            'results': columns,
+        }
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get(self.layout_query_param) != COLUMNAR_LAYOUT or response.status_code != 200:
+            return response
+        return Response(self.to_layout(response.data))
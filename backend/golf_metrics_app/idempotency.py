@@ -0,0 +1,181 @@
+﻿import hashlib
+import math
+import threading
+from collections import OrderedDict
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from rest_framework import serializers
+
+from .models import Shot
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 200
+
+_timestamp_field = serializers.DateTimeField()
+
+
+# Ingest keys
+#
+# A shot's ingest key identifies one submission from one launch monitor: the
+# client's Idempotency-Key when it sends one, otherwise the launch monitor's
+# own timestamp, which a retried POST repeats. Shots with neither get no key
+# and are never deduplicated. Keys are hashed so the column has a fixed width.
+
+def clean_idempotency_key(value):
+    """Validate a client supplied idempotency key; returns it, or None when absent"""
+    if value in (None, ''):
+        return None
+    if not isinstance(value, str) or len(value) > MAX_KEY_LENGTH:
+        raise serializers.ValidationError(f'Must be a string of at most {MAX_KEY_LENGTH} characters.')
+    return value
+
+
+def shot_key(launch_monitor_id, idempotency_key=None, timestamp=None):
+    """The ingest key of a shot from its validated values, or None"""
+    if idempotency_key:
+        token = f'key:{idempotency_key}'
+    elif timestamp is not None and launch_monitor_id:
+        token = f'time:{timestamp.astimezone(dt_timezone.utc).isoformat()}'
+    else:
+        return None
+    return hashlib.sha256(f'{launch_monitor_id or ""}\x00{token}'.encode()).hexdigest()
+
+
+def payload_key(row):
+    """
+    The ingest key of a raw shot payload, read without validating the rest of
+    it so retries can be answered before any other work. Raises
+    ValidationError for a malformed idempotency_key.
+    """
+    idempotency_key = clean_idempotency_key(row.get('idempotency_key'))
+    timestamp = None
+    if not idempotency_key and row.get('timestamp') not in (None, ''):
+        try:
+            timestamp = _timestamp_field.to_internal_value(row['timestamp'])
+        except serializers.ValidationError:
+            # Validation proper reports it
+            return None
+    launch_monitor_id = row.get('launch_monitor_id')
+    return shot_key(str(launch_monitor_id) if launch_monitor_id else None, idempotency_key, timestamp)
+
+
+# Recently written keys
+
+class RecentKeys:
+    """
+    Ingest keys written by this process: an LRU of key -> shot ID, so a
+    retry is answered with a primary key lookup, and a Bloom filter over a
+    longer history, so keys it has never seen skip the database check.
+
+    Neither is authoritative; other processes write keys too, and the unique
+    constraint on Shot.ingest_key settles what these miss. When the filter
+    has taken ``bloom_capacity`` keys it starts over to keep its error rate.
+    """
+
+    def __init__(self, lru_size, bloom_capacity, error_rate=0.01):
+        self.lru_size = lru_size
+        self.bloom_capacity = max(bloom_capacity, 1)
+        self.bit_count = max(int(-self.bloom_capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hash_count = max(round(self.bit_count / self.bloom_capacity * math.log(2)), 1)
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()
+        self._bits = bytearray(self.bit_count // 8 + 1)
+        self._bloom_size = 0
+
+    def _positions(self, key):
+        # Keys are SHA-256 hex digests, so two slices give independent hashes for double hashing
+        first, second = int(key[:16], 16), int(key[16:32], 16) | 1
+        return [(first + index * second) % self.bit_count for index in range(self.hash_count)]
+
+    def get(self, key):
+        with self._lock:
+            shot_id = self._lru.get(key)
+            if shot_id is not None:
+                self._lru.move_to_end(key)
+            return shot_id
+
+    def might_contain(self, key):
+        with self._lock:
+            return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def add(self, key, shot_id=None):
+        with self._lock:
+            if shot_id is not None:
+                self._lru[key] = shot_id
+                self._lru.move_to_end(key)
+                while len(self._lru) > self.lru_size:
+                    self._lru.popitem(last=False)
+            if self._bloom_size >= self.bloom_capacity:
+                self._bits = bytearray(len(self._bits))
+                self._bloom_size = 0
+            for position in self._positions(key):
+                self._bits[position >> 3] |= 1 << (position & 7)
+            self._bloom_size += 1
+
+    def forget(self, key):
+        with self._lock:
+            self._lru.pop(key, None)
+
+
+_recent_keys = None
+_recent_keys_lock = threading.Lock()
+
+
+def get_recent_keys():
+    """Return the process-wide RecentKeys sized by the GOLF_IDEMPOTENCY_* settings"""
+    global _recent_keys
+    if _recent_keys is None:
+        with _recent_keys_lock:
+            if _recent_keys is None:
+                _recent_keys = RecentKeys(settings.GOLF_IDEMPOTENCY_CACHE_SIZE, settings.GOLF_IDEMPOTENCY_BLOOM_CAPACITY)
+    return _recent_keys
+
+
+def reset():
+    """Forget every key recorded by this process"""
+    global _recent_keys
+    with _recent_keys_lock:
+        _recent_keys = None
+
+
+def remember(shots):
+    """Record the keys of freshly written shots"""
+    recent = get_recent_keys()
+    for shot in shots:
+        if shot.ingest_key:
+            recent.add(shot.ingest_key, shot.pk)
+
+
+def existing_ids(keys):
+    """Map the given ingest keys that are already written to their shot IDs (one query)"""
+    keys = [key for key in keys if key]
+    if not keys:
+        return {}
+    return dict(Shot.objects.filter(ingest_key__in=keys).values_list('ingest_key', 'id'))
+
+
+def find_original(key, check_database=False):
+    """
+    The shot already written with ``key``, or None.
+
+    A key in the LRU costs one primary key lookup. Otherwise the database is
+    only asked when the Bloom filter cannot rule the key out, or with
+    ``check_database`` (after the unique constraint rejected an insert).
+    """
+    recent = get_recent_keys()
+    shots = Shot.objects.select_related('golfer', 'group', 'tournament')
+    shot_id = recent.get(key)
+    if shot_id is not None:
+        shot = shots.filter(pk=shot_id).first()
+        if shot is not None and shot.ingest_key == key:
+            return shot
+        # Deleted since; the key may have been written again by another process
+        recent.forget(key)
+    if check_database or recent.might_contain(key):
+        shot = shots.filter(ingest_key=key).first()
+        if shot is not None:
+            recent.add(key, shot.pk)
+        return shot
+    return None
@@ -0,0 +1,253 @@
+﻿import csv
+import io
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from rest_framework import serializers
+from rest_framework.fields import SkipField, empty
+
+from . import aggregates, caching, idempotency, leaderboards, realtime
+from .models import Golfer, Shot, Tournament
+from .serializers import SHOT_VALUE_RANGES, ShotSerializer
+
+# Writable shot fields accepted from launch monitors
+INGEST_FIELDS = [
+    'golfer', 'shot_number', 'hole_number', 'shot_type', 'club_used',
+    'ball_speed', 'club_head_speed', 'launch_angle', 'spin_rate',
+    'carry_distance', 'total_distance', 'side_angle',
+    'is_simulated', 'launch_monitor_id', 'notes', 'timestamp',
+]
+
+
+class ShotBatchValidator:
+    """
+    Validate a batch of shot payloads column by column.
+
+    Applies the same field conversion and plausibility rules as ShotSerializer,
+    but resolves every golfer reference with a single query and reports errors
+    per row instead of failing the whole batch.
+    """
+
+    def __init__(self):
+        serializer_fields = ShotSerializer().fields
+        self.fields = {
+            name: serializer_fields[name] for name in INGEST_FIELDS if name != 'golfer'
+        }
+
+    def validate(self, rows):
+        """Return (list of unsaved Shot instances, list of per-row errors)"""
+        errors = {}
+        values = [{} for _ in rows]
+
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                errors[index] = {'non_field_errors': ['Expected an object.']}
+        candidates = [index for index in range(len(rows)) if index not in errors]
+
+        # Convert and range-check one column at a time
+        for name, field in self.fields.items():
+            value_range = SHOT_VALUE_RANGES.get(name)
+            for index in candidates:
+                try:
+                    value = field.run_validation(rows[index].get(name, empty))
+                except SkipField:
+                    continue
+                except serializers.ValidationError as exc:
+                    errors.setdefault(index, {})[name] = exc.detail
+                    continue
+                if value_range and value is not None:
+                    low, high, message = value_range
+                    if value < low or value > high:
+                        errors.setdefault(index, {})[name] = [message]
+                        continue
+                values[index][name] = value
+
+        # Resolve golfer references and their current placement with one query
+        golfer_refs = {}
+        for index in candidates:
+            raw = rows[index].get('golfer')
+            if raw in (None, ''):
+                continue
+            try:
+                golfer_refs[index] = int(raw)
+            except (TypeError, ValueError):
+                errors.setdefault(index, {})['golfer'] = ['Incorrect type. Expected pk value.']
+        placements = {
+            golfer_id: (group_id, tournament_id)
+            for golfer_id, group_id, tournament_id in Golfer.objects.filter(
+                id__in=set(golfer_refs.values())
+            ).values_list('id', 'group_id', 'group__tournament_id')
+        }
+        for index, golfer_id in golfer_refs.items():
+            if golfer_id in placements:
+                values[index]['golfer_id'] = golfer_id
+                values[index]['group_id'], values[index]['tournament_id'] = placements[golfer_id]
+            else:
+                errors.setdefault(index, {})['golfer'] = [
+                    f'Invalid pk "{golfer_id}" - object does not exist.'
+                ]
+
+        # Rows a launch monitor sends again get the same ingest key
+        for index in candidates:
+            if index in errors:
+                continue
+            try:
+                idempotency_key = idempotency.clean_idempotency_key(rows[index].get('idempotency_key'))
+            except serializers.ValidationError as exc:
+                errors.setdefault(index, {})['idempotency_key'] = exc.detail
+                continue
+            values[index]['ingest_key'] = idempotency.shot_key(
+                values[index].get('launch_monitor_id'), idempotency_key, values[index].get('timestamp')
+            )
+
+        shots = [Shot(**values[index]) for index in candidates if index not in errors]
+        row_errors = [{'index': index, 'errors': errors[index]} for index in sorted(errors)]
+        return shots, row_errors
+
+
+def _copy_shots(shots):
+    """Insert shots with PostgreSQL COPY"""
+    fields = [field for field in Shot._meta.concrete_fields if not field.primary_key]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for shot in shots:
+        # None is written as an unquoted empty value, which COPY reads as NULL
+        writer.writerow([
+            field.get_db_prep_save(field.pre_save(shot, add=True), connection)
+            for field in fields
+        ])
+    buffer.seek(0)
+
+    table = connection.ops.quote_name(Shot._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+def insert_shots(shots, allow_copy=True):
+    """
+    Write validated shots, choosing COPY or bulk_create; returns (count, method).
+
+    Callers that need the new primary keys on the instances pass
+    ``allow_copy=False``, as COPY does not return them. Shots without a
+    shot_number are numbered in the same transaction.
+    """
+    if not shots:
+        return 0, None
+    use_copy = (
+        allow_copy
+        and connection.vendor == 'postgresql'
+        and len(shots) >= settings.GOLF_INGEST_COPY_THRESHOLD
+    )
+    # Numbers allocated by a rolled back insert are handed out again, so a retry must ask anew
+    unnumbered = [shot for shot in shots if shot.shot_number is None]
+    try:
+        with transaction.atomic():
+            Shot.assign_numbers(shots)
+            if use_copy:
+                _copy_shots(shots)
+                # bulk_create widens the tournaments' shot windows itself
+                Tournament.objects.cover_shots((shot.tournament_id, shot.timestamp) for shot in shots)
+                method = 'copy'
+            else:
+                Shot.objects.bulk_create(shots, batch_size=settings.GOLF_INGEST_BATCH_SIZE)
+                method = 'bulk_create'
+            aggregates.apply(added=aggregates.entries_for_shots(shots))
+            leaderboards.record_shots(shots)
+
+            caching.bump('shot', {shot.tournament_id for shot in shots})
+
+            # COPY does not hand back primary keys, so those subscribers are told to refetch
+            if all(shot.pk for shot in shots):
+                realtime.publish_shots(shot.pk for shot in shots)
+            else:
+                realtime.publish_resync((shot.golfer_id, shot.group_id, shot.tournament_id) for shot in shots)
+    except Exception:
+        for shot in unnumbered:
+            shot.shot_number = None
+        raise
+    return len(shots), method
+
+
+def insert_once(shots, allow_copy=True):
+    """
+    Insert the shots whose ingest key has not been written yet.
+
+    Repeats within the batch, and keys the process-wide Bloom filter may have
+    seen (checked with one query), are skipped up front. Everything else is
+    inserted optimistically; if the unique constraint still rejects the
+    batch because another writer got there first, the taken keys are looked
+    up and the rest inserted again. Returns (count, method, duplicates) with
+    duplicates mapping positions in ``shots`` to the ID of the original shot.
+    """
+    recent = idempotency.get_recent_keys()
+    first_positions = {}
+    repeats = {}
+    suspects = []
+    for position, shot in enumerate(shots):
+        key = shot.ingest_key
+        if not key:
+            continue
+        if key in first_positions:
+            repeats[position] = first_positions[key]
+            continue
+        first_positions[key] = position
+        if recent.might_contain(key):
+            suspects.append(key)
+    taken = idempotency.existing_ids(suspects)
+
+    for attempt in range(2):
+        fresh = [
+            shot for position, shot in enumerate(shots)
+            if position not in repeats and not (shot.ingest_key and shot.ingest_key in taken)
+        ]
+        try:
+            created_count, method = insert_shots(fresh, allow_copy)
+            break
+        except IntegrityError:
+            for shot in fresh:
+                shot.pk = None
+                shot._state.adding = True
+            if attempt:
+                raise
+            taken.update(idempotency.existing_ids(key for key in first_positions if key not in taken))
+    idempotency.remember(fresh)
+    # COPY hands back no primary keys for the originals of in-batch repeats
+    taken.update(idempotency.existing_ids({
+        shots[first].ingest_key for first in repeats.values()
+        if not shots[first].pk and shots[first].ingest_key not in taken
+    }))
+
+    duplicates = {}
+    for position, shot in enumerate(shots):
+        if position in repeats:
+            first = shots[repeats[position]]
+            duplicates[position] = taken.get(first.ingest_key) or first.pk
+        elif shot.ingest_key and shot.ingest_key in taken:
+            duplicates[position] = taken[shot.ingest_key]
+    return created_count, method, duplicates
+
+
+def ingest_shots(rows):
+    """Validate and insert a batch of raw shot payloads, returning a summary"""
+    started = time.perf_counter()
+    shots, row_errors = ShotBatchValidator().validate(rows)
+    created_count, method, duplicates = insert_once(shots)
+    elapsed = time.perf_counter() - started
+
+    rejected = {row_error['index'] for row_error in row_errors}
+    row_indexes = [index for index in range(len(rows)) if index not in rejected]
+    return {
+        'received': len(rows),
+        'created_count': created_count,
+        'duplicate_count': len(duplicates),
+        'duplicates': [
+            {'index': row_indexes[position], 'id': shot_id} for position, shot_id in sorted(duplicates.items())
+        ],
+        'error_count': len(row_errors),
+        'errors': row_errors,
+        'insert_method': method,
+        'elapsed_ms': round(elapsed * 1000, 2),
+        'rows_per_second': round(len(rows) / elapsed, 1) if elapsed > 0 else None,
+    }
@@ -0,0 +1,251 @@
+﻿import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Histograms recorded per (view, method), with their help text and upper bucket bounds
+HISTOGRAMS = {
+    'golf_http_request_duration_seconds': (
+        'Time spent handling the request',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    ),
+    'golf_http_request_db_queries': (
+        'SQL statements executed per request',
+        (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000),
+    ),
+    'golf_http_request_db_duration_seconds': (
+        'Time spent executing SQL per request',
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    ),
+    'golf_http_request_serializer_duration_seconds': (
+        'Time spent turning rows or instances into response data per request',
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    ),
+    'golf_http_response_size_bytes': (
+        'Size of non-streaming response bodies',
+        (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216),
+    ),
+}
+COUNTERS = {
+    'golf_http_requests_total': 'Requests handled, by view, method and status',
+    'golf_http_slow_requests_total': 'Requests slower than GOLF_SLOW_REQUEST_MS',
+}
+
+
+class RequestStats:
+    """Measurements of the request being handled"""
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializer_depth = 0
+        # SQL text (with placeholders, so repeats with other parameters match) -> [count, seconds]
+        self.statements = {}
+
+    def record_query(self, sql, seconds):
+        self.query_count += 1
+        self.db_seconds += seconds
+        entry = self.statements.setdefault(sql, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def repeated_statements(self, limit):
+        """The most executed statements run more than once, as (count, seconds, sql)"""
+        repeated = [(count, seconds, sql) for sql, (count, seconds) in self.statements.items() if count > 1]
+        return sorted(repeated, key=lambda entry: (-entry[0], -entry[1]))[:limit]
+
+
+_current = ContextVar('golf_request_stats', default=None)
+
+
+@contextmanager
+def timed_serialization():
+    """
+    Add the time spent inside the block to the current request's serializer
+    time. Nested blocks (a serializer rendering another) count once.
+    """
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    stats.serializer_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serializer_depth -= 1
+        if not stats.serializer_depth:
+            stats.serializer_seconds += time.perf_counter() - started
+
+
+class TimedSerializerMixin:
+    """Serializer mixin recording to_representation time in the request metrics"""
+
+    def to_representation(self, instance):
+        with timed_serialization():
+            return super().to_representation(instance)
+
+
+def _query_recorder(stats):
+    def record(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            stats.record_query(sql, time.perf_counter() - started)
+    return record
+
+
+# Per-process registry
+#
+# Like the cache counters in caching.py these are kept per worker process;
+# Prometheus tells processes apart by the instance it scrapes.
+
+_counters = Counter()
+_histograms = {}
+_registry_lock = threading.Lock()
+
+
+def _observe(name, labels, value):
+    bounds = HISTOGRAMS[name][1]
+    entry = _histograms.get((name, labels))
+    if entry is None:
+        entry = _histograms[(name, labels)] = {'buckets': [0] * len(bounds), 'sum': 0.0, 'count': 0}
+    position = bisect_left(bounds, value)
+    if position < len(bounds):
+        entry['buckets'][position] += 1
+    entry['sum'] += value
+    entry['count'] += 1
+
+
+def record(view, method, status_code, duration, stats, size):
+    labels = (('method', method), ('view', view))
+    with _registry_lock:
+        _counters[('golf_http_requests_total', labels + (('status', str(status_code)),))] += 1
+        _observe('golf_http_request_duration_seconds', labels, duration)
+        _observe('golf_http_request_db_queries', labels, stats.query_count)
+        _observe('golf_http_request_db_duration_seconds', labels, stats.db_seconds)
+        _observe('golf_http_request_serializer_duration_seconds', labels, stats.serializer_seconds)
+        if size is not None:
+            _observe('golf_http_response_size_bytes', labels, size)
+        if _is_slow(duration):
+            _counters[('golf_http_slow_requests_total', labels)] += 1
+
+
+def reset():
+    """Forget everything recorded by this process"""
+    with _registry_lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _is_slow(duration):
+    threshold = settings.GOLF_SLOW_REQUEST_MS
+    return bool(threshold) and duration * 1000 >= threshold
+
+
+def _format_labels(labels):
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def prometheus_text():
+    """Every recorded metric in the Prometheus text exposition format"""
+    with _registry_lock:
+        counters = dict(_counters)
+        histograms = {key: {**entry, 'buckets': list(entry['buckets'])} for key, entry in _histograms.items()}
+
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+    for name, (help_text, bounds) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for (metric, labels), entry in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(bounds, entry['buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", _format_value(bound)),))} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {entry["count"]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(entry["sum"])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {entry["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint for the metrics of this worker process"""
+    return HttpResponse(prometheus_text(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+class RequestMetricsMiddleware:
+    """
+    Record latency, SQL query count and time, serializer time and response
+    size for every request, labelled by the resolved view name and method.
+
+    Queries are timed with a database execute wrapper for the duration of the
+    request. Streaming responses (exports) are measured up to the point the
+    response is returned, so their body size and the queries run while it
+    streams are not included. Requests slower than GOLF_SLOW_REQUEST_MS are
+    logged with their most repeated SQL statements.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.GOLF_METRICS_ENABLED:
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_query_recorder(stats)))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        size = None if response.streaming else len(response.content)
+        record(view, request.method, response.status_code, duration, stats, size)
+        if _is_slow(duration):
+            self.log_slow_request(request, view, response, duration, stats)
+        return response
+
+    @staticmethod
+    def log_slow_request(request, view, response, duration, stats):
+        lines = [
+            f'Slow request: {request.method} {request.get_full_path()} ({view}) -> {response.status_code} '
+            f'in {duration * 1000:.1f} ms; {stats.query_count} queries in {stats.db_seconds * 1000:.1f} ms, '
+            f'serializers {stats.serializer_seconds * 1000:.1f} ms'
+        ]
+        for count, seconds, sql in stats.repeated_statements(settings.GOLF_SLOW_REQUEST_TOP_SQL):
+            lines.append(f'  {count}x ({seconds * 1000:.1f} ms): {sql}')
+        logger.warning('\n'.join(lines))
@@ -0,0 +1,222 @@
+﻿import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job, JobCancelled
+
+logger = logging.getLogger(__name__)
+
+# Job kind -> handler called as handler(job, **job.params); its return value is stored as the result.
+# Handlers must be safe to run again after a partial run, since failed jobs are retried.
+HANDLERS = {
+    'bulk_delete': 'golf_metrics_app.deletion.run_bulk_delete',
+    'export_shots': 'golf_metrics_app.exports.run_export',
+    'import_roster': 'golf_metrics_app.roster.run_import',
+    'rebuild_aggregates': 'golf_metrics_app.aggregates.run_rebuild',
+}
+
+
+def enqueue(kind, params=None, max_attempts=None):
+    """
+    Record a job and hand it to the configured runner once the enqueueing
+    transaction commits.
+
+    GOLF_JOB_RUNNER picks the runner: 'worker' leaves the job queued for
+    ``manage.py run_workers``, 'thread' runs it on a daemon thread of this
+    process and 'inline' has finished it by the time this returns.
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    job = Job.objects.create(
+        kind=kind,
+        params=params or {},
+        max_attempts=max_attempts or settings.GOLF_JOB_MAX_ATTEMPTS,
+    )
+    dispatch(job)
+    return job
+
+
+def dispatch(job):
+    """Start a pending job with the configured runner"""
+    if settings.GOLF_JOB_RUNNER == 'inline':
+        run_to_completion(job.pk)
+        job.refresh_from_db()
+    elif settings.GOLF_JOB_RUNNER == 'thread':
+        transaction.on_commit(lambda: start_thread(job.pk))
+
+
+def start_thread(job_id):
+    threading.Thread(target=_run_in_thread, args=(job_id,), name=f'golf-job-{job_id}', daemon=True).start()
+
+
+def _run_in_thread(job_id):
+    try:
+        run_to_completion(job_id)
+    finally:
+        # Threads get their own connection, which Django never closes for them
+        connection.close()
+
+
+def run_to_completion(job_id):
+    """Run a job, waiting out and running its retries, until it settles"""
+    while True:
+        job = run(job_id)
+        if job is None or job.status != 'pending':
+            return job
+        time.sleep(max((job.run_after - timezone.now()).total_seconds(), 0))
+
+
+# Claiming
+
+def _claim(job_id, worker):
+    """Move a pending job to running; False when another runner got there first"""
+    now = timezone.now()
+    return bool(Job.objects.filter(pk=job_id, status='pending').update(
+        status='running',
+        attempts=F('attempts') + 1,
+        worker=worker,
+        started_at=now,
+        heartbeat_at=now,
+        finished_at=None,
+    ))
+
+
+def claim_next(worker):
+    """
+    Claim the oldest due pending job, or return None.
+
+    On PostgreSQL the candidate row is locked with FOR UPDATE SKIP LOCKED, so
+    concurrent workers each take a different job without waiting on each
+    other. Elsewhere the conditional UPDATE in _claim settles races; it runs
+    outside a transaction there, as SQLite cannot upgrade a read lock that
+    another process shares.
+    """
+    candidates = Job.objects.filter(status='pending', run_after__lte=timezone.now()).order_by('run_after', 'id')
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job_id = candidates.select_for_update(skip_locked=True).values_list('id', flat=True).first()
+            claimed = job_id is not None and _claim(job_id, worker)
+    else:
+        job_id = candidates.values_list('id', flat=True).first()
+        claimed = job_id is not None and _claim(job_id, worker)
+    return Job.objects.get(pk=job_id) if claimed else None
+
+
+def requeue_stale():
+    """
+    Recover jobs whose runner died: running jobs without a heartbeat for
+    GOLF_JOB_STALE_SECONDS are retried, or failed once out of attempts.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.GOLF_JOB_STALE_SECONDS)
+    stale = Job.objects.filter(status='running', heartbeat_at__lt=cutoff)
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+        status='pending', run_after=timezone.now(), error='Runner stopped responding; retrying'
+    )
+    failed = stale.update(status='failed', error='Runner stopped responding', finished_at=timezone.now())
+    return requeued, failed
+
+
+# Execution
+
+def run(job_id, worker=''):
+    """
+    Claim and execute a pending job, returning it afterwards (None when it
+    was not pending). The claim is a conditional UPDATE, so a job runs at most
+    once however many runners pick it up.
+    """
+    if not _claim(job_id, worker or threading.current_thread().name):
+        return None
+    return execute(Job.objects.get(pk=job_id))
+
+
+def execute(job):
+    """Run a claimed job's handler and record how it ended"""
+    try:
+        result = import_string(HANDLERS[job.kind])(job, **job.params)
+    except JobCancelled:
+        Job.objects.filter(pk=job.pk).update(status='cancelled', finished_at=timezone.now())
+    except Exception as exc:
+        logger.exception("Job %s (%s) failed on attempt %s", job.pk, job.kind, job.attempts)
+        error = f'{type(exc).__name__}: {exc}'
+        if job.attempts < job.max_attempts:
+            # Back off exponentially: the delay doubles with every attempt
+            delay = settings.GOLF_JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            Job.objects.filter(pk=job.pk, status='running').update(
+                status='pending', error=error, run_after=timezone.now() + timedelta(seconds=delay)
+            )
+        else:
+            Job.objects.filter(pk=job.pk).update(status='failed', error=error, finished_at=timezone.now())
+    else:
+        Job.objects.filter(pk=job.pk).update(
+            status='succeeded', result=result, error='', finished_at=timezone.now()
+        )
+    job.refresh_from_db()
+    return job
+
+
+def work(worker, poll_interval=1.0, once=False, stop=None):
+    """
+    Worker loop: claim and execute due jobs until ``stop`` is set, or with
+    ``once`` until the queue has nothing due. Returns the number of jobs run.
+    """
+    executed = 0
+    while stop is None or not stop.is_set():
+        try:
+            job = claim_next(worker)
+            if job is None:
+                requeue_stale()
+        except DatabaseError:
+            # A busy or briefly unavailable database only delays the next poll
+            logger.warning("%s could not poll the job queue", worker, exc_info=True)
+            connection.close_if_unusable_or_obsolete()
+            job = None
+        if job is None:
+            if once:
+                break
+            if stop is not None:
+                stop.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+            continue
+        logger.info("%s running job %s (%s)", worker, job.pk, job.kind)
+        execute(job)
+        executed += 1
+    return executed
+
+
+# Control
+
+def cancel(job):
+    """
+    Cancel a job: a pending job is cancelled right away, a running one stops
+    at its next progress report. Returns False when the job already finished.
+    """
+    if Job.objects.filter(pk=job.pk, status='pending').update(status='cancelled', finished_at=timezone.now()):
+        return True
+    return bool(Job.objects.filter(pk=job.pk, status='running').update(cancel_requested=True))
+
+
+def retry(job):
+    """Queue a failed or cancelled job again with a fresh set of attempts; False otherwise"""
+    requeued = Job.objects.filter(pk=job.pk, status__in=['failed', 'cancelled']).update(
+        status='pending',
+        attempts=0,
+        cancel_requested=False,
+        run_after=timezone.now(),
+        progress={},
+        result=None,
+        error='',
+        started_at=None,
+        finished_at=None,
+    )
+    if requeued:
+        job.refresh_from_db()
+        dispatch(job)
+    return bool(requeued)
@@ -0,0 +1,223 @@
+﻿import bisect
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from rest_framework import serializers
+
+from .models import Golfer, LeaderboardSnapshot, Shot
+
+# Shot columns with a leaderboard, ranked highest first
+METRICS = ['carry_distance', 'total_distance', 'ball_speed', 'smash_factor']
+# Columns a shot row needs to be placed on its boards
+ROW_FIELDS = ['id', 'tournament_id', 'golfer_id', 'shot_type', 'club_used', 'hole_number', 'timestamp', *METRICS]
+
+_timestamp_field = serializers.DateTimeField()
+
+
+def board_key(metric, shot_type='', club_used=''):
+    """Snapshot key of a board; an empty shot type or club means any"""
+    return f'{metric}|{shot_type or ""}|{club_used or ""}'
+
+
+def _board_keys(row):
+    """Keys of every board a shot row competes on"""
+    shot_type, club = row['shot_type'] or '', row['club_used'] or ''
+    scopes = {('', ''), (shot_type, ''), ('', club), (shot_type, club)}
+    return [
+        (metric, board_key(metric, *scope))
+        for metric in METRICS if row[metric] is not None
+        for scope in sorted(scopes)
+    ]
+
+
+def _entry(row, metric):
+    places = Shot._meta.get_field(metric).decimal_places
+    return {
+        'shot_id': row['id'],
+        'value': f"{Decimal(str(row[metric])).quantize(Decimal(1).scaleb(-places)):f}",
+        'golfer_id': row['golfer_id'],
+        'shot_type': row['shot_type'],
+        'club_used': row['club_used'],
+        'hole_number': row['hole_number'],
+        'timestamp': _timestamp_field.to_representation(row['timestamp']) if row['timestamp'] else None,
+    }
+
+
+def _rank_key(entry):
+    return -Decimal(entry['value']), entry['shot_id']
+
+
+def _insert(board, entry, size):
+    """Insert ``entry`` into the ranked ``board`` (replacing the same shot) and trim it to ``size``"""
+    board[:] = [existing for existing in board if existing['shot_id'] != entry['shot_id']]
+    keys = [_rank_key(existing) for existing in board]
+    position = bisect.bisect(keys, _rank_key(entry))
+    if position < size:
+        board.insert(position, entry)
+        del board[size:]
+
+
+def row_for_pk(pk):
+    """The stored ROW_FIELDS of one shot, or None"""
+    return Shot.objects.filter(pk=pk).values(*ROW_FIELDS).first()
+
+
+def build_boards(tournament_id, size):
+    """
+    Compute every board of a tournament from the Shot table.
+
+    One windowed query per metric keeps the top ``size`` shots of each
+    (shot type, club) pair; the "any" boards are the best of those.
+    """
+    boards = {}
+    for metric in METRICS:
+        rows = Shot.objects.for_tournament(tournament_id).filter(**{f'{metric}__isnull': False}).annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=[F('shot_type'), F('club_used')],
+                order_by=[F(metric).desc(), F('id').asc()],
+            )
+        ).filter(position__lte=size).values(*ROW_FIELDS)
+        for row in rows:
+            for row_metric, key in _board_keys(row):
+                if row_metric == metric:
+                    _insert(boards.setdefault(key, []), _entry(row, metric), size)
+    return boards
+
+
+def _query_board(tournament_id, key, size):
+    metric, shot_type, club_used = key.split('|')
+    shots = Shot.objects.for_tournament(tournament_id).filter(**{f'{metric}__isnull': False})
+    if shot_type:
+        shots = shots.filter(shot_type=shot_type)
+    if club_used:
+        shots = shots.filter(club_used=club_used)
+    rows = shots.order_by(F(metric).desc(), 'id').values(*ROW_FIELDS)[:size]
+    return [_entry(row, metric) for row in rows]
+
+
+def rebuild(tournament_id):
+    """Recompute and persist a tournament's snapshot"""
+    size = settings.GOLF_LEADERBOARD_SIZE
+    with transaction.atomic():
+        # Hold the row lock while reading shots so no incremental update is lost in between
+        snapshot, _ = LeaderboardSnapshot.objects.select_for_update().get_or_create(
+            tournament_id=tournament_id, defaults={'size': size, 'is_stale': True}
+        )
+        snapshot.boards = build_boards(tournament_id, size)
+        snapshot.size = size
+        snapshot.is_stale = False
+        snapshot.save()
+    return snapshot
+
+
+def get_snapshot(tournament_id):
+    """The tournament's current snapshot, built first when missing, stale or sized differently"""
+    snapshot = LeaderboardSnapshot.objects.filter(tournament_id=tournament_id).first()
+    if snapshot is None or snapshot.is_stale or snapshot.size != settings.GOLF_LEADERBOARD_SIZE:
+        snapshot = rebuild(tournament_id)
+    return snapshot
+
+
+def invalidate(tournament_ids=None):
+    """Mark snapshots for a rebuild on their next read; None marks every tournament"""
+    snapshots = LeaderboardSnapshot.objects.all()
+    if tournament_ids is not None:
+        snapshots = snapshots.filter(tournament_id__in=[pk for pk in tournament_ids if pk])
+    snapshots.update(is_stale=True)
+
+
+def apply(added=(), removed=()):
+    """
+    Fold added and removed shot rows (ROW_FIELDS dicts) into the snapshots.
+
+    An edit is the shot's old row removed plus its new row added. A board
+    holding fewer than ``size`` entries holds every qualifying shot, so only
+    a full board that loses an entry has to be read back from the Shot table.
+    Tournaments without a fresh snapshot are left for their next read.
+    """
+    changes = {}
+    for rows, index in ((removed, 0), (added, 1)):
+        for row in rows:
+            if row and row['tournament_id']:
+                changes.setdefault(row['tournament_id'], ([], []))[index].append(row)
+    if not changes:
+        return
+
+    size = settings.GOLF_LEADERBOARD_SIZE
+    with transaction.atomic():
+        # Lock snapshots in a stable order so concurrent writers cannot deadlock
+        for tournament_id in sorted(changes):
+            snapshot = LeaderboardSnapshot.objects.select_for_update().filter(tournament_id=tournament_id).first()
+            if snapshot is None or snapshot.is_stale or snapshot.size != size:
+                continue
+            removed_rows, added_rows = changes[tournament_id]
+            boards = snapshot.boards
+            refill = set()
+            for row in removed_rows:
+                for _, key in _board_keys(row):
+                    board = boards.get(key, [])
+                    kept = [entry for entry in board if entry['shot_id'] != row['id']]
+                    if len(kept) != len(board):
+                        if len(board) >= size:
+                            refill.add(key)
+                        boards[key] = kept
+            for row in added_rows:
+                for metric, key in _board_keys(row):
+                    if key not in refill:
+                        _insert(boards.setdefault(key, []), _entry(row, metric), size)
+            for key in refill:
+                boards[key] = _query_board(tournament_id, key, size)
+            snapshot.boards = {key: board for key, board in boards.items() if board}
+            snapshot.save(update_fields=['boards', 'updated_at'])
+
+
+def record_shots(shots):
+    """Add newly inserted shots; without primary keys (COPY) their tournaments are rebuilt instead"""
+    if all(shot.pk for shot in shots):
+        apply(added=[{name: getattr(shot, name) for name in ROW_FIELDS} for shot in shots])
+    else:
+        invalidate({shot.tournament_id for shot in shots})
+
+
+def read(tournament_id, metrics=None, shot_type='', club_used='', limit=None):
+    """
+    Ranked boards of a tournament for one shot type / club scope.
+
+    Ties share a rank (1, 2, 2, 4). Golfer names are looked up at read time
+    so renames show up without touching the snapshot.
+    """
+    snapshot = get_snapshot(tournament_id)
+    limit = min(limit or snapshot.size, snapshot.size)
+    boards = {
+        metric: snapshot.boards.get(board_key(metric, shot_type, club_used), [])[:limit]
+        for metric in metrics or METRICS
+    }
+    golfer_ids = {entry['golfer_id'] for board in boards.values() for entry in board if entry['golfer_id']}
+    names = {
+        golfer.id: golfer.full_name
+        for golfer in Golfer.objects.filter(id__in=golfer_ids).only('first_name', 'last_name').order_by()
+    }
+
+    leaderboards = {}
+    for metric, board in boards.items():
+        ranked = []
+        for position, entry in enumerate(board, start=1):
+            tied = ranked and ranked[-1]['value'] == entry['value']
+            ranked.append({
+                'rank': ranked[-1]['rank'] if tied else position,
+                **entry,
+                'golfer_name': names.get(entry['golfer_id']),
+            })
+        leaderboards[metric] = ranked
+    return {
+        'tournament_id': tournament_id,
+        'shot_type': shot_type or None,
+        'club_used': club_used or None,
+        'size': limit,
+        'updated_at': snapshot.updated_at,
+        'leaderboards': leaderboards,
+    }
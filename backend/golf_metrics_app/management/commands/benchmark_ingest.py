@@ -0,0 +1,109 @@
+﻿import random
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from golf_metrics_app import buffering, deletion
+from golf_metrics_app.models import Shot
+
+BENCHMARK_MONITOR = 'bench-ingest'
+MODES = ('direct', 'buffered')
+
+
+def shot_payload(number):
+    ball_speed = random.uniform(120, 180)
+    return {
+        'shot_number': number,
+        'club_used': 'driver',
+        'ball_speed': f'{ball_speed:.2f}',
+        'club_head_speed': f'{ball_speed / random.uniform(1.35, 1.5):.2f}',
+        'carry_distance': f'{random.uniform(200, 300):.2f}',
+        'launch_monitor_id': BENCHMARK_MONITOR,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput and p50/p99 POST latency of single-shot creates "
+        "written directly against the micro-batching write buffer"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shots', type=int, default=2000, help="Shots posted per mode")
+        parser.add_argument('--clients', type=int, default=1, help="Concurrent posting threads")
+        parser.add_argument('--durability', choices=buffering.DURABILITY_MODES, action='append',
+                            help="Buffer durability to benchmark (default: all)")
+        parser.add_argument('--keep', action='store_true', help="Keep the posted shots")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'mode':<20}{'shots':>8}{'shots/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'written':>9}"
+        )
+        self.report('direct', self.run(options, buffered=False))
+        with tempfile.TemporaryDirectory() as spill_dir:
+            for durability in options['durability'] or buffering.DURABILITY_MODES:
+                with override_settings(GOLF_SHOT_BUFFER_ENABLED=True, GOLF_SHOT_BUFFER_DURABILITY=durability,
+                                       GOLF_SHOT_BUFFER_SPILL_DIR=spill_dir):
+                    self.report(f'buffered ({durability})', self.run(options, buffered=True))
+
+        if not options['keep']:
+            ids = list(Shot.objects.filter(launch_monitor_id=BENCHMARK_MONITOR).values_list('id', flat=True))
+            if ids:
+                deletion.bulk_delete('shot', ids)
+
+    def run(self, options, buffered):
+        """Post the shots from ``clients`` threads; returns (latencies, seconds until all were written, written)"""
+        before = Shot.objects.filter(launch_monitor_id=BENCHMARK_MONITOR).count()
+        url = '/api/shots/?buffered=true' if buffered else '/api/shots/'
+        per_client = max(options['shots'] // options['clients'], 1)
+        latencies = []
+        lock = threading.Lock()
+
+        def post_shots(offset):
+            client = APIClient(SERVER_NAME=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost')
+            samples = []
+            try:
+                for number in range(offset, offset + per_client):
+                    started = time.perf_counter()
+                    response = client.post(url, shot_payload(number), format='json')
+                    samples.append(time.perf_counter() - started)
+                    if response.status_code not in (201, 202):
+                        raise RuntimeError(f'POST {url} returned {response.status_code}: {response.content[:200]}')
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(samples)
+
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=post_shots, args=(index * per_client + 1,))
+            for index in range(options['clients'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if buffered:
+            # Throughput counts until the last buffered shot is in the database
+            buffering.shutdown()
+        elapsed = time.perf_counter() - started
+        written = Shot.objects.filter(launch_monitor_id=BENCHMARK_MONITOR).count() - before
+        return latencies, elapsed, written
+
+    def report(self, mode, result):
+        latencies, elapsed, written = result
+        if len(latencies) < 2:
+            self.stdout.write(f"{mode:<20} not enough shots posted")
+            return
+        percentiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"{mode:<20}{len(latencies):>8}{written / elapsed:>10,.0f}{percentiles[49] * 1000:>9.2f}"
+            f"{percentiles[98] * 1000:>9.2f}{max(latencies) * 1000:>9.2f}{written:>9}"
+        )
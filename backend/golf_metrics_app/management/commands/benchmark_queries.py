@@ -0,0 +1,168 @@
+﻿import importlib
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from golf_metrics_app import aggregates
+from golf_metrics_app.models import Tournament, Group, Golfer, Shot
+
+BENCHMARK_PREFIX = 'bench-'
+TRIGRAM_INDEXES = importlib.import_module(
+    'golf_metrics_app.migrations.0004_filter_path_indexes'
+).TRIGRAM_INDEXES
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the viewset filter paths and print their query plans, with and "
+        "without the filter-path indexes, optionally on a seeded dataset"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed-shots', type=int, default=0,
+                            help="Seed a benchmark tournament with this many shots first")
+        parser.add_argument('--golfers', type=int, default=300, help="Golfers to seed")
+        parser.add_argument('--runs', type=int, default=5, help="Timed runs per query")
+        parser.add_argument('--no-plans', action='store_true', help="Only print timings")
+        parser.add_argument('--cleanup', action='store_true', help="Delete the seeded dataset afterwards")
+
+    def handle(self, *args, **options):
+        if options['seed_shots']:
+            self.seed(options['seed_shots'], options['golfers'])
+
+        tournament = Tournament.objects.order_by('-id').first()
+        golfer = Golfer.objects.filter(shots__isnull=False).order_by('-id').first()
+        queries = self.build_queries(tournament, golfer)
+
+        self.stdout.write(self.style.MIGRATE_HEADING("With indexes"))
+        with_indexes = self.run_queries(queries, options)
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Without filter-path indexes"))
+        try:
+            with transaction.atomic():
+                self.drop_indexes()
+                without_indexes = self.run_queries(queries, options)
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Summary (median ms)"))
+        self.stdout.write(f"{'query':<34}{'without':>12}{'with':>12}{'speedup':>10}")
+        for name in with_indexes:
+            before, after = without_indexes[name], with_indexes[name]
+            speedup = f"{before / after:.1f}x" if after else '-'
+            self.stdout.write(f"{name:<34}{before:>12.2f}{after:>12.2f}{speedup:>10}")
+
+        if options['cleanup']:
+            self.cleanup()
+
+    def build_queries(self, tournament, golfer):
+        """Querysets mirroring the hot filter paths of the viewsets"""
+        shots = Shot.objects.select_related('golfer', 'group', 'tournament').order_by('-timestamp', 'shot_number')
+        queries = {
+            'shots: latest page': shots,
+            'shots: by shot_type': shots.filter(shot_type='approach'),
+            'shots: by club_used': shots.filter(club_used='7iron'),
+            'shots: by hole_number': shots.filter(hole_number=7),
+            'golfers: search': Golfer.objects.filter(last_name__icontains='son').order_by('last_name', 'first_name'),
+            'tournaments: active': Tournament.objects.filter(is_active=True).order_by('-start_date', 'name'),
+        }
+        if golfer:
+            queries['shots: by golfer'] = shots.filter(golfer_id=golfer.id)
+        if tournament:
+            queries['shots: by tournament'] = shots.filter(tournament_id=tournament.id)
+        return queries
+
+    def run_queries(self, queries, options):
+        timings = {}
+        for name, queryset in queries.items():
+            page = queryset[:10]
+            samples = []
+            for _ in range(options['runs']):
+                started = time.perf_counter()
+                list(page.all())
+                samples.append((time.perf_counter() - started) * 1000)
+            timings[name] = statistics.median(samples)
+            self.stdout.write(f"{name}: {timings[name]:.2f} ms")
+            if not options['no_plans']:
+                explain_options = {'analyze': True} if connection.vendor == 'postgresql' else {}
+                for line in page.explain(**explain_options).splitlines():
+                    self.stdout.write(f"    {line}")
+        return timings
+
+    def drop_indexes(self):
+        names = [index.name for model in (Tournament, Golfer, Shot) for index in model._meta.indexes]
+        if connection.vendor == 'postgresql':
+            names += [name for name, _, _ in TRIGRAM_INDEXES]
+        with connection.cursor() as cursor:
+            for name in names:
+                cursor.execute(f'DROP INDEX IF EXISTS {connection.ops.quote_name(name)}')
+
+    def seed(self, shot_count, golfer_count):
+        if Golfer.objects.filter(golfer_id__startswith=BENCHMARK_PREFIX).exists():
+            self.cleanup()
+        self.stdout.write(f"Seeding {golfer_count} golfers and {shot_count} shots...")
+        rng = random.Random(42)
+        surnames = ['Anderson', 'Johnson', 'Nilsson', 'Garcia', 'Smith', 'Watson', 'Kim', 'Olsen']
+        clubs = [choice for choice, _ in Shot.CLUB_CHOICES]
+        shot_types = [choice for choice, _ in Shot.SHOT_TYPE_CHOICES]
+
+        tournament = Tournament.objects.create(
+            name=f'{BENCHMARK_PREFIX}tournament', start_date=date.today(), end_date=date.today()
+        )
+        groups = [Group.objects.create(tournament=tournament) for _ in range(max(1, golfer_count // 4))]
+        Golfer.objects.bulk_create([
+            Golfer(
+                golfer_id=f'{BENCHMARK_PREFIX}{index}',
+                first_name=f'Player{index}',
+                last_name=rng.choice(surnames),
+                group=groups[index % len(groups)],
+            )
+            for index in range(golfer_count)
+        ])
+        placements = dict(
+            Golfer.objects.filter(golfer_id__startswith=BENCHMARK_PREFIX).values_list('id', 'group_id')
+        )
+        golfer_ids = list(placements)
+
+        now = timezone.now()
+        batch = []
+        for index in range(shot_count):
+            golfer_id = rng.choice(golfer_ids)
+            batch.append(Shot(
+                golfer_id=golfer_id,
+                group_id=placements[golfer_id],
+                tournament_id=tournament.id,
+                shot_number=index % 72 + 1,
+                hole_number=rng.randint(1, 18),
+                shot_type=rng.choice(shot_types),
+                club_used=rng.choice(clubs),
+                ball_speed=round(rng.uniform(60, 180), 2),
+                carry_distance=round(rng.uniform(20, 320), 2),
+                timestamp=now - timedelta(seconds=index),
+            ))
+            if len(batch) == 5000:
+                Shot.objects.bulk_create(batch)
+                batch = []
+        Shot.objects.bulk_create(batch)
+        aggregates.refresh_golfers(golfer_ids)
+
+    def cleanup(self):
+        self.stdout.write("Removing benchmark data...")
+        with transaction.atomic(), aggregates.suspended():
+            golfers = Golfer.objects.filter(golfer_id__startswith=BENCHMARK_PREFIX)
+            golfer_ids = list(golfers.values_list('id', flat=True))
+            Shot.objects.filter(golfer_id__in=golfer_ids).delete()
+            golfers.delete()
+            Group.objects.filter(tournament__name=f'{BENCHMARK_PREFIX}tournament').delete()
+            Tournament.objects.filter(name=f'{BENCHMARK_PREFIX}tournament').delete()
+            aggregates.refresh_golfers(golfer_ids)
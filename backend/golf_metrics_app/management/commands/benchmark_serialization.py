@@ -0,0 +1,72 @@
+﻿import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from golf_metrics_app import fastpath
+from golf_metrics_app.models import Golfer, Shot
+from golf_metrics_app.serializers import GolferSerializer, ShotSerializer
+
+# (serializer, queryset the list endpoint serializes) per benchmarked endpoint
+TARGETS = {
+    'shots': (ShotSerializer, lambda: Shot.objects.select_related('golfer', 'group', 'tournament')
+              .order_by('-timestamp', 'shot_number')),
+    'golfers': (GolferSerializer, lambda: Golfer.objects.select_related('group__tournament')
+                .order_by('last_name', 'first_name')),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rows/sec of the serializer list path against the values() fast "
+        "path and check both produce the same bytes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help="Rows rendered per run")
+        parser.add_argument('--runs', type=int, default=5, help="Timed runs per path")
+        parser.add_argument('--target', choices=sorted(TARGETS), action='append',
+                            help="Endpoint to benchmark (default: all)")
+        parser.add_argument('--fields', default='', help="Comma separated field selection, as in ?fields=")
+
+    def handle(self, *args, **options):
+        encoder = 'orjson' if fastpath.orjson is not None else 'json'
+        self.stdout.write(f"Fast path encoder: {encoder}")
+        self.stdout.write(f"{'target':<10}{'rows':>8}{'serializer rows/s':>20}{'fast rows/s':>14}{'speedup':>10}")
+        for name in options['target'] or sorted(TARGETS):
+            serializer_class, queryset = TARGETS[name]
+            field_names = [field.strip() for field in options['fields'].split(',') if field.strip()] or None
+            plan = fastpath.get_plan(serializer_class, field_names)
+            if plan is None:
+                raise CommandError(f"{serializer_class.__name__} is not supported by the fast path.")
+            ids = list(queryset().values_list('id', flat=True)[:options['rows']])
+            if not ids:
+                self.stdout.write(f"{name:<10} no rows; seed some with benchmark_queries --seed-shots")
+                continue
+
+            def serializer_path():
+                rows = list(queryset().filter(id__in=ids))
+                context = {'fields': field_names} if field_names else {}
+                return JSONRenderer().render(serializer_class(rows, many=True, context=context).data)
+
+            def fast_path():
+                return fastpath.dumps(plan.serialize(plan.values(queryset().filter(id__in=ids))))
+
+            if serializer_path() != fast_path():
+                raise CommandError(f"{name}: fast path output differs from the serializer output.")
+
+            slow = self.time(serializer_path, options['runs'])
+            fast = self.time(fast_path, options['runs'])
+            self.stdout.write(
+                f"{name:<10}{len(ids):>8}{len(ids) / slow:>20,.0f}{len(ids) / fast:>14,.0f}{slow / fast:>9.1f}x"
+            )
+
+    def time(self, render, runs):
+        """Median seconds per render"""
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            render()
+            samples.append(time.perf_counter() - started)
+        return statistics.median(samples)
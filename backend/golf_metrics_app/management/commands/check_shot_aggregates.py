@@ -0,0 +1,26 @@
+﻿from django.core.management.base import BaseCommand, CommandError
+
+from golf_metrics_app import aggregates
+
+
+class Command(BaseCommand):
+    help = "Verify that the ShotAggregate store matches the Shot table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Rebuild the store if problems are found")
+
+    def handle(self, *args, **options):
+        problems = aggregates.find_inconsistencies()
+        if not problems:
+            self.stdout.write(self.style.SUCCESS("Shot aggregates are consistent"))
+            return
+
+        for problem in problems:
+            fields = f" ({', '.join(problem['fields'])})" if problem.get('fields') else ''
+            self.stdout.write(f"{problem['problem']}: bucket {problem['bucket']}{fields}")
+
+        if options['fix']:
+            bucket_count = aggregates.rebuild_all()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {bucket_count} shot aggregate buckets"))
+        else:
+            raise CommandError(f"Found {len(problems)} inconsistent shot aggregate buckets")
@@ -0,0 +1,29 @@
+﻿from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from golf_metrics_app import buffering
+
+
+class Command(BaseCommand):
+    help = "Write the shots left in shot buffer spill files by processes that stopped"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=settings.GOLF_SHOT_BUFFER_ORPHAN_SECONDS,
+                            help="Only adopt spill files untouched for this many seconds "
+                                 "(0 when no web process is running)")
+
+    def handle(self, *args, **options):
+        buffer = buffering.from_settings()
+        if buffer.spill_dir is None:
+            self.stdout.write("The shot buffer keeps no spill files with GOLF_SHOT_BUFFER_DURABILITY=memory")
+            return
+        recovered = buffer.recover(older_than=options['older_than'])
+        written = buffer.flush()
+        if written < recovered:
+            raise CommandError(f"Wrote {written} of {recovered} recovered shots; the rest stay in "
+                               f"{buffer.spill_dir} for the next attempt")
+        dead_lettered = buffer.statistics()['dead_lettered']
+        if dead_lettered:
+            self.stdout.write(self.style.WARNING(f"{dead_lettered} recovered shots were refused and moved to "
+                                                 f"{buffer.dead_letter_dir or 'the error log'}"))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written - dead_lettered} recovered shots"))
@@ -0,0 +1,65 @@
+﻿import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from golf_metrics_app.parsers import csv_rows
+from golf_metrics_app.roster import import_roster
+
+
+class Command(BaseCommand):
+    help = "Import or update golfers from a CSV or JSON roster file, upserting on golfer_id"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Roster file (.csv, .json or .ndjson)")
+        parser.add_argument('--format', choices=['csv', 'json', 'ndjson'],
+                            help="File format (default: from the file extension)")
+        parser.add_argument('--tournament', type=int, help="Tournament used to look up group_number columns")
+        parser.add_argument('--dry-run', action='store_true', help="Report the diff without writing anything")
+        parser.add_argument('--reattribute-shots', action='store_true',
+                            help="Move shots recorded in earlier groups along with regrouped golfers")
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f"{path} does not exist")
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        text = path.read_text(encoding='utf-8-sig')
+
+        if file_format == 'csv':
+            rows = csv_rows(text)
+        elif file_format == 'json':
+            rows = json.loads(text)
+        elif file_format == 'ndjson':
+            rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            raise CommandError(f"Unsupported roster format '{file_format}'")
+        if not isinstance(rows, list):
+            raise CommandError("Expected a list of golfers")
+        if len(rows) > settings.GOLF_ROSTER_MAX_ROWS:
+            raise CommandError(f"At most {settings.GOLF_ROSTER_MAX_ROWS} golfers can be imported at once")
+
+        result = import_roster(
+            rows,
+            tournament_id=options['tournament'],
+            dry_run=options['dry_run'],
+            reattribute_shots=options['reattribute_shots']
+        )
+
+        for golfer_id in result['diff']['created']:
+            self.stdout.write(f"+ {golfer_id}")
+        for change in result['diff']['updated']:
+            fields = ', '.join(
+                f"{name}: {values['old']!r} -> {values['new']!r}" for name, values in change['changes'].items()
+            )
+            self.stdout.write(f"~ {change['golfer_id']} ({fields})")
+        for error in result['errors']:
+            self.stdout.write(self.style.ERROR(f"! row {error['index']} {error['golfer_id'] or ''}: {error['errors']}"))
+
+        prefix = "Dry run: would import" if result['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {result['received']} rows: {result['created_count']} created, "
+            f"{result['updated_count']} updated, {result['unchanged_count']} unchanged, "
+            f"{result['error_count']} errors in {result['elapsed_ms']} ms"
+        ))
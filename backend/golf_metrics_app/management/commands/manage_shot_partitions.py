@@ -0,0 +1,51 @@
+﻿from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from golf_metrics_app import partitions
+from golf_metrics_app.models import ShotArchive
+
+
+class Command(BaseCommand):
+    help = ("Create the monthly Shot partitions ahead of time and detach months whose tournaments "
+            "have all finished (PostgreSQL; other databases keep a single Shot table)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=settings.GOLF_SHOT_PARTITION_MONTHS_AHEAD,
+                            help="Months after the current one to create partitions for")
+        parser.add_argument('--retain', type=int, default=settings.GOLF_SHOT_PARTITION_RETAIN_MONTHS,
+                            help="Whole months to keep attached before archiving (0 archives nothing)")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report the partitions that would be archived without detaching them")
+        parser.add_argument('--reattach', metavar='TABLE',
+                            help="Attach an archived partition again instead of the routine maintenance")
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            self.stdout.write(f"The Shot table is not partitioned on {connection.vendor}; nothing to do")
+            return
+
+        if options['reattach']:
+            try:
+                archive = partitions.reattach_partition(options['reattach'])
+            except ShotArchive.DoesNotExist:
+                raise CommandError(f"{options['reattach']} is not an archived shot partition")
+            self.stdout.write(self.style.SUCCESS(f"Reattached {archive.table_name} ({archive.shot_count} shots)"))
+            return
+
+        if not options['dry_run']:
+            for name, moved in partitions.ensure_partitions(options['ahead']).items():
+                self.stdout.write(f"Created {name}" + (f", moved in {moved} shots from the default partition"
+                                                       if moved else ""))
+
+        if options['retain'] > 0:
+            archived = partitions.archive_partitions(options['retain'], dry_run=options['dry_run'])
+            verb = "Would archive" if options['dry_run'] else "Archived"
+            for partition in archived:
+                self.stdout.write(f"{verb} {partition.name} [{partition.start:%Y-%m-%d}, {partition.end:%Y-%m-%d})")
+
+        attached = partitions.list_partitions()
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(attached)} monthly shot partitions attached"
+            + (f", {attached[0].start:%Y-%m} to {attached[-1].start:%Y-%m}" if attached else "")
+        ))
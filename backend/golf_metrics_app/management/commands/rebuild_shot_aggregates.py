@@ -0,0 +1,14 @@
+﻿from django.core.management.base import BaseCommand
+
+from golf_metrics_app import aggregates
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ShotAggregate store from scratch using the Shot table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per bulk insert")
+
+    def handle(self, *args, **options):
+        bucket_count = aggregates.rebuild_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {bucket_count} shot aggregate buckets"))
@@ -0,0 +1,83 @@
+﻿import multiprocessing
+import os
+import signal
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def worker_main(name, poll_interval, stop):
+    """
+    Entry point of a worker process. Spawned processes (the default on Windows)
+    start without Django configured, so app modules are imported only after setup.
+    """
+    import django
+    django.setup()
+    from golf_metrics_app import jobs
+    try:
+        jobs.work(name, poll_interval=poll_interval, stop=stop)
+    except KeyboardInterrupt:
+        pass
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs with a pool of worker processes (set GOLF_JOB_RUNNER=worker)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.GOLF_WORKER_PROCESSES,
+                            help="Worker processes to run")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds an idle worker waits before checking the queue again")
+        parser.add_argument('--once', action='store_true',
+                            help="Run every due job in this process, then exit")
+
+    def handle(self, *args, **options):
+        from golf_metrics_app import jobs
+
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        if options['once']:
+            executed = jobs.work(prefix, once=True)
+            self.stdout.write(self.style.SUCCESS(f"Ran {executed} jobs"))
+            return
+
+        # Children must open their own connections rather than share this one
+        connections.close_all()
+        stopping = threading.Event()
+        # Each worker gets its own stop event: a worker killed while holding a
+        # shared event's lock would block every other worker on it
+        pool = {}
+
+        def start(index):
+            stop = multiprocessing.Event()
+            process = multiprocessing.Process(
+                target=worker_main,
+                args=(f'{prefix}/{index}', options['poll_interval'], stop),
+                name=f'golf-worker-{index}',
+            )
+            process.start()
+            pool[index] = (process, stop)
+
+        for index in range(options['processes']):
+            start(index)
+        self.stdout.write(f"Started {options['processes']} workers; press Ctrl+C to stop")
+
+        # A service manager stops the pool with SIGTERM, a console with Ctrl+C
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+        try:
+            while not stopping.is_set():
+                for index, (process, _) in list(pool.items()):
+                    process.join(timeout=options['poll_interval'] / len(pool))
+                    if not process.is_alive() and not stopping.is_set():
+                        self.stderr.write(f"Worker {index} exited with code {process.exitcode}; restarting")
+                        start(index)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write("Stopping workers after their current jobs...")
+        for _, stop in pool.values():
+            stop.set()
+        for process, _ in pool.values():
+            process.join()
+        self.stdout.write(self.style.SUCCESS("Workers stopped"))
@@ -0,0 +1,102 @@
+# Generated by Django 4.2.30 on 2026-10-16 20:35
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Max, Min, Sum, Value
+from django.db.models.functions import Coalesce
+
+# The metrics aggregated when this migration was written (smash factor came with 0007)
+METRICS = ['ball_speed', 'club_head_speed', 'launch_angle', 'spin_rate', 'carry_distance', 'total_distance']
+
+
+def backfill_shot_aggregates(apps, schema_editor):
+    """
+    Build the buckets of the shots recorded so far, as aggregates.compute_buckets
+    did at this point: keyed on the golfer's current group and tournament, with
+    NULL and '' clubs sharing a bucket.
+    """
+    Shot = apps.get_model('golf_metrics_app', 'Shot')
+    ShotAggregate = apps.get_model('golf_metrics_app', 'ShotAggregate')
+    annotations = {'shot_count': Count('id')}
+    for metric in METRICS:
+        annotations[f'{metric}_count'] = Count(metric)
+        annotations[f'{metric}_sum'] = Sum(metric, output_field=DecimalField(max_digits=20, decimal_places=2))
+        annotations[f'{metric}_sum_sq'] = Sum(
+            F(metric) * F(metric), output_field=DecimalField(max_digits=24, decimal_places=4)
+        )
+        annotations[f'{metric}_min'] = Min(metric)
+        annotations[f'{metric}_max'] = Max(metric)
+    rows = Shot.objects.order_by().values(
+        key_golfer=Coalesce('golfer_id', Value(0)),
+        key_group=Coalesce('golfer__group_id', Value(0)),
+        key_tournament=Coalesce('golfer__group__tournament_id', Value(0)),
+        key_club=Coalesce('club_used', Value('')),
+        key_type=F('shot_type'),
+    ).annotate(**annotations)
+    ShotAggregate.objects.bulk_create([
+        ShotAggregate(
+            golfer_id=row.pop('key_golfer'), group_id=row.pop('key_group'), tournament_id=row.pop('key_tournament'),
+            club_used=row.pop('key_club'), shot_type=row.pop('key_type'),
+            **{name: value for name, value in row.items() if value is not None},
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('golf_metrics_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShotAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('golfer_id', models.PositiveBigIntegerField(default=0, help_text='Golfer ID (0 when unassigned)')),
+                ('group_id', models.PositiveBigIntegerField(default=0, help_text='Group ID (0 when unassigned)')),
+                ('tournament_id', models.PositiveBigIntegerField(default=0, help_text='Tournament ID (0 when unassigned)')),
+                ('club_used', models.CharField(blank=True, default='', help_text="Club used ('' when unknown)", max_length=20)),
+                ('shot_type', models.CharField(help_text='Type of shot', max_length=20)),
+                ('shot_count', models.PositiveIntegerField(default=0, help_text='Number of shots in this bucket')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('ball_speed_count', models.PositiveIntegerField(default=0)),
+                ('ball_speed_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('ball_speed_sum_sq', models.DecimalField(decimal_places=4, default=0, max_digits=24)),
+                ('ball_speed_min', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('ball_speed_max', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('club_head_speed_count', models.PositiveIntegerField(default=0)),
+                ('club_head_speed_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('club_head_speed_sum_sq', models.DecimalField(decimal_places=4, default=0, max_digits=24)),
+                ('club_head_speed_min', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('club_head_speed_max', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('launch_angle_count', models.PositiveIntegerField(default=0)),
+                ('launch_angle_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('launch_angle_sum_sq', models.DecimalField(decimal_places=4, default=0, max_digits=24)),
+                ('launch_angle_min', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('launch_angle_max', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('spin_rate_count', models.PositiveIntegerField(default=0)),
+                ('spin_rate_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('spin_rate_sum_sq', models.DecimalField(decimal_places=4, default=0, max_digits=24)),
+                ('spin_rate_min', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('spin_rate_max', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('carry_distance_count', models.PositiveIntegerField(default=0)),
+                ('carry_distance_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('carry_distance_sum_sq', models.DecimalField(decimal_places=4, default=0, max_digits=24)),
+                ('carry_distance_min', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('carry_distance_max', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('total_distance_count', models.PositiveIntegerField(default=0)),
+                ('total_distance_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('total_distance_sum_sq', models.DecimalField(decimal_places=4, default=0, max_digits=24)),
+                ('total_distance_min', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('total_distance_max', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+            ],
+            options={
+                'verbose_name': 'Shot Aggregate',
+                'verbose_name_plural': 'Shot Aggregates',
+                'indexes': [models.Index(fields=['tournament_id', 'group_id'], name='golf_metric_tournam_ab743c_idx')],
+                'unique_together': {('golfer_id', 'group_id', 'tournament_id', 'club_used', 'shot_type')},
+            },
+        ),
+        migrations.RunPython(backfill_shot_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-16 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('golf_metrics_app', '0002_shot_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='golfer',
+            index=models.Index(fields=['last_name', 'first_name', 'id'], name='golfer_name_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shot',
+            index=models.Index(fields=['-timestamp', '-id'], name='shot_timestamp_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.30 on 2026-10-16 20:36
+
+from django.db import migrations, models
+
+# Trigram indexes backing the icontains searches; PostgreSQL only.
+# Django compiles icontains to UPPER("column"::text) LIKE UPPER(...),
+# so the indexes are built on that same expression.
+TRIGRAM_INDEXES = [
+    ('golfer_first_name_trgm', 'golf_metrics_app_golfer', 'first_name'),
+    ('golfer_last_name_trgm', 'golf_metrics_app_golfer', 'last_name'),
+    ('golfer_golfer_id_trgm', 'golf_metrics_app_golfer', 'golfer_id'),
+    ('golfer_email_trgm', 'golf_metrics_app_golfer', 'email'),
+    ('tournament_name_trgm', 'golf_metrics_app_tournament', 'name'),
+    ('group_nickname_trgm', 'golf_metrics_app_group', 'nickname'),
+]
+
+
+# (model, index) pairs for the filter paths of the viewsets
+FILTER_INDEXES = [
+    ('golfer', models.Index(fields=['group', 'last_name', 'first_name'], name='golfer_group_name_idx')),
+    ('golfer', models.Index(fields=['is_active', 'last_name', 'first_name'], name='golfer_active_name_idx')),
+    ('shot', models.Index(fields=['-timestamp', 'shot_number'], name='shot_listing_idx')),
+    ('shot', models.Index(fields=['golfer', '-timestamp'], name='shot_golfer_time_idx')),
+    ('shot', models.Index(fields=['shot_type', '-timestamp'], name='shot_type_time_idx')),
+    ('shot', models.Index(fields=['club_used', '-timestamp'], name='shot_club_time_idx')),
+    ('shot', models.Index(fields=['hole_number', '-timestamp'], name='shot_hole_time_idx')),
+    ('tournament', models.Index(fields=['-start_date', 'name'], name='tournament_listing_idx')),
+    ('tournament', models.Index(fields=['is_active', '-start_date'], name='tournament_active_idx')),
+]
+
+
+def create_filter_indexes(apps, schema_editor):
+    """Build the indexes without blocking writes to the tables on PostgreSQL"""
+    concurrently = {'concurrently': True} if schema_editor.connection.vendor == 'postgresql' else {}
+    for model_name, index in FILTER_INDEXES:
+        schema_editor.add_index(apps.get_model('golf_metrics_app', model_name), index, **concurrently)
+
+
+def drop_filter_indexes(apps, schema_editor):
+    concurrently = {'concurrently': True} if schema_editor.connection.vendor == 'postgresql' else {}
+    for model_name, index in FILTER_INDEXES:
+        schema_editor.remove_index(apps.get_model('golf_metrics_app', model_name), index, **concurrently)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" '
+            f'USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('golf_metrics_app', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name=model_name, index=index) for model_name, index in FILTER_INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(create_filter_indexes, drop_filter_indexes),
+            ],
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
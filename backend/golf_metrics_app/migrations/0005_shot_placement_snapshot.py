@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-16 20:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_shot_placement(apps, schema_editor):
+    """Snapshot every shot's current golfer placement, one UPDATE per group"""
+    Group = apps.get_model('golf_metrics_app', 'Group')
+    Shot = apps.get_model('golf_metrics_app', 'Shot')
+    for group_id, tournament_id in Group.objects.values_list('id', 'tournament_id').iterator():
+        Shot.objects.filter(golfer__group_id=group_id).update(
+            group_id=group_id, tournament_id=tournament_id
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('golf_metrics_app', '0004_filter_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shot',
+            name='group',
+            field=models.ForeignKey(blank=True, help_text='Group the golfer belonged to when the shot was recorded', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='shots', to='golf_metrics_app.group'),
+        ),
+        migrations.AddField(
+            model_name='shot',
+            name='tournament',
+            field=models.ForeignKey(blank=True, help_text='Tournament the golfer belonged to when the shot was recorded', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='shots', to='golf_metrics_app.tournament'),
+        ),
+        migrations.AddIndex(
+            model_name='shot',
+            index=models.Index(fields=['tournament', '-timestamp'], name='shot_tournament_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shot',
+            index=models.Index(fields=['group', '-timestamp'], name='shot_group_time_idx'),
+        ),
+        migrations.RunPython(backfill_shot_placement, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-16 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('golf_metrics_app', '0005_shot_placement_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SequenceCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(help_text='Counter name', max_length=100, unique=True)),
+                ('last_value', models.PositiveBigIntegerField(default=0, help_text='Last value handed out')),
+            ],
+            options={
+                'verbose_name': 'Sequence Counter',
+                'verbose_name_plural': 'Sequence Counters',
+            },
+        ),
+    ]
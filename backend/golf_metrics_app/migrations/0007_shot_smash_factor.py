@@ -0,0 +1,141 @@
+# Generated by Django 4.2.30 on 2026-10-16 21:02
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, FloatField, Max, Min, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Round
+import golf_metrics_app.models
+
+BACKFILL_BATCH_SIZE = 5000
+INDEX_NAME = 'shot_tournament_smash_idx'
+
+
+def backfill_smash_factor(apps, schema_editor):
+    """
+    Compute the stored smash factor for existing shots in primary key ranges.
+
+    The migration is not atomic, so every batch commits on its own and the
+    shot table is never locked as a whole.
+    """
+    Shot = apps.get_model('golf_metrics_app', 'Shot')
+    bounds = Shot.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return
+    ratio = Cast(F('ball_speed'), FloatField()) / Cast(F('club_head_speed'), FloatField())
+    expression = Round(Cast(ratio, DecimalField(max_digits=20, decimal_places=10)), 2)
+    for start in range(bounds['low'], bounds['high'] + 1, BACKFILL_BATCH_SIZE):
+        Shot.objects.filter(
+            id__gte=start, id__lt=start + BACKFILL_BATCH_SIZE,
+            ball_speed__gt=0, club_head_speed__gt=0,
+        ).update(smash_factor=expression)
+
+
+def backfill_aggregate_smash_factor(apps, schema_editor):
+    """Fill the new smash factor totals of existing buckets with one GROUP BY over shots"""
+    Shot = apps.get_model('golf_metrics_app', 'Shot')
+    ShotAggregate = apps.get_model('golf_metrics_app', 'ShotAggregate')
+    rows = Shot.objects.order_by().values(
+        key_golfer=Coalesce('golfer_id', Value(0)),
+        key_group=Coalesce('group_id', Value(0)),
+        key_tournament=Coalesce('tournament_id', Value(0)),
+        key_club=Coalesce('club_used', Value('')),
+        key_type=F('shot_type'),
+    ).annotate(
+        count=Count('smash_factor'),
+        total=Sum('smash_factor', output_field=DecimalField(max_digits=20, decimal_places=2)),
+        total_sq=Sum(F('smash_factor') * F('smash_factor'), output_field=DecimalField(max_digits=24, decimal_places=4)),
+        low=Min('smash_factor'),
+        high=Max('smash_factor'),
+    )
+    totals = {
+        (row['key_golfer'], row['key_group'], row['key_tournament'], row['key_club'], row['key_type']): row
+        for row in rows
+    }
+    buckets = []
+    for bucket in ShotAggregate.objects.all().iterator():
+        row = totals.get((bucket.golfer_id, bucket.group_id, bucket.tournament_id, bucket.club_used, bucket.shot_type))
+        if row is None or not row['count']:
+            continue
+        bucket.smash_factor_count = row['count']
+        bucket.smash_factor_sum = row['total']
+        bucket.smash_factor_sum_sq = row['total_sq']
+        bucket.smash_factor_min = row['low']
+        bucket.smash_factor_max = row['high']
+        buckets.append(bucket)
+    ShotAggregate.objects.bulk_update(buckets, [
+        'smash_factor_count', 'smash_factor_sum', 'smash_factor_sum_sq', 'smash_factor_min', 'smash_factor_max',
+    ], batch_size=1000)
+
+
+def create_smash_index(apps, schema_editor):
+    """Build the index after the backfill, without blocking writes on PostgreSQL"""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{INDEX_NAME}" '
+            f'ON "golf_metrics_app_shot" ("tournament_id", "smash_factor" DESC)'
+        )
+        return
+    Shot = apps.get_model('golf_metrics_app', 'Shot')
+    schema_editor.add_index(Shot, models.Index(fields=['tournament', '-smash_factor'], name=INDEX_NAME))
+
+
+def drop_smash_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{INDEX_NAME}"')
+        return
+    Shot = apps.get_model('golf_metrics_app', 'Shot')
+    schema_editor.remove_index(Shot, models.Index(fields=['tournament', '-smash_factor'], name=INDEX_NAME))
+
+
+class Migration(migrations.Migration):
+    # Backfill batches commit individually and CREATE INDEX CONCURRENTLY cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('golf_metrics_app', '0006_sequence_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shot',
+            name='smash_factor',
+            field=golf_metrics_app.models.SmashFactorField(blank=True, decimal_places=2, editable=False, help_text='Ball speed / club head speed, stored so it can be filtered, sorted and aggregated', max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='shotaggregate',
+            name='smash_factor_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='shotaggregate',
+            name='smash_factor_max',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='shotaggregate',
+            name='smash_factor_min',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='shotaggregate',
+            name='smash_factor_sum',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=20),
+        ),
+        migrations.AddField(
+            model_name='shotaggregate',
+            name='smash_factor_sum_sq',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=24),
+        ),
+        migrations.RunPython(backfill_smash_factor, migrations.RunPython.noop),
+        migrations.RunPython(backfill_aggregate_smash_factor, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='shot',
+                    index=models.Index(fields=['tournament', '-smash_factor'], name='shot_tournament_smash_idx'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(create_smash_index, drop_smash_index),
+            ],
+        ),
+    ]
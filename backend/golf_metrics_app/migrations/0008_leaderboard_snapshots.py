@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-16 21:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('golf_metrics_app', '0007_shot_smash_factor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('boards', models.JSONField(default=dict, help_text='Ranked shot entries per board')),
+                ('size', models.PositiveIntegerField(help_text='Entries kept per board')),
+                ('is_stale', models.BooleanField(default=False, help_text='Rebuild from the Shot table on next read')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tournament', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_snapshot', to='golf_metrics_app.tournament')),
+            ],
+            options={
+                'verbose_name': 'Leaderboard Snapshot',
+                'verbose_name_plural': 'Leaderboard Snapshots',
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:22
+
+from django.db import migrations, models
+
+CONSTRAINT_NAME = 'shot_ingest_key_uniq'
+CONSTRAINT = models.UniqueConstraint(
+    condition=models.Q(('ingest_key__isnull', False)), fields=('ingest_key',), name=CONSTRAINT_NAME
+)
+
+
+def create_ingest_key_constraint(apps, schema_editor):
+    """Build the partial unique index without blocking shot writes on PostgreSQL"""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "{CONSTRAINT_NAME}" '
+            f'ON "golf_metrics_app_shot" ("ingest_key") WHERE "ingest_key" IS NOT NULL'
+        )
+        return
+    schema_editor.add_constraint(apps.get_model('golf_metrics_app', 'Shot'), CONSTRAINT)
+
+
+def drop_ingest_key_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{CONSTRAINT_NAME}"')
+        return
+    schema_editor.remove_constraint(apps.get_model('golf_metrics_app', 'Shot'), CONSTRAINT)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('golf_metrics_app', '0010_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shot',
+            name='ingest_key',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of the launch monitor and its idempotency key or timestamp; retries reuse it', max_length=64, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddConstraint(model_name='shot', constraint=CONSTRAINT),
+            ],
+            database_operations=[
+                migrations.RunPython(create_ingest_key_constraint, drop_ingest_key_constraint),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('golf_metrics_app', '0011_shot_ingest_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shot',
+            name='shot_number',
+            field=models.PositiveIntegerField(help_text='Sequential shot number of the golfer, or stroke on the hole when one is set; allocated by the server when not given'),
+        ),
+    ]
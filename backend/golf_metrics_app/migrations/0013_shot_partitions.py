@@ -0,0 +1,201 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:33
+
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.migrations.exceptions import IrreversibleError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+# Frozen copies of the helpers this migration was written against, so later
+# edits to golf_metrics_app.models or golf_metrics_app.partitions cannot
+# change what it does
+SHOT_TABLE = 'golf_metrics_app_shot'
+DEFAULT_PARTITION = f'{SHOT_TABLE}_default'
+INGEST_KEY_TABLE = f'{SHOT_TABLE}_ingest_key'
+INGEST_KEY_INDEX = 'shot_ingest_key_uniq'
+
+
+def month_start(value):
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value.astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(value):
+    return (month_start(value) + timedelta(days=32)).replace(day=1)
+
+
+def add_months(value, months):
+    start = month_start(value)
+    index = start.year * 12 + start.month - 1 + months
+    return start.replace(year=index // 12, month=index % 12 + 1)
+
+
+def is_partitioned(connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [SHOT_TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def backfill_shot_windows(apps, schema_editor):
+    """Set each tournament's shot window from the shots recorded so far"""
+    Shot = apps.get_model('golf_metrics_app', 'Shot')
+    Tournament = apps.get_model('golf_metrics_app', 'Tournament')
+    spans = Shot.objects.filter(tournament__isnull=False).values('tournament_id').annotate(
+        first=Min('timestamp'), last=Max('timestamp')
+    ).order_by()
+    for span in spans:
+        Tournament.objects.filter(pk=span['tournament_id']).update(
+            shots_from=month_start(span['first']), shots_until=next_month(span['last'])
+        )
+
+
+def ingest_key_sql(quote):
+    """Statements creating the ingest key table and the triggers keeping it in step with the shots"""
+    table, keys = quote(SHOT_TABLE), quote(INGEST_KEY_TABLE)
+    return [
+        f'CREATE TABLE {keys} ("ingest_key" varchar(64) PRIMARY KEY)',
+        f'INSERT INTO {keys} ("ingest_key") SELECT "ingest_key" FROM {table} WHERE "ingest_key" IS NOT NULL',
+        f'''CREATE FUNCTION {SHOT_TABLE}_sync_ingest_key() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') AND OLD."ingest_key" IS NOT NULL THEN
+                DELETE FROM {keys} WHERE "ingest_key" = OLD."ingest_key";
+            END IF;
+            -- A duplicate raises unique_violation here, as the unique index did
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW."ingest_key" IS NOT NULL THEN
+                INSERT INTO {keys} ("ingest_key") VALUES (NEW."ingest_key");
+            END IF;
+            RETURN NULL;
+        END $$''',
+        f'''CREATE FUNCTION {SHOT_TABLE}_clear_ingest_keys() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            TRUNCATE {keys};
+            RETURN NULL;
+        END $$''',
+        f'CREATE TRIGGER shot_sync_ingest_key AFTER INSERT OR DELETE OR UPDATE OF "ingest_key" ON {table} '
+        f'FOR EACH ROW EXECUTE FUNCTION {SHOT_TABLE}_sync_ingest_key()',
+        f'CREATE TRIGGER shot_clear_ingest_keys AFTER TRUNCATE ON {table} '
+        f'FOR EACH STATEMENT EXECUTE FUNCTION {SHOT_TABLE}_clear_ingest_keys()',
+    ]
+
+
+def partition_shot_table(apps, schema_editor):
+    """
+    Rebuild the Shot table on PostgreSQL as a table range partitioned by
+    timestamp, one partition per month from its oldest shot to
+    GOLF_SHOT_PARTITION_MONTHS_AHEAD months from now, plus a default
+    partition. Rewrites every row under an exclusive lock, so it belongs in
+    a maintenance window. Other databases keep the single table.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or is_partitioned(connection):
+        return
+    quote = connection.ops.quote_name
+    table, unpartitioned = quote(SHOT_TABLE), quote(f'{SHOT_TABLE}_unpartitioned')
+    with connection.cursor() as cursor:
+        # Captured before the rename so the definitions name the final table
+        cursor.execute(
+            "SELECT index_class.relname, pg_get_indexdef(index_class.oid) FROM pg_index "
+            "JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid "
+            "WHERE pg_index.indrelid = to_regclass(%s) AND NOT pg_index.indisprimary",
+            [SHOT_TABLE]
+        )
+        # The ingest key index stays for lookups but cannot stay unique; the key table enforces that
+        indexes = [
+            definition.replace('CREATE UNIQUE INDEX', 'CREATE INDEX', 1) if name == INGEST_KEY_INDEX else definition
+            for name, definition in cursor.fetchall()
+        ]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [SHOT_TABLE]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f'SELECT MAX("id"), MIN("timestamp"), MAX("timestamp") FROM {table}')
+        max_id, oldest, newest = cursor.fetchone()
+
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {unpartitioned}')
+        # Without INCLUDING DEFAULTS/IDENTITY: the id sequence is recreated below
+        cursor.execute(
+            f'CREATE TABLE {table} (LIKE {unpartitioned} INCLUDING CONSTRAINTS INCLUDING STORAGE '
+            f'INCLUDING COMMENTS) PARTITION BY RANGE ("timestamp")'
+        )
+        now = timezone.now()
+        start = month_start(min(oldest or now, now))
+        last = add_months(max(newest or now, now), settings.GOLF_SHOT_PARTITION_MONTHS_AHEAD)
+        while start <= last:
+            cursor.execute(
+                f'CREATE TABLE {quote(f"{SHOT_TABLE}_p{start:%Y_%m}")} PARTITION OF {table} '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [start, next_month(start)]
+            )
+            start = next_month(start)
+        cursor.execute(f'CREATE TABLE {quote(DEFAULT_PARTITION)} PARTITION OF {table} DEFAULT')
+        cursor.execute(f'INSERT INTO {table} SELECT * FROM {unpartitioned}')
+        cursor.execute(f'DROP TABLE {unpartitioned}')
+
+        # Unique constraints on a partitioned table must include the partition key
+        cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {quote(SHOT_TABLE + "_pkey")} '
+                       f'PRIMARY KEY ("id", "timestamp")')
+        for definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {quote(name)} {definition}')
+        sequence = quote(f'{SHOT_TABLE}_id_seq')
+        cursor.execute(f'CREATE SEQUENCE {sequence} OWNED BY {table}."id"')
+        cursor.execute('SELECT setval(%s, %s, %s)', [f'{SHOT_TABLE}_id_seq', max_id or 1, max_id is not None])
+        cursor.execute(f'ALTER TABLE {table} ALTER COLUMN "id" SET DEFAULT nextval(%s)', [f'{SHOT_TABLE}_id_seq'])
+        for statement in ingest_key_sql(quote):
+            cursor.execute(statement)
+
+
+def unpartition_shot_table(apps, schema_editor):
+    if is_partitioned(schema_editor.connection):
+        raise IrreversibleError(
+            "The Shot table stays partitioned: copy the shots into a plain table by hand before "
+            "migrating back past 0013_shot_partitions"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('golf_metrics_app', '0012_shot_number_allocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShotArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table_name', models.CharField(help_text='Detached partition table', max_length=63, unique=True)),
+                ('range_start', models.DateTimeField(help_text='First timestamp covered by the partition')),
+                ('range_end', models.DateTimeField(help_text="End (exclusive) of the partition's timestamp range")),
+                ('shot_count', models.PositiveBigIntegerField(default=0, help_text='Shots in the partition when detached')),
+                ('tournament_ids', models.JSONField(default=list, help_text='Tournaments with shots in the partition')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Shot Archive',
+                'verbose_name_plural': 'Shot Archives',
+                'ordering': ['range_start'],
+            },
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='shots_from',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Start of the first month with shots of the tournament', null=True),
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='shots_until',
+            field=models.DateTimeField(blank=True, editable=False, help_text='End of the last month with shots of the tournament', null=True),
+        ),
+        migrations.RunPython(backfill_shot_windows, migrations.RunPython.noop),
+        migrations.RunPython(partition_shot_table, unpartition_shot_table),
+    ]
@@ -1,6 +1,58 @@
-﻿from django.db import models
+﻿from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models.functions import Cast, Round
+from django.db.models.lookups import GreaterThan
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+def month_start(value):
+    """Start of the UTC calendar month containing ``value`` (shot partitions are UTC months)"""
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value.astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(value):
+    """Start of the UTC calendar month after the one containing ``value``"""
+    return (month_start(value) + timedelta(days=32)).replace(day=1)
+
+
+class TournamentQuerySet(models.QuerySet):
+    def with_counts(self):
+        """Annotate group and golfer totals so lists avoid per-row count queries"""
+        return self.annotate(
+            group_count=models.Count('groups', distinct=True),
+            golfer_count=models.Count('groups__golfers', distinct=True),
+        )
+
+    def cover_shots(self, shots):
+        """
+        Widen tournaments' shot windows to the months of ``shots``, given as
+        (tournament_id, timestamp) pairs. One conditional UPDATE per
+        tournament; windows that already cover the shots are not written, so
+        concurrent writers to the same tournament do not queue on its row.
+        """
+        timestamp_field = Shot._meta.get_field('timestamp')
+        spans = {}
+        for tournament_id, timestamp in shots:
+            if not tournament_id or timestamp is None:
+                continue
+            timestamp = timestamp_field.to_python(timestamp)
+            start, end = month_start(timestamp), next_month(timestamp)
+            low, high = spans.get(tournament_id, (start, end))
+            spans[tournament_id] = (min(low, start), max(high, end))
+        for tournament_id, (start, end) in sorted(spans.items()):
+            widen_start = models.Q(shots_from__isnull=True) | models.Q(shots_from__gt=start)
+            widen_end = models.Q(shots_until__isnull=True) | models.Q(shots_until__lt=end)
+            self.filter(widen_start | widen_end, pk=tournament_id).update(
+                shots_from=models.Case(models.When(widen_start, then=models.Value(start)), default='shots_from'),
+                shots_until=models.Case(models.When(widen_end, then=models.Value(end)), default='shots_until'),
+            )
 
 
 class Tournament(models.Model):
@@ -11,13 +63,28 @@ class Tournament(models.Model):
     end_date = models.DateField(help_text="Tournament end date")
     location = models.CharField(max_length=200, blank=True, null=True, help_text="Tournament location")
     is_active = models.BooleanField(default=True, help_text="Whether tournament is currently active")
+    # Month-aligned span of the timestamps of the tournament's shots, only ever
+    # widened (TournamentQuerySet.cover_shots); tournament filters add it as a
+    # timestamp range so PostgreSQL prunes the shot partitions outside it
+    shots_from = models.DateTimeField(
+        null=True, blank=True, editable=False, help_text="Start of the first month with shots of the tournament"
+    )
+    shots_until = models.DateTimeField(
+        null=True, blank=True, editable=False, help_text="End of the last month with shots of the tournament"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TournamentQuerySet.as_manager()
+
     class Meta:
         ordering = ['-start_date', 'name']
         verbose_name = "Tournament"
         verbose_name_plural = "Tournaments"
+        indexes = [
+            models.Index(fields=['-start_date', 'name'], name='tournament_listing_idx'),
+            models.Index(fields=['is_active', '-start_date'], name='tournament_active_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.start_date})"
@@ -29,11 +96,22 @@ class Tournament(models.Model):
 
     @property
     def total_groups(self):
+        # Prefer the value annotated by TournamentQuerySet.with_counts()
+        if hasattr(self, 'group_count'):
+            return self.group_count
         return self.groups.count()
 
     @property
     def total_golfers(self):
-        return sum(group.golfers.count() for group in self.groups.all())
+        if hasattr(self, 'golfer_count'):
+            return self.golfer_count
+        return Golfer.objects.filter(group__tournament=self).count()
+
+
+class GroupQuerySet(models.QuerySet):
+    def with_golfer_count(self):
+        """Annotate the number of golfers in each group"""
+        return self.annotate(golfer_count=models.Count('golfers'))
 
 
 class Group(models.Model):
@@ -61,6 +139,8 @@ class Group(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = GroupQuerySet.as_manager()
+
     class Meta:
         ordering = ['group_number']
         verbose_name = "Group"
@@ -68,23 +148,30 @@ class Group(models.Model):
         unique_together = ['tournament', 'group_number']  # Unique group numbers per tournament
 
     def save(self, *args, **kwargs):
-        # Auto-generate group_number if not set
+        # Auto-generate group_number from the per-tournament counter if not set
         if not self.group_number:
-            if self.tournament:
-                # Get the highest group number for this tournament
-                max_group = Group.objects.filter(tournament=self.tournament).aggregate(
-                    max_num=models.Max('group_number')
-                )['max_num']
-                self.group_number = (max_group or 0) + 1
-            else:
-                # For unassigned groups, get the highest group number overall
-                max_group = Group.objects.aggregate(
-                    max_num=models.Max('group_number')
-                )['max_num']
-                self.group_number = (max_group or 0) + 1
+            self.group_number = Group.allocate_numbers(self.tournament_id, 1)[0]
+        else:
+            # Keep the counter ahead of numbers chosen by hand or carried over from another tournament
+            SequenceCounter.objects.advance_to(Group.number_scope(self.tournament_id), self.group_number)
 
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def number_scope(tournament_id):
+        """SequenceCounter scope holding the last group number of a tournament"""
+        return f'group_number:tournament:{tournament_id}' if tournament_id else 'group_number:unassigned'
+
+    @classmethod
+    def allocate_numbers(cls, tournament_id, count):
+        """Reserve ``count`` consecutive group numbers for a tournament (or for unassigned groups)"""
+        def highest_number():
+            # Seeds a new counter; unassigned groups continue from the highest number overall
+            groups = cls.objects.filter(tournament_id=tournament_id) if tournament_id else cls.objects.all()
+            return groups.aggregate(max_num=models.Max('group_number'))['max_num'] or 0
+
+        return SequenceCounter.objects.allocate(cls.number_scope(tournament_id), count, highest_number)
+
     def __str__(self):
         display_name = self.nickname if self.nickname else f"Group {self.group_number}"
         tournament_info = f" ({self.tournament.name})" if self.tournament else " (Unassigned)"
@@ -96,6 +183,9 @@ class Group(models.Model):
 
     @property
     def current_golfer_count(self):
+        # Prefer the value annotated by GroupQuerySet.with_golfer_count()
+        if hasattr(self, 'golfer_count'):
+            return self.golfer_count
         return self.golfers.count()
 
     @property
@@ -183,6 +273,12 @@ class Golfer(models.Model):
         ordering = ['last_name', 'first_name']
         verbose_name = "Golfer"
         verbose_name_plural = "Golfers"
+        indexes = [
+            # Supports keyset pagination (?cursor=) over the golfer list
+            models.Index(fields=['last_name', 'first_name', 'id'], name='golfer_name_keyset_idx'),
+            models.Index(fields=['group', 'last_name', 'first_name'], name='golfer_group_name_idx'),
+            models.Index(fields=['is_active', 'last_name', 'first_name'], name='golfer_active_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.golfer_id})"
@@ -205,6 +301,206 @@ class Golfer(models.Model):
         return self.group.tournament if self.group else None
 
 
+SMASH_FACTOR_PLACES = Decimal('0.01')
+
+
+def compute_smash_factor(ball_speed, club_head_speed):
+    """Ball speed / club head speed rounded half up to two places, or None"""
+    if ball_speed in (None, '') or club_head_speed in (None, ''):
+        return None
+    ball_speed, club_head_speed = Decimal(str(ball_speed)), Decimal(str(club_head_speed))
+    if ball_speed > 0 and club_head_speed > 0:
+        return (ball_speed / club_head_speed).quantize(SMASH_FACTOR_PLACES, ROUND_HALF_UP)
+    return None
+
+
+def smash_factor_expression(**speeds):
+    """
+    The SQL counterpart of compute_smash_factor, for UPDATE statements.
+
+    ``speeds`` may override ball_speed and club_head_speed with new values or
+    expressions; otherwise the row's current columns are used. The division
+    runs in floating point (SQLite would divide whole-number decimals as
+    integers) and is rounded as a decimal.
+    """
+    output_field = models.DecimalField(max_digits=8, decimal_places=2)
+    operands = []
+    for name in ('ball_speed', 'club_head_speed'):
+        value = speeds.get(name, models.F(name))
+        if value is None:
+            return models.Value(None, output_field=output_field)
+        if not hasattr(value, 'resolve_expression'):
+            value = models.Value(Decimal(value), output_field=models.DecimalField())
+        operands.append(value)
+    ball, club = operands
+    ratio = Cast(ball, models.FloatField()) / Cast(club, models.FloatField())
+    return models.Case(
+        models.When(
+            GreaterThan(ball, 0) & GreaterThan(club, 0),
+            then=Round(Cast(ratio, models.DecimalField(max_digits=20, decimal_places=10)), 2),
+        ),
+        default=None,
+        output_field=output_field,
+    )
+
+
+class SmashFactorField(models.DecimalField):
+    """Stored smash factor, recomputed from the shot's speeds whenever the row is written"""
+
+    def pre_save(self, model_instance, add):
+        value = compute_smash_factor(model_instance.ball_speed, model_instance.club_head_speed)
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+def parse_timestamp_param(name, value):
+    """
+    An ISO 8601 datetime (or date, meaning its midnight) from query parameter
+    ``name``, in the current time zone when it has none. Raises
+    ValidationError keyed by ``name`` for anything else.
+    """
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None and (day := parse_date(value)) is not None:
+            parsed = datetime.combine(day, datetime.min.time())
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: ['Enter a valid ISO 8601 date or datetime.']})
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def parse_decimal_param(name, value):
+    """A finite decimal from query parameter ``name``; raises ValidationError keyed by ``name`` otherwise"""
+    try:
+        parsed = Decimal(value)
+    except InvalidOperation:
+        parsed = None
+    if parsed is None or not parsed.is_finite():
+        raise ValidationError({name: ['A valid number is required.']})
+    return parsed
+
+
+class ShotQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # Keep the stored smash factor in step with speeds changed in bulk
+        if 'ball_speed' in kwargs or 'club_head_speed' in kwargs:
+            kwargs['smash_factor'] = smash_factor_expression(**{
+                name: kwargs[name] for name in ('ball_speed', 'club_head_speed') if name in kwargs
+            })
+        # Read before updating: the update may move the rows out of this queryset's filter
+        spans = self._spans_after(kwargs) if {'tournament', 'tournament_id', 'timestamp'} & set(kwargs) else ()
+        updated = super().update(**kwargs)
+        Tournament.objects.cover_shots(spans)
+        return updated
+
+    def _spans_after(self, kwargs):
+        """(tournament_id, timestamp) pairs bounding these shots once ``kwargs`` (plain values) is applied"""
+        tournament = kwargs.get('tournament_id', kwargs.get('tournament', models.DEFERRED))
+        if isinstance(tournament, Tournament):
+            tournament = tournament.pk
+        if 'timestamp' in kwargs:
+            rows = self.values_list('tournament_id').distinct().order_by()
+            rows = [(tournament_id, kwargs['timestamp'], kwargs['timestamp']) for tournament_id, in rows]
+        else:
+            rows = self.values('tournament_id').annotate(
+                first=models.Min('timestamp'), last=models.Max('timestamp')
+            ).values_list('tournament_id', 'first', 'last').order_by()
+        spans = []
+        for tournament_id, first, last in rows:
+            if tournament is not models.DEFERRED:
+                tournament_id = tournament
+            spans += [(tournament_id, first), (tournament_id, last)]
+        return spans
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        Tournament.objects.cover_shots((shot.tournament_id, shot.timestamp) for shot in objs)
+        return objs
+
+    def for_tournament(self, tournament_id):
+        """
+        Shots attributed to a tournament, also bounded by the tournament's shot
+        window. The bounds come from a scalar subquery, which PostgreSQL
+        evaluates before scanning and uses to skip the monthly shot
+        partitions outside the window; elsewhere the range is redundant.
+        """
+        window = Tournament.objects.filter(pk=tournament_id)
+        return self.filter(
+            tournament_id=tournament_id,
+            timestamp__gte=models.Subquery(window.values('shots_from')),
+            timestamp__lt=models.Subquery(window.values('shots_until')),
+        )
+
+    def attribute_to_group(self, group):
+        """Point these shots' group/tournament snapshot at ``group``; returns rows updated"""
+        return self.update(
+            group=group,
+            tournament_id=group.tournament_id if group else None
+        )
+
+    def filter_by_params(self, params):
+        """
+        Apply the shot list filters (golfer, group, tournament, ...) given as
+        query parameters. Raises ValidationError keyed by parameter for
+        malformed values.
+        """
+        shots = self
+
+        # Filter by golfer
+        golfer_id = params.get('golfer_id') or params.get('golfer')
+        if golfer_id:
+            shots = shots.filter(golfer_id=golfer_id)
+
+        # Filter by group
+        group_id = params.get('group_id') or params.get('group')
+        if group_id:
+            shots = shots.filter(group_id=group_id)
+
+        # Filter by tournament
+        tournament_id = params.get('tournament_id') or params.get('tournament')
+        if tournament_id:
+            shots = shots.for_tournament(tournament_id)
+
+        # Filter by time range; with PostgreSQL only the partitions in range are scanned
+        since = params.get('since')
+        if since:
+            shots = shots.filter(timestamp__gte=parse_timestamp_param('since', since))
+        until = params.get('until')
+        if until:
+            shots = shots.filter(timestamp__lt=parse_timestamp_param('until', until))
+
+        # Filter by unassigned (no golfer)
+        unassigned = params.get('unassigned')
+        if unassigned and unassigned.lower() == 'true':
+            shots = shots.filter(golfer__isnull=True)
+
+        # Filter by shot type
+        shot_type = params.get('shot_type')
+        if shot_type:
+            shots = shots.filter(shot_type=shot_type)
+
+        # Filter by club
+        club_used = params.get('club_used')
+        if club_used:
+            shots = shots.filter(club_used=club_used)
+
+        # Filter by hole number
+        hole_number = params.get('hole_number')
+        if hole_number:
+            shots = shots.filter(hole_number=hole_number)
+
+        # Filter by smash factor range
+        min_smash_factor = params.get('min_smash_factor')
+        if min_smash_factor:
+            shots = shots.filter(smash_factor__gte=parse_decimal_param('min_smash_factor', min_smash_factor))
+        max_smash_factor = params.get('max_smash_factor')
+        if max_smash_factor:
+            shots = shots.filter(smash_factor__lte=parse_decimal_param('max_smash_factor', max_smash_factor))
+
+        return shots
+
+
 class Shot(models.Model):
     """Shot model for managing individual golf shots"""
     SHOT_TYPE_CHOICES = [
@@ -243,7 +539,29 @@ class Shot(models.Model):
         related_name='shots',
         help_text="Golfer who took this shot (optional)"
     )
-    shot_number = models.PositiveIntegerField(help_text="Sequential shot number")
+    # Snapshot of the golfer's placement when the shot was recorded, so shots can
+    # be filtered without joining through golfer and keep their attribution when
+    # the golfer later changes group
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='shots',
+        help_text="Group the golfer belonged to when the shot was recorded"
+    )
+    tournament = models.ForeignKey(
+        Tournament,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='shots',
+        help_text="Tournament the golfer belonged to when the shot was recorded"
+    )
+    shot_number = models.PositiveIntegerField(
+        help_text="Sequential shot number of the golfer, or stroke on the hole when one is set; "
+                  "allocated by the server when not given"
+    )
     hole_number = models.PositiveIntegerField(
         validators=[MinValueValidator(1), MaxValueValidator(18)],
         blank=True,
@@ -312,6 +630,14 @@ class Shot(models.Model):
         null=True,
         help_text="Side angle in degrees"
     )
+    smash_factor = SmashFactorField(
+        max_digits=8,
+        decimal_places=2,
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="Ball speed / club head speed, stored so it can be filtered, sorted and aggregated"
+    )
 
     # Data Source
     is_simulated = models.BooleanField(
@@ -324,6 +650,13 @@ class Shot(models.Model):
         null=True,
         help_text="Launch monitor device identifier"
     )
+    ingest_key = models.CharField(
+        max_length=64,
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="Hash of the launch monitor and its idempotency key or timestamp; retries reuse it"
+    )
 
     # Metadata
     notes = models.TextField(blank=True, null=True, help_text="Additional notes about the shot")
@@ -331,27 +664,367 @@ class Shot(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ShotQuerySet.as_manager()
+
     class Meta:
         ordering = ['-timestamp', 'shot_number']
         verbose_name = "Shot"
         verbose_name_plural = "Shots"
+        indexes = [
+            # Join-free tournament/group feeds and leaderboards
+            models.Index(fields=['tournament', '-timestamp'], name='shot_tournament_time_idx'),
+            models.Index(fields=['group', '-timestamp'], name='shot_group_time_idx'),
+            # Supports keyset pagination (?cursor=) over the shots feed
+            models.Index(fields=['-timestamp', '-id'], name='shot_timestamp_keyset_idx'),
+            # Filter + default ordering paths used by ShotViewSet.get_queryset
+            models.Index(fields=['-timestamp', 'shot_number'], name='shot_listing_idx'),
+            models.Index(fields=['golfer', '-timestamp'], name='shot_golfer_time_idx'),
+            models.Index(fields=['shot_type', '-timestamp'], name='shot_type_time_idx'),
+            models.Index(fields=['club_used', '-timestamp'], name='shot_club_time_idx'),
+            models.Index(fields=['hole_number', '-timestamp'], name='shot_hole_time_idx'),
+            # Smash factor leaderboards per tournament
+            models.Index(fields=['tournament', '-smash_factor'], name='shot_tournament_smash_idx'),
+        ]
+        constraints = [
+            # A retried launch monitor submission cannot create a second shot. With the
+            # partitioned PostgreSQL table a trigger-maintained key table enforces it instead
+            # (see golf_metrics_app.partitions)
+            models.UniqueConstraint(
+                fields=['ingest_key'],
+                condition=models.Q(ingest_key__isnull=False),
+                name='shot_ingest_key_uniq'
+            ),
+        ]
 
     def __str__(self):
         golfer_info = f"{self.golfer.full_name}" if self.golfer else "Unassigned"
         club_info = f" with {self.get_club_used_display()}" if self.club_used else ""
         return f"Shot {self.shot_number} - {golfer_info}{club_info}"
 
-    @property
-    def tournament(self):
-        return self.golfer.tournament if self.golfer and self.golfer.group else None
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_golfer_id = instance.__dict__.get('golfer_id', models.DEFERRED)
+        instance._loaded_tournament_id = instance.__dict__.get('tournament_id', models.DEFERRED)
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Snapshot the placement when the shot is recorded or moved to another golfer
+        loaded_golfer_id = getattr(self, '_loaded_golfer_id', models.DEFERRED)
+        moved = loaded_golfer_id is not models.DEFERRED and loaded_golfer_id != self.golfer_id
+        if self._state.adding or moved:
+            self.snapshot_placement()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'group', 'tournament'}
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'ball_speed', 'club_head_speed'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'smash_factor'}
+        if self._state.adding:
+            # The number is allocated in the insert's transaction, so a failed insert leaves no gap
+            numbered = self.shot_number is not None
+            try:
+                with transaction.atomic(using=kwargs.get('using')):
+                    Shot.assign_numbers([self])
+                    super().save(*args, **kwargs)
+            except Exception:
+                if not numbered:
+                    self.shot_number = None
+                raise
+        else:
+            super().save(*args, **kwargs)
+        Tournament.objects.cover_shots([(self.tournament_id, self.timestamp)])
+        self._loaded_golfer_id = self.golfer_id
+        self._loaded_tournament_id = self.tournament_id
+
+    def snapshot_placement(self):
+        """Copy the golfer's current group and tournament onto the shot"""
+        placement = None
+        if self.golfer_id:
+            placement = Golfer.objects.filter(pk=self.golfer_id).values_list(
+                'group_id', 'group__tournament_id'
+            ).first()
+        self.group_id, self.tournament_id = placement or (None, None)
 
     @property
-    def group(self):
-        return self.golfer.group if self.golfer else None
+    def number_key(self):
+        """(golfer, tournament, hole) whose shots are numbered together"""
+        if self.hole_number:
+            return self.golfer_id, self.tournament_id, self.hole_number
+        return self.golfer_id, None, None
+
+    @staticmethod
+    def number_scope(golfer_id, tournament_id=None, hole_number=None):
+        """SequenceCounter scope holding the last shot number of a golfer, or of their strokes on a hole"""
+        scope = f'shot_number:golfer:{golfer_id}' if golfer_id else 'shot_number:unassigned'
+        if hole_number:
+            scope += f':tournament:{tournament_id or 0}:hole:{hole_number}'
+        return scope
+
+    @classmethod
+    def allocate_numbers(cls, golfer_id, count, tournament_id=None, hole_number=None, taken=0):
+        """
+        Reserve ``count`` consecutive shot numbers for a golfer (or their
+        strokes on a tournament hole), above ``taken`` when the counter is new.
+        """
+        def highest_number():
+            # Seeds a new counter from the shots numbered before it existed
+            shots = cls.objects.filter(golfer_id=golfer_id) if golfer_id else cls.objects.filter(golfer__isnull=True)
+            if hole_number:
+                shots = shots.filter(tournament_id=tournament_id, hole_number=hole_number)
+            else:
+                shots = shots.filter(hole_number__isnull=True)
+            return max(shots.aggregate(max_num=models.Max('shot_number'))['max_num'] or 0, taken)
+
+        return SequenceCounter.objects.allocate(
+            cls.number_scope(golfer_id, tournament_id, hole_number), count, highest_number
+        )
+
+    @classmethod
+    def assign_numbers(cls, shots):
+        """
+        Give unsaved shots without a shot_number the next numbers of their
+        golfer (or hole), in timestamp order, with one counter UPDATE per
+        scope however many shots share it; numbers that were supplied move
+        their counter forward instead. Counters are taken in a fixed order so
+        concurrent batches over the same golfers cannot deadlock. Call inside
+        the transaction that inserts the shots.
+        """
+        missing, supplied = {}, {}
+        for shot in shots:
+            key = shot.number_key
+            if shot.shot_number is None:
+                missing.setdefault(key, []).append(shot)
+            else:
+                supplied[key] = max(supplied.get(key, 0), shot.shot_number)
+        for key in sorted(set(missing) | set(supplied), key=lambda key: cls.number_scope(*key)):
+            if key in supplied:
+                SequenceCounter.objects.advance_to(cls.number_scope(*key), supplied[key])
+            if key in missing:
+                numbered = sorted(missing[key], key=lambda shot: shot.timestamp)
+                golfer_id, tournament_id, hole_number = key
+                numbers = cls.allocate_numbers(
+                    golfer_id, len(numbered), tournament_id, hole_number, taken=supplied.get(key, 0)
+                )
+                for shot, number in zip(numbered, numbers):
+                    shot.shot_number = number
+
+
+# Launch monitor metrics tracked by ShotAggregate
+AGGREGATE_METRICS = [
+    'ball_speed', 'club_head_speed', 'launch_angle', 'spin_rate',
+    'carry_distance', 'total_distance', 'smash_factor',
+]
+
+
+class ShotAggregate(models.Model):
+    """
+    Running shot totals for one (golfer, group, tournament, club, shot type) bucket.
+
+    Maintained incrementally by golf_metrics_app.aggregates so statistics can be
+    served without scanning the Shot table. Missing keys are stored as 0 or ''
+    so the bucket key stays unique on every database backend.
+    """
+    golfer_id = models.PositiveBigIntegerField(default=0, help_text="Golfer ID (0 when unassigned)")
+    group_id = models.PositiveBigIntegerField(default=0, help_text="Group ID (0 when unassigned)")
+    tournament_id = models.PositiveBigIntegerField(default=0, help_text="Tournament ID (0 when unassigned)")
+    club_used = models.CharField(max_length=20, blank=True, default='', help_text="Club used ('' when unknown)")
+    shot_type = models.CharField(max_length=20, help_text="Type of shot")
+    shot_count = models.PositiveIntegerField(default=0, help_text="Number of shots in this bucket")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Shot Aggregate"
+        verbose_name_plural = "Shot Aggregates"
+        unique_together = ['golfer_id', 'group_id', 'tournament_id', 'club_used', 'shot_type']
+        indexes = [
+            models.Index(fields=['tournament_id', 'group_id']),
+        ]
+
+    def __str__(self):
+        return (f"Golfer {self.golfer_id or '-'} / {self.club_used or 'no club'} / "
+                f"{self.shot_type}: {self.shot_count} shots")
+
+
+# Per-metric columns: non-null count, sum, sum of squares, min and max
+for _metric in AGGREGATE_METRICS:
+    ShotAggregate.add_to_class(f'{_metric}_count', models.PositiveIntegerField(default=0))
+    ShotAggregate.add_to_class(f'{_metric}_sum', models.DecimalField(max_digits=20, decimal_places=2, default=0))
+    ShotAggregate.add_to_class(f'{_metric}_sum_sq', models.DecimalField(max_digits=24, decimal_places=4, default=0))
+    ShotAggregate.add_to_class(f'{_metric}_min', models.DecimalField(max_digits=10, decimal_places=2, null=True))
+    ShotAggregate.add_to_class(f'{_metric}_max', models.DecimalField(max_digits=10, decimal_places=2, null=True))
+
+
+class SequenceCounterQuerySet(models.QuerySet):
+    def allocate(self, scope, count=1, seed=None):
+        """
+        Reserve ``count`` consecutive values from the counter named ``scope``.
+
+        The increment is a single UPDATE (with RETURNING where the database
+        supports it, so reading the new value costs no extra round trip), and
+        the counter row stays locked until the surrounding transaction ends:
+        concurrent callers queue on it instead of racing. A missing counter is created from ``seed()`` (the
+        highest value already in use) or 0. Returns the reserved values.
+        """
+        with transaction.atomic(using=self.db):
+            while (last_value := self._increment(scope, count)) is None:
+                try:
+                    with transaction.atomic(using=self.db):
+                        last_value = self.create(scope=scope, last_value=(seed() if seed else 0) + count).last_value
+                    break
+                except IntegrityError:
+                    # Another transaction created the counter first; increment theirs
+                    continue
+        return range(last_value - count + 1, last_value + 1)
+
+    def _increment(self, scope, count):
+        """Add ``count`` to a counter and return its new value, or None when it does not exist yet"""
+        connection = connections[self.db]
+        if connection.vendor == 'postgresql' or (
+            connection.vendor == 'sqlite' and connection.features.can_return_columns_from_insert
+        ):
+            # UPDATE ... RETURNING takes the lock and reads the value in one round trip
+            quote = connection.ops.quote_name
+            table = quote(self.model._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {table} SET {quote("last_value")} = {quote("last_value")} + %s '
+                    f'WHERE {quote("scope")} = %s RETURNING {quote("last_value")}',
+                    [count, scope]
+                )
+                row = cursor.fetchone()
+            return row[0] if row else None
+        if not self.filter(scope=scope).update(last_value=models.F('last_value') + count):
+            return None
+        return self.filter(scope=scope).values_list('last_value', flat=True).get()
+
+    def advance_to(self, scope, value):
+        """Move the counter forward to at least ``value`` without handing anything out"""
+        return self.filter(scope=scope, last_value__lt=value).update(last_value=value)
+
+
+class SequenceCounter(models.Model):
+    """Last value handed out by a named counter (group numbers per tournament, ...)"""
+    scope = models.CharField(max_length=100, unique=True, help_text="Counter name")
+    last_value = models.PositiveBigIntegerField(default=0, help_text="Last value handed out")
+
+    objects = SequenceCounterQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Sequence Counter"
+        verbose_name_plural = "Sequence Counters"
+
+    def __str__(self):
+        return f"{self.scope}: {self.last_value}"
+
+
+class ShotArchive(models.Model):
+    """
+    A monthly shot partition detached from the Shot table by the
+    manage_shot_partitions command. The table stays in the database under
+    ``table_name`` and can be attached again with --reattach.
+    """
+    table_name = models.CharField(max_length=63, unique=True, help_text="Detached partition table")
+    range_start = models.DateTimeField(help_text="First timestamp covered by the partition")
+    range_end = models.DateTimeField(help_text="End (exclusive) of the partition's timestamp range")
+    shot_count = models.PositiveBigIntegerField(default=0, help_text="Shots in the partition when detached")
+    tournament_ids = models.JSONField(default=list, help_text="Tournaments with shots in the partition")
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['range_start']
+        verbose_name = "Shot Archive"
+        verbose_name_plural = "Shot Archives"
+
+    def __str__(self):
+        return f"{self.table_name} ({self.shot_count} shots)"
+
+
+class LeaderboardSnapshot(models.Model):
+    """
+    Persisted top shots of one tournament for every leaderboard metric.
+
+    ``boards`` maps "metric|shot_type|club_used" ('' meaning any) to the best
+    ``size`` shots in rank order. Maintained incrementally by
+    golf_metrics_app.leaderboards; a stale snapshot is rebuilt on its next read.
+    """
+    tournament = models.OneToOneField(
+        Tournament,
+        on_delete=models.CASCADE,
+        related_name='leaderboard_snapshot'
+    )
+    boards = models.JSONField(default=dict, help_text="Ranked shot entries per board")
+    size = models.PositiveIntegerField(help_text="Entries kept per board")
+    is_stale = models.BooleanField(default=False, help_text="Rebuild from the Shot table on next read")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Leaderboard Snapshot"
+        verbose_name_plural = "Leaderboard Snapshots"
+
+    def __str__(self):
+        return f"{self.tournament} leaderboards"
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once cancellation has been requested"""
+
+
+class Job(models.Model):
+    """
+    A long-running operation executed off the request path (see golf_metrics_app.jobs).
+
+    The table doubles as the work queue: runners claim pending jobs whose
+    run_after has passed, and retries are re-queued with a later run_after.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    kind = models.CharField(max_length=50, help_text="Registered job handler")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    params = models.JSONField(default=dict, help_text="Arguments passed to the handler")
+    progress = models.JSONField(default=dict, help_text="Counters reported while running")
+    result = models.JSONField(null=True, blank=True, help_text="Handler return value")
+    error = models.TextField(blank=True, default='', help_text="Failure message")
+    attempts = models.PositiveIntegerField(default=0, help_text="Times the job has been started")
+    max_attempts = models.PositiveIntegerField(default=1, help_text="Starts allowed before the job fails for good")
+    run_after = models.DateTimeField(default=timezone.now, help_text="Not claimed before this time")
+    cancel_requested = models.BooleanField(default=False, help_text="Stop at the next progress report")
+    worker = models.CharField(max_length=100, blank=True, default='', help_text="Runner that claimed the job")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, help_text="Last sign of life from the runner")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Job"
+        verbose_name_plural = "Jobs"
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='job_status_idx'),
+            models.Index(fields=['status', 'run_after'], name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
 
     @property
-    def smash_factor(self):
-        """Calculate smash factor (ball speed / club head speed)"""
-        if self.ball_speed and self.club_head_speed and self.club_head_speed > 0:
-            return round(float(self.ball_speed) / float(self.club_head_speed), 2)
-        return None
\ No newline at end of file
+    def is_finished(self):
+        return self.status in ('succeeded', 'failed', 'cancelled')
+
+    def report(self, **counters):
+        """
+        Merge ``counters`` into the stored progress so it can be polled while
+        the job runs, and raise JobCancelled if cancellation was requested.
+        """
+        self.progress.update(counters)
+        updated = Job.objects.filter(pk=self.pk, cancel_requested=False).update(
+            progress=self.progress, heartbeat_at=timezone.now()
+        )
+        if not updated:
+            raise JobCancelled(f"Job {self.pk} was cancelled")
@@ -0,0 +1,141 @@
+﻿import base64
+import json
+from collections import OrderedDict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPageNumberPagination(PageNumberPagination):
+    """
+    Page-number pagination with two opt-in fast paths.
+
+    ``?cursor=`` switches to keyset pagination: rows are ordered by the view's
+    ``keyset_ordering`` (which must end in a unique field) and each page seeks
+    past the last row of the previous one, so page 10,000 costs the same as
+    page 1. Pass an empty cursor for the first page and follow ``next``.
+
+    ``?count=false`` keeps page numbers but skips the COUNT(*) query; ``count``
+    is then returned as null.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.mode = 'page'
+        ordering = getattr(view, 'keyset_ordering', None)
+        if ordering and self.cursor_query_param in request.query_params:
+            self.mode = 'keyset'
+            return self.paginate_keyset(queryset, request, ordering)
+        if request.query_params.get(self.count_query_param, '').lower() == 'false':
+            self.mode = 'uncounted'
+            return self.paginate_uncounted(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.mode == 'page':
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', None),
+            ('next', self.next_link),
+            ('previous', self.previous_link),
+            ('results', data)
+        ]))
+
+    # Keyset mode
+
+    def paginate_keyset(self, queryset, request, ordering):
+        page_size = self.get_page_size(request)
+        fields = [name.lstrip('-') for name in ordering]
+        queryset = queryset.order_by(*ordering)
+
+        token = request.query_params.get(self.cursor_query_param)
+        if token:
+            queryset = queryset.filter(self.seek_filter(ordering, self.decode_cursor(token, queryset.model, fields)))
+
+        rows = list(queryset[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+
+        url = request.build_absolute_uri()
+        self.previous_link = None
+        self.next_link = None
+        if has_next:
+            last = rows[-1]
+            self.next_link = replace_query_param(
+                url, self.cursor_query_param,
+                self.encode_cursor([
+                    last[field] if isinstance(last, dict) else getattr(last, field) for field in fields
+                ])
+            )
+        return rows
+
+    @staticmethod
+    def seek_filter(ordering, values):
+        """
+        Build the WHERE clause selecting rows after ``values`` in ``ordering``.
+
+        Expands the row comparison as ``a <= x AND (a < x OR (a = x AND b < y) ...)``
+        so the leading column can still drive an index range scan.
+        """
+        comparisons = Q()
+        equal_prefix = Q()
+        for name, value in zip(ordering, values):
+            field = name.lstrip('-')
+            operator = 'lt' if name.startswith('-') else 'gt'
+            comparisons |= equal_prefix & Q(**{f'{field}__{operator}': value})
+            equal_prefix &= Q(**{field: value})
+
+        first_field = ordering[0].lstrip('-')
+        first_operator = 'lte' if ordering[0].startswith('-') else 'gte'
+        return Q(**{f'{first_field}__{first_operator}': values[0]}) & comparisons
+
+    @staticmethod
+    def encode_cursor(values):
+        # Full isoformat: DjangoJSONEncoder truncates datetimes to milliseconds
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+        payload = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(token, model, fields):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError
+            return [model._meta.get_field(field).to_python(value) for field, value in zip(fields, values)]
+        except Exception:
+            raise NotFound('Invalid cursor.')
+
+    # Uncounted page-number mode
+
+    def paginate_uncounted(self, queryset, request):
+        page_size = self.get_page_size(request)
+        try:
+            page_number = int(request.query_params.get(self.page_query_param, 1))
+            if page_number < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound('Invalid page.')
+
+        offset = (page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        if page_number > 1 and not rows:
+            raise NotFound('Invalid page.')
+
+        url = request.build_absolute_uri()
+        self.next_link = replace_query_param(url, self.page_query_param, page_number + 1) if has_next else None
+        if page_number == 1:
+            self.previous_link = None
+        elif page_number == 2:
+            self.previous_link = remove_query_param(url, self.page_query_param)
+        else:
+            self.previous_link = replace_query_param(url, self.page_query_param, page_number - 1)
+        return rows
@@ -0,0 +1,48 @@
+﻿import csv
+import io
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """Parse newline-delimited JSON (one object per line) into a list"""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        rows = []
+        for line_number, line in enumerate(stream.read().decode(encoding).splitlines(), start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as exc:
+                raise ParseError(f'NDJSON parse error on line {line_number} - {exc}')
+        return rows
+
+
+def csv_rows(text):
+    """Read CSV text with a header row into dicts; empty cells become None"""
+    reader = csv.DictReader(io.StringIO(text))
+    return [
+        {name.strip(): (value.strip() or None) if isinstance(value, str) else value
+         for name, value in row.items() if name}
+        for row in reader
+    ]
+
+
+class CSVParser(BaseParser):
+    """Parse CSV with a header row into a list of objects"""
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        try:
+            return csv_rows(stream.read().decode(encoding).lstrip('\ufeff'))
+        except (UnicodeDecodeError, csv.Error) as exc:
+            raise ParseError(f'CSV parse error - {exc}')
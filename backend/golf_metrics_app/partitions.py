@@ -0,0 +1,222 @@
+﻿import logging
+import re
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import aggregates, caching, leaderboards
+from .models import Shot, ShotArchive, Tournament, month_start, next_month
+
+logger = logging.getLogger(__name__)
+
+SHOT_TABLE = Shot._meta.db_table
+DEFAULT_PARTITION = f'{SHOT_TABLE}_default'
+# Holds every ingest key on PostgreSQL, where a unique index on the partitioned
+# table would have to include the timestamp and could no longer catch retries
+# (created with its triggers by migration 0013)
+INGEST_KEY_TABLE = f'{SHOT_TABLE}_ingest_key'
+
+Partition = namedtuple('Partition', 'name start end')
+
+_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+# Shot table partitioning
+#
+# On PostgreSQL the Shot table is range partitioned by timestamp, one
+# partition per UTC month, plus a default partition catching shots outside
+# every month created so far (manage_shot_partitions moves them out). Shots
+# are still read and written through the parent table, so the ORM is
+# unaware of it; tournament filters bound the timestamp with the
+# tournament's shot window (ShotQuerySet.for_tournament) so only the months
+# holding the tournament are scanned. Schema changes to Shot go through the
+# parent, which cannot build indexes CONCURRENTLY. Other databases keep the
+# single table, and everything here reports that there is nothing to do.
+
+def quote(name):
+    return connection.ops.quote_name(name)
+
+
+def partition_name(start):
+    return f'{SHOT_TABLE}_p{start:%Y_%m}'
+
+
+def add_months(value, months):
+    """Start of the month ``months`` after (or before) the month of ``value``"""
+    start = month_start(value)
+    index = start.year * 12 + start.month - 1 + months
+    return start.replace(year=index // 12, month=index % 12 + 1)
+
+
+def is_partitioned():
+    """Whether the Shot table is a partitioned PostgreSQL table"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [SHOT_TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def list_partitions():
+    """The monthly partitions attached to the Shot table, oldest first (the default partition excluded)"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s)",
+            [SHOT_TABLE]
+        )
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND.search(bound)
+        if match:
+            start, end = (parse_datetime(value) for value in match.groups())
+            partitions.append(Partition(name, start, end))
+    return sorted(partitions, key=lambda partition: partition.start)
+
+
+def create_partition(start):
+    """
+    Attach the partition of the month starting at ``start``, moving in any
+    of its shots that waited in the default partition. The table is built
+    detached and then attached, which does not block reads and writes of the
+    Shot table the way CREATE TABLE ... PARTITION OF would. Returns the
+    number of shots moved.
+    """
+    end = next_month(start)
+    table, default, name = quote(SHOT_TABLE), quote(DEFAULT_PARTITION), quote(partition_name(start))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {default} WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved',
+            [start, end]
+        )
+        moved = cursor.rowcount
+        cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)', [start, end])
+        if moved:
+            # Leaving the default partition released their ingest keys
+            cursor.execute(
+                f'INSERT INTO {quote(INGEST_KEY_TABLE)} ("ingest_key") SELECT "ingest_key" FROM {name} '
+                f'WHERE "ingest_key" IS NOT NULL ON CONFLICT DO NOTHING'
+            )
+    return moved
+
+
+def ensure_partitions(months_ahead, now=None):
+    """Create the missing partitions from this month to ``months_ahead`` months ahead; returns {name: moved}"""
+    existing = {partition.start for partition in list_partitions()}
+    start = month_start(now or timezone.now())
+    last = add_months(start, months_ahead)
+    created = {}
+    while start <= last:
+        if start not in existing:
+            created[partition_name(start)] = create_partition(start)
+        start = next_month(start)
+    return created
+
+
+# Tournament-level archival
+
+def plan_archive(partitions, cutoff):
+    """
+    The leading run of ``partitions`` that can be detached: each ends by
+    ``cutoff``, and every tournament with shots in it is inactive, ended
+    before ``cutoff`` and has all its shot months in the run, so a
+    tournament is archived whole or not at all.
+    """
+    candidates = [partition for partition in partitions if partition.end <= cutoff]
+    if not candidates:
+        return []
+    boundary = candidates[-1].end
+    tournaments = list(Tournament.objects.filter(
+        shots_from__lt=boundary, shots_until__gt=candidates[0].start
+    ).values_list('shots_from', 'shots_until', 'is_active', 'end_date'))
+    # A tournament still running holds back its months, and every month after them
+    for shots_from, shots_until, is_active, end_date in tournaments:
+        if is_active or end_date >= cutoff.date() or shots_until > cutoff:
+            boundary = min(boundary, shots_from)
+    # Tournaments straddling the boundary stay whole on the attached side
+    moved = True
+    while moved:
+        moved = False
+        for shots_from, shots_until, *_ in tournaments:
+            if shots_from < boundary < shots_until:
+                boundary, moved = shots_from, True
+    return [partition for partition in candidates if partition.end <= boundary]
+
+
+def detach_partition(partition):
+    """
+    Detach a monthly partition and record it as a ShotArchive. Its shots
+    leave every list, statistic and leaderboard, and their ingest keys are
+    released so a late retry is accepted as a new shot.
+    """
+    name = quote(partition.name)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {name}')
+        shot_count = cursor.fetchone()[0]
+        cursor.execute(f'SELECT DISTINCT "golfer_id" FROM {name}')
+        golfer_ids = [golfer_id for golfer_id, in cursor.fetchall()]
+        cursor.execute(f'SELECT DISTINCT "tournament_id" FROM {name} WHERE "tournament_id" IS NOT NULL')
+        tournament_ids = sorted(tournament_id for tournament_id, in cursor.fetchall())
+
+        cursor.execute(f'ALTER TABLE {quote(SHOT_TABLE)} DETACH PARTITION {name}')
+        cursor.execute(
+            f'DELETE FROM {quote(INGEST_KEY_TABLE)} WHERE "ingest_key" IN '
+            f'(SELECT "ingest_key" FROM {name} WHERE "ingest_key" IS NOT NULL)'
+        )
+        archive = ShotArchive.objects.create(
+            table_name=partition.name, range_start=partition.start, range_end=partition.end,
+            shot_count=shot_count, tournament_ids=tournament_ids
+        )
+        _refresh_derived(golfer_ids, tournament_ids)
+    return archive
+
+
+def reattach_partition(table_name):
+    """Attach an archived partition again; returns the ShotArchive it came from, now deleted"""
+    archive = ShotArchive.objects.get(table_name=table_name)
+    name = quote(table_name)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'ALTER TABLE {quote(SHOT_TABLE)} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)',
+            [archive.range_start, archive.range_end]
+        )
+        # Keys taken again while archived stay with the newer shots
+        cursor.execute(
+            f'INSERT INTO {quote(INGEST_KEY_TABLE)} ("ingest_key") SELECT "ingest_key" FROM {name} '
+            f'WHERE "ingest_key" IS NOT NULL ON CONFLICT DO NOTHING'
+        )
+        cursor.execute(f'SELECT DISTINCT "golfer_id" FROM {name}')
+        golfer_ids = [golfer_id for golfer_id, in cursor.fetchall()]
+        archive.delete()
+        _refresh_derived(golfer_ids, archive.tournament_ids)
+    return archive
+
+
+def _refresh_derived(golfer_ids, tournament_ids):
+    """Recompute aggregates and leaderboards after shots left or rejoined the Shot table"""
+    aggregates.refresh_golfers(golfer_ids)
+    leaderboards.invalidate(tournament_ids)
+    caching.bump('shot', tournament_ids)
+    caching.bump('golfer')
+
+
+def archive_partitions(retain_months, now=None, dry_run=False):
+    """
+    Detach the monthly partitions older than ``retain_months`` whole months
+    whose tournaments are all finished (see plan_archive). Returns the
+    partitions detached, or that would be with ``dry_run``.
+    """
+    cutoff = add_months(now or timezone.now(), -retain_months)
+    planned = plan_archive(list_partitions(), cutoff)
+    if not dry_run:
+        for partition in planned:
+            detach_partition(partition)
+            logger.info("Archived shot partition %s", partition.name)
+    return planned
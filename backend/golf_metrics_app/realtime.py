@@ -0,0 +1,333 @@
+﻿import asyncio
+import json
+import threading
+from collections import defaultdict
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+from rest_framework.renderers import JSONRenderer
+
+from .models import Shot
+from .serializers import ShotSerializer
+
+PUBLISH_CHUNK_SIZE = 500
+
+# Subscription filters, most selective first; the first one present indexes the subscriber
+FILTER_PARAMS = [
+    ('golfer', ('golfer_id', 'golfer')),
+    ('group', ('group_id', 'group')),
+    ('tournament', ('tournament_id', 'tournament')),
+]
+
+
+class Subscription:
+    """One connected client: its filters and the queue its event loop drains"""
+
+    def __init__(self, filters, loop, queue_size):
+        self.filters = filters
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+        self.index_key = next(
+            ((name, filters[name]) for name, _ in FILTER_PARAMS if name in filters),
+            ('all', None)
+        )
+
+    def matches(self, routing):
+        return all(routing.get(name) == value for name, value in self.filters.items())
+
+    def offer(self, frame):
+        """Queue a frame from the subscriber's loop; a full queue drops the client"""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # Close the stream; the client reconnects with Last-Event-ID and replays from the database
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class InProcessBroker:
+    """
+    Fan shot events out to the subscribers connected to this worker process.
+
+    Subscribers are indexed by their most selective filter, so a publish only
+    looks at clients that can possibly match. Each event is encoded once and
+    the same bytes are handed to every matching queue with a single
+    ``call_soon_threadsafe`` per event loop. Replacements configured through
+    ``GOLF_REALTIME_BROKER`` need the same four methods.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = defaultdict(set)
+
+    def subscribe(self, filters, loop=None, queue_size=None):
+        subscription = Subscription(
+            filters,
+            loop or asyncio.get_running_loop(),
+            queue_size or settings.GOLF_REALTIME_QUEUE_SIZE
+        )
+        with self._lock:
+            self._index[subscription.index_key].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._index.get(subscription.index_key)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._index[subscription.index_key]
+
+    def has_subscribers(self):
+        return bool(self._index)
+
+    def publish(self, routing, frame):
+        """Deliver an encoded frame to every subscriber whose filters match ``routing``"""
+        keys = [('all', None)] + [(name, routing.get(name)) for name, _ in FILTER_PARAMS if routing.get(name)]
+        by_loop = defaultdict(list)
+        with self._lock:
+            for key in keys:
+                for subscription in self._index.get(key, ()):
+                    if subscription.matches(routing):
+                        by_loop[subscription.loop].append(subscription)
+        for loop, subscriptions in by_loop.items():
+            loop.call_soon_threadsafe(_deliver, subscriptions, frame)
+
+
+def _deliver(subscriptions, frame):
+    for subscription in subscriptions:
+        subscription.offer(frame)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the process-wide broker named by ``GOLF_REALTIME_BROKER``"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.GOLF_REALTIME_BROKER)()
+    return _broker
+
+
+# Event encoding
+
+def _routing(shot):
+    return {'golfer': shot.golfer_id, 'group': shot.group_id, 'tournament': shot.tournament_id}
+
+
+def encode_event(event, data, event_id=None):
+    """Encode one Server-Sent Events frame"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {data.decode() if isinstance(data, bytes) else data}')
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+def shot_frames(shots):
+    """Yield (routing, frame) pairs carrying the ShotSerializer representation of ``shots``"""
+    renderer = JSONRenderer()
+    for shot in shots:
+        yield _routing(shot), encode_event('shot', renderer.render(ShotSerializer(shot).data), shot.id)
+
+
+def publish_shots(shot_ids):
+    """Broadcast the given shots once the current transaction commits"""
+    shot_ids = list(shot_ids)
+    if not shot_ids:
+        return
+
+    def send():
+        broker = get_broker()
+        if not broker.has_subscribers():
+            return
+        shots = Shot.objects.select_related('golfer', 'group', 'tournament').order_by('id')
+        for start in range(0, len(shot_ids), PUBLISH_CHUNK_SIZE):
+            chunk = shots.filter(id__in=shot_ids[start:start + PUBLISH_CHUNK_SIZE])
+            for routing, frame in shot_frames(chunk):
+                broker.publish(routing, frame)
+
+    transaction.on_commit(send)
+
+
+def publish_resync(placements):
+    """
+    Ask matching clients to refetch after shots were written without known IDs.
+
+    ``placements`` is a set of (golfer, group, tournament) tuples.
+    """
+    placements = set(placements)
+    if not placements:
+        return
+
+    def send():
+        broker = get_broker()
+        for golfer, group, tournament in placements:
+            routing = {'golfer': golfer, 'group': group, 'tournament': tournament}
+            broker.publish(routing, encode_event('resync', json.dumps(routing)))
+
+    transaction.on_commit(send)
+
+
+# ASGI application
+
+def _parse_filters(query_string):
+    params = parse_qs(query_string.decode('latin-1'))
+    filters = {}
+    for name, aliases in FILTER_PARAMS:
+        value = next((params[alias][0] for alias in aliases if params.get(alias)), None)
+        if value is not None:
+            filters[name] = int(value)
+    return filters
+
+
+def _cors_headers(scope):
+    headers = dict(scope.get('headers', []))
+    origin = headers.get(b'origin')
+    if not origin:
+        return []
+    allowed = getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False) or (
+        origin.decode('latin-1') in getattr(settings, 'CORS_ALLOWED_ORIGINS', [])
+    )
+    if not allowed:
+        return []
+    cors = [(b'access-control-allow-origin', origin), (b'vary', b'Origin')]
+    if getattr(settings, 'CORS_ALLOW_CREDENTIALS', False):
+        cors.append((b'access-control-allow-credentials', b'true'))
+    return cors
+
+
+def _replay(filters, last_event_id, limit):
+    """Frames for shots created after ``last_event_id`` that match ``filters``"""
+    shots = Shot.objects.select_related('golfer', 'group', 'tournament').filter(id__gt=last_event_id)
+    lookups = {'golfer': 'golfer_id', 'group': 'group_id', 'tournament': 'tournament_id'}
+    shots = shots.filter(**{lookups[name]: value for name, value in filters.items()})
+    return [frame for _, frame in shot_frames(shots.order_by('id')[:limit])]
+
+
+class ShotStreamApplication:
+    """
+    ASGI wrapper serving the shot push channel and delegating everything else.
+
+    ``GET`` on ``GOLF_REALTIME_PATH`` opens a Server-Sent Events stream of newly
+    created shots, optionally filtered by ``tournament``, ``group`` and
+    ``golfer``. Reconnecting clients send ``Last-Event-ID`` and get the shots
+    they missed replayed from the database first.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and scope['path'] == settings.GOLF_REALTIME_PATH:
+            return await self.stream(scope, receive, send)
+        return await self.application(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def respond(self, send, status, body, headers=()):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), *headers],
+        })
+        await send({'type': 'http.response.body', 'body': json.dumps(body).encode()})
+
+    async def stream(self, scope, receive, send):
+        cors = _cors_headers(scope)
+        if scope['method'] == 'OPTIONS':
+            return await self.respond(send, 204, {}, cors)
+        if scope['method'] != 'GET':
+            return await self.respond(send, 405, {'success': False, 'error': 'Method not allowed'}, cors)
+        try:
+            filters = _parse_filters(scope.get('query_string', b''))
+            headers = dict(scope.get('headers', []))
+            last_event_id = int(headers.get(b'last-event-id') or 0)
+        except ValueError:
+            return await self.respond(send, 400, {
+                'success': False,
+                'error': 'Filters and Last-Event-ID must be integers'
+            }, cors)
+
+        broker = get_broker()
+        # Subscribe before replaying so nothing created in between is missed
+        subscription = broker.subscribe(filters)
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no'),
+                    *cors,
+                ],
+            })
+            await send({'type': 'http.response.body', 'body': b'retry: 2000\n\n', 'more_body': True})
+
+            if last_event_id:
+                frames = await sync_to_async(_replay)(filters, last_event_id, settings.GOLF_REALTIME_REPLAY_LIMIT)
+                if frames:
+                    await send({'type': 'http.response.body', 'body': b''.join(frames), 'more_body': True})
+
+            disconnected = asyncio.ensure_future(self.wait_for_disconnect(receive))
+            try:
+                await self.pump(subscription, send, disconnected)
+            finally:
+                disconnected.cancel()
+        finally:
+            broker.unsubscribe(subscription)
+
+    async def wait_for_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def pump(self, subscription, send, disconnected):
+        keepalive = settings.GOLF_REALTIME_KEEPALIVE_SECONDS
+        while not disconnected.done():
+            getter = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait({getter, disconnected}, timeout=keepalive,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                if not done:
+                    await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                continue
+
+            frame = getter.result()
+            if frame is None:
+                break
+            # Drain whatever else is queued into the same write
+            frames = [frame]
+            while not subscription.queue.empty():
+                frame = subscription.queue.get_nowait()
+                if frame is None:
+                    break
+                frames.append(frame)
+            await send({'type': 'http.response.body', 'body': b''.join(frames), 'more_body': True})
+            if frame is None:
+                break
+        if not disconnected.done():
+            await send({'type': 'http.response.body', 'body': b''})
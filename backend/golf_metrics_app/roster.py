@@ -0,0 +1,227 @@
+﻿import time
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.validators import UniqueValidator
+
+from . import assignments, caching
+from .models import Golfer, Group
+from .serializers import GolferSerializer
+
+# Golfer fields accepted in a roster import, besides the group reference
+ROSTER_FIELDS = [
+    'golfer_id', 'first_name', 'last_name', 'email', 'phone', 'date_of_birth',
+    'gender', 'handicap', 'skill_level', 'preferred_tee', 'is_active', 'notes',
+]
+# Needed to create a golfer; updates may leave them out
+REQUIRED_FOR_CREATE = ['first_name', 'last_name']
+
+
+class RosterValidator:
+    """
+    Validate roster rows column by column with GolferSerializer's field rules.
+
+    Only the columns present in a row are validated, so a row for an existing
+    golfer can update a single field. golfer_id uniqueness is settled for the
+    whole batch with one query instead of one exists() per row.
+    """
+
+    def __init__(self):
+        serializer_fields = GolferSerializer().fields
+        self.fields = {name: serializer_fields[name] for name in ROSTER_FIELDS}
+        self.fields['golfer_id'].validators = [
+            validator for validator in self.fields['golfer_id'].validators
+            if not isinstance(validator, UniqueValidator)
+        ]
+
+    def validate(self, rows):
+        """Return ({row index: validated values}, {row index: errors})"""
+        errors = {}
+        values = {}
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                errors[index] = {'non_field_errors': ['Expected an object.']}
+            elif not row.get('golfer_id'):
+                errors[index] = {'golfer_id': ['This field is required.']}
+            else:
+                values[index] = {}
+
+        for name, field in self.fields.items():
+            for index in list(values):
+                if name not in rows[index]:
+                    continue
+                try:
+                    values[index][name] = field.run_validation(rows[index][name])
+                except SkipField:
+                    continue
+                except serializers.ValidationError as exc:
+                    errors.setdefault(index, {})[name] = exc.detail
+
+        first_seen = {}
+        for index in list(values):
+            golfer_id = values[index].get('golfer_id')
+            if golfer_id in first_seen:
+                errors.setdefault(index, {})['golfer_id'] = [
+                    f'Duplicate of row {first_seen[golfer_id]} in this import.'
+                ]
+            else:
+                first_seen[golfer_id] = index
+
+        return {index: value for index, value in values.items() if index not in errors}, errors
+
+
+def _resolve_groups(rows, values, errors, tournament_id):
+    """Map each row's ``group`` (pk) or ``group_number`` to a group ID; None unassigns"""
+    targets = {}
+    numbers = {}
+    for index in values:
+        row = rows[index]
+        if row.get('group') not in (None, ''):
+            try:
+                targets[index] = int(row['group'])
+            except (TypeError, ValueError):
+                errors.setdefault(index, {})['group'] = ['Incorrect type. Expected pk value.']
+        elif row.get('group_number') not in (None, ''):
+            if not tournament_id:
+                errors.setdefault(index, {})['group_number'] = ['group_number needs a tournament to look up.']
+                continue
+            try:
+                numbers[index] = int(row['group_number'])
+            except (TypeError, ValueError):
+                errors.setdefault(index, {})['group_number'] = ['A valid integer is required.']
+        elif 'group' in row or 'group_number' in row:
+            targets[index] = None
+
+    if numbers:
+        by_number = dict(
+            Group.objects.filter(tournament_id=tournament_id, group_number__in=set(numbers.values()))
+            .values_list('group_number', 'id')
+        )
+        for index, number in numbers.items():
+            if number in by_number:
+                targets[index] = by_number[number]
+            else:
+                errors.setdefault(index, {})['group_number'] = [f'Group {number} does not exist in this tournament.']
+    return {index: group_id for index, group_id in targets.items() if index not in errors}
+
+
+def import_roster(rows, tournament_id=None, dry_run=False, reattribute_shots=False):
+    """
+    Validate and upsert roster rows on golfer_id, returning a row-level diff.
+
+    Rows may place golfers with a ``group`` primary key or, with
+    ``tournament_id``, a ``group_number``. Rows that fail validation, or
+    would overflow a group, are reported and skipped; the rest are written
+    with one bulk INSERT ... ON CONFLICT (golfer_id) DO UPDATE per batch.
+    """
+    started = time.perf_counter()
+    values, errors = RosterValidator().validate(rows)
+
+    with transaction.atomic():
+        targets = _resolve_groups(rows, values, errors, tournament_id)
+        requested = {group_id for group_id in targets.values() if group_id}
+        groups = assignments.lock_groups(list(Group.objects.filter(id__in=requested).values_list('id', flat=True)))
+        for index, group_id in list(targets.items()):
+            if group_id and group_id not in groups:
+                errors.setdefault(index, {})['group'] = [f'Invalid pk "{group_id}" - object does not exist.']
+                del targets[index]
+        counts = assignments.golfer_counts(groups)
+
+        existing = {
+            row['golfer_id']: row
+            for row in Golfer.objects.filter(
+                golfer_id__in=[value['golfer_id'] for index, value in values.items() if index not in errors]
+            ).values('id', 'group_id', *ROSTER_FIELDS)
+        }
+
+        created, updated, unchanged = [], [], []
+        golfers = []
+        update_fields = {'updated_at'}
+        moved = {}
+        for index, value in values.items():
+            if index in errors:
+                continue
+            current = existing.get(value['golfer_id'])
+            if current is None:
+                missing = [name for name in REQUIRED_FOR_CREATE if value.get(name) in (None, '')]
+                if missing:
+                    errors[index] = {name: ['This field is required.'] for name in missing}
+                    continue
+            if index in targets:
+                value['group_id'] = targets[index]
+
+            changes = {
+                name: {'old': current[name], 'new': new}
+                for name, new in value.items()
+                if current is not None and current[name] != new
+            }
+
+            # Capacity: golfers joining a group take a spot, golfers leaving free one
+            old_group = current['group_id'] if current else None
+            new_group = value.get('group_id', old_group)
+            if new_group != old_group:
+                if new_group and counts.get(new_group, 0) >= groups[new_group].max_golfers:
+                    errors[index] = {'group': [f'{groups[new_group].display_name} is full.']}
+                    continue
+                if new_group:
+                    counts[new_group] = counts.get(new_group, 0) + 1
+                    if current:
+                        moved.setdefault(new_group, []).append(current['id'])
+                if old_group in counts:
+                    counts[old_group] -= 1
+
+            if current is None:
+                created.append(value['golfer_id'])
+                golfers.append(Golfer(**value))
+            elif changes:
+                updated.append({'golfer_id': value['golfer_id'], 'changes': changes})
+                merged = {name: current[name] for name in ROSTER_FIELDS}
+                merged['group_id'] = current['group_id']
+                merged.update(value)
+                golfers.append(Golfer(**merged))
+            else:
+                unchanged.append(value['golfer_id'])
+                continue
+            update_fields.update(name for name in value if name != 'golfer_id')
+
+        if golfers and not dry_run:
+            Golfer.objects.bulk_create(
+                golfers,
+                batch_size=settings.GOLF_ROSTER_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['golfer_id'],
+                update_fields=sorted('group' if name == 'group_id' else name for name in update_fields),
+            )
+            # bulk_create sends no signals
+            caching.bump('golfer')
+            assignments.attribute_shots(moved, groups, reattribute_shots)
+
+    elapsed = time.perf_counter() - started
+    return {
+        'received': len(rows),
+        'created_count': len(created),
+        'updated_count': len(updated),
+        'unchanged_count': len(unchanged),
+        'error_count': len(errors),
+        'errors': [
+            {
+                'index': index,
+                'golfer_id': rows[index].get('golfer_id') if isinstance(rows[index], dict) else None,
+                'errors': errors[index],
+            }
+            for index in sorted(errors)
+        ],
+        'diff': {
+            'created': created,
+            'updated': updated,
+        },
+        'dry_run': dry_run,
+        'elapsed_ms': round(elapsed * 1000, 2),
+    }
+
+
+def run_import(job, rows, tournament_id=None, dry_run=False, reattribute_shots=False):
+    """Job handler for import_roster"""
+    return import_roster(rows, tournament_id=tournament_id, dry_run=dry_run, reattribute_shots=reattribute_shots)
@@ -1,13 +1,21 @@
 ﻿from rest_framework import serializers
 from django.db import models
-from .models import Tournament, Group, Golfer, Shot
+from .fieldsets import SparseFieldsetMixin
+from .instrumentation import TimedSerializerMixin
+from .models import Tournament, Group, Golfer, Shot, Job
 
 
-class TournamentSerializer(serializers.ModelSerializer):
+class TournamentSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Tournament model"""
     total_groups = serializers.IntegerField(read_only=True)
     total_golfers = serializers.IntegerField(read_only=True)
 
+    # Totals come from TournamentQuerySet.with_counts() annotations
+    field_dependencies = {
+        'total_groups': [],
+        'total_golfers': [],
+    }
+
     class Meta:
         model = Tournament
         fields = [
@@ -27,7 +35,7 @@ class TournamentSerializer(serializers.ModelSerializer):
         return data
 
 
-class GroupSerializer(serializers.ModelSerializer):
+class GroupSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Group model"""
     tournament_name = serializers.CharField(source='tournament.name', read_only=True)
     current_golfer_count = serializers.IntegerField(read_only=True)
@@ -35,6 +43,14 @@ class GroupSerializer(serializers.ModelSerializer):
     is_full = serializers.BooleanField(read_only=True)
     available_spots = serializers.IntegerField(read_only=True)
 
+    # Golfer counts come from GroupQuerySet.with_golfer_count() annotations
+    field_dependencies = {
+        'current_golfer_count': [],
+        'display_name': ['nickname', 'group_number'],
+        'is_full': ['max_golfers'],
+        'available_spots': ['max_golfers'],
+    }
+
     class Meta:
         model = Group
         fields = [
@@ -56,13 +72,20 @@ class GroupSerializer(serializers.ModelSerializer):
         return value
 
 
-class GolferSerializer(serializers.ModelSerializer):
+class GolferSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Golfer model"""
     full_name = serializers.CharField(read_only=True)
     age = serializers.IntegerField(read_only=True)
     group_name = serializers.CharField(source='group.display_name', read_only=True)
     tournament_name = serializers.CharField(source='tournament.name', read_only=True)
 
+    field_dependencies = {
+        'full_name': ['first_name', 'last_name'],
+        'age': ['date_of_birth'],
+        'group_name': ['group__nickname', 'group__group_number'],
+        'tournament_name': ['group__tournament__name'],
+    }
+
     class Meta:
         model = Golfer
         fields = [
@@ -104,12 +127,26 @@ class GolferSerializer(serializers.ModelSerializer):
         return value
 
 
-class ShotSerializer(serializers.ModelSerializer):
+# Plausibility ranges for shot fields, shared with the batched ingest validator
+SHOT_VALUE_RANGES = {
+    'hole_number': (1, 18, "Hole number must be between 1 and 18."),
+    'ball_speed': (0, 250, "Ball speed must be between 0 and 250 mph."),
+    'club_head_speed': (0, 200, "Club head speed must be between 0 and 200 mph."),
+    'carry_distance': (0, 500, "Carry distance must be between 0 and 500 yards."),
+    'total_distance': (0, 600, "Total distance must be between 0 and 600 yards."),
+}
+
+
+class ShotSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Shot model"""
     golfer_name = serializers.CharField(source='golfer.full_name', read_only=True)
     group_name = serializers.CharField(source='group.display_name', read_only=True)
     tournament_name = serializers.CharField(source='tournament.name', read_only=True)
-    smash_factor = serializers.DecimalField(max_digits=4, decimal_places=2, read_only=True)
+
+    field_dependencies = {
+        'golfer_name': ['golfer__first_name', 'golfer__last_name'],
+        'group_name': ['group__nickname', 'group__group_number'],
+    }
 
     class Meta:
         model = Shot
@@ -122,36 +159,35 @@ class ShotSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at']
+        # Allocated per golfer (or hole) by Shot.assign_numbers when omitted
+        extra_kwargs = {'shot_number': {'required': False}}
+
+    def _validate_range(self, field_name, value):
+        """Apply the shared plausibility range for a launch monitor field"""
+        low, high, message = SHOT_VALUE_RANGES[field_name]
+        if value is not None and (value < low or value > high):
+            raise serializers.ValidationError(message)
+        return value
 
     def validate_hole_number(self, value):
         """Validate hole number range"""
-        if value is not None and (value < 1 or value > 18):
-            raise serializers.ValidationError("Hole number must be between 1 and 18.")
-        return value
+        return self._validate_range('hole_number', value)
 
     def validate_ball_speed(self, value):
         """Validate ball speed is reasonable"""
-        if value is not None and (value < 0 or value > 250):
-            raise serializers.ValidationError("Ball speed must be between 0 and 250 mph.")
-        return value
+        return self._validate_range('ball_speed', value)
 
     def validate_club_head_speed(self, value):
         """Validate club head speed is reasonable"""
-        if value is not None and (value < 0 or value > 200):
-            raise serializers.ValidationError("Club head speed must be between 0 and 200 mph.")
-        return value
+        return self._validate_range('club_head_speed', value)
 
     def validate_carry_distance(self, value):
         """Validate carry distance is reasonable"""
-        if value is not None and (value < 0 or value > 500):
-            raise serializers.ValidationError("Carry distance must be between 0 and 500 yards.")
-        return value
+        return self._validate_range('carry_distance', value)
 
     def validate_total_distance(self, value):
         """Validate total distance is reasonable"""
-        if value is not None and (value < 0 or value > 600):
-            raise serializers.ValidationError("Total distance must be between 0 and 600 yards.")
-        return value
+        return self._validate_range('total_distance', value)
 
 
 # Bulk operation serializers
@@ -166,6 +202,23 @@ class BulkDeleteSerializer(serializers.Serializer):
         default=False,
         help_text="Whether to delete related objects"
     )
+    background = serializers.BooleanField(
+        default=False,
+        help_text="Run as a background job and return its ID right away"
+    )
+
+
+class JobSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer for background jobs"""
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'status', 'params', 'progress', 'result', 'error',
+            'attempts', 'max_attempts', 'run_after', 'cancel_requested', 'worker',
+            'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
 
 
 class GroupAssignmentSerializer(serializers.Serializer):
@@ -175,44 +228,103 @@ class GroupAssignmentSerializer(serializers.Serializer):
         min_length=1,
         help_text="List of golfer IDs to assign"
     )
-    group_id = serializers.IntegerField(help_text="Group ID to assign golfers to")
+    group_id = serializers.IntegerField(
+        required=False,
+        help_text="Group ID to assign golfers to (optional; must match the group in the URL)"
+    )
+    reattribute_shots = serializers.BooleanField(
+        default=False,
+        help_text="Also move shots recorded in earlier groups to this group"
+    )
 
-    def validate(self, data):
-        """Validate group assignment"""
-        group_id = data.get('group_id')
-        golfer_ids = data.get('golfer_ids', [])
-
-        try:
-            group = Group.objects.get(id=group_id)
-        except Group.DoesNotExist:
-            raise serializers.ValidationError("Group does not exist.")
-
-        # Check if group has enough space
-        available_spots = group.available_spots
-        if len(golfer_ids) > available_spots:
-            raise serializers.ValidationError(
-                f"Group only has {available_spots} available spots, "
-                f"but you're trying to assign {len(golfer_ids)} golfers."
-            )
-
-        # Check if golfers exist
-        existing_golfers = Golfer.objects.filter(id__in=golfer_ids)
-        if existing_golfers.count() != len(golfer_ids):
-            missing_ids = set(golfer_ids) - set(existing_golfers.values_list('id', flat=True))
-            raise serializers.ValidationError(
-                f"Golfers with IDs {list(missing_ids)} do not exist."
-            )
+    def validate_group_id(self, value):
+        """Reject a body naming another group than the one being assigned to"""
+        expected = self.context.get('group_id')
+        if expected is not None and value != expected:
+            raise serializers.ValidationError(f"Does not match the group in the URL ({expected}).")
+        return value
 
+
+class BulkGroupCreateSerializer(serializers.Serializer):
+    """Serializer for creating many groups with consecutive numbers"""
+    tournament_id = serializers.IntegerField(
+        required=False,
+        allow_null=True,
+        help_text="Tournament the groups belong to (optional)"
+    )
+    count = serializers.IntegerField(min_value=1, max_value=500, help_text="Number of groups to create")
+    max_golfers = serializers.IntegerField(
+        min_value=1,
+        max_value=8,
+        default=4,
+        help_text="Maximum number of golfers allowed in each group"
+    )
+
+
+class ShotNumberReservationSerializer(serializers.Serializer):
+    """Serializer for reserving a block of shot numbers ahead of recording the shots"""
+    golfer_id = serializers.IntegerField(
+        required=False,
+        allow_null=True,
+        help_text="Golfer the shots belong to (omit for unassigned shots)"
+    )
+    hole_number = serializers.IntegerField(
+        required=False,
+        allow_null=True,
+        min_value=1,
+        max_value=18,
+        help_text="Number strokes on this hole of the golfer's tournament instead"
+    )
+    count = serializers.IntegerField(min_value=1, max_value=1000, help_text="Number of shot numbers to reserve")
+
+
+class GroupPlacementSerializer(serializers.Serializer):
+    """One group and the golfers to place in it"""
+    group_id = serializers.IntegerField()
+    golfer_ids = serializers.ListField(child=serializers.IntegerField(), min_length=1)
+
+
+class BulkAssignmentSerializer(serializers.Serializer):
+    """Serializer for assigning golfers across many groups in one call"""
+    assignments = GroupPlacementSerializer(
+        many=True,
+        required=False,
+        help_text="Explicit golfer lists per group"
+    )
+    tournament_id = serializers.IntegerField(
+        required=False,
+        help_text="Auto-fill the open spots of this tournament's groups"
+    )
+    golfer_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        help_text="Golfers to auto-fill with, in order (default: all active unassigned golfers)"
+    )
+    reattribute_shots = serializers.BooleanField(
+        default=False,
+        help_text="Also move shots recorded in earlier groups to the new groups"
+    )
+
+    def validate(self, data):
+        """Require exactly one of explicit assignments or a tournament to auto-fill"""
+        if ('assignments' in data) == ('tournament_id' in data):
+            raise serializers.ValidationError("Provide either assignments or tournament_id.")
+        if 'golfer_ids' in data and 'tournament_id' not in data:
+            raise serializers.ValidationError("golfer_ids is only used when auto-filling a tournament.")
         return data
 
 
 # Nested serializers for detailed views
 class GroupWithGolfersSerializer(GroupSerializer):
-    """Group serializer with nested golfers"""
+    """Group serializer with nested golfers and the ``summary`` passed in the context"""
     golfers = GolferSerializer(many=True, read_only=True)
+    summary = serializers.SerializerMethodField()
 
     class Meta(GroupSerializer.Meta):
-        fields = GroupSerializer.Meta.fields + ['golfers']
+        fields = GroupSerializer.Meta.fields + ['golfers', 'summary']
+
+    def get_summary(self, group):
+        return self.context.get('summary')
 
 
 class TournamentWithGroupsSerializer(TournamentSerializer):
@@ -224,9 +336,30 @@ class TournamentWithGroupsSerializer(TournamentSerializer):
 
 
 class GolferWithShotsSerializer(GolferSerializer):
-    """Golfer serializer with nested shots"""
-    shots = ShotSerializer(many=True, read_only=True)
-    shots_count = serializers.IntegerField(source='shots.count', read_only=True)
+    """
+    Golfer serializer with a window of their latest shots.
+
+    The view passes the serialized window (``shots``), the link to the next
+    one (``shots_next``) and the ``summary`` in the context, so no field
+    queries shots itself; ``shots_count`` is the summary's total.
+    """
+    shots = serializers.SerializerMethodField()
+    shots_next = serializers.SerializerMethodField()
+    shots_count = serializers.SerializerMethodField()
+    summary = serializers.SerializerMethodField()
 
     class Meta(GolferSerializer.Meta):
-        fields = GolferSerializer.Meta.fields + ['shots', 'shots_count']
\ No newline at end of file
+        fields = GolferSerializer.Meta.fields + ['shots', 'shots_next', 'shots_count', 'summary']
+
+    def get_shots(self, golfer):
+        return self.context.get('shots', [])
+
+    def get_shots_next(self, golfer):
+        return self.context.get('shots_next')
+
+    def get_shots_count(self, golfer):
+        summary = self.context.get('summary')
+        return summary['statistics']['total_shots'] if summary else None
+
+    def get_summary(self, golfer):
+        return self.context.get('summary')
@@ -0,0 +1,194 @@
+﻿from django.db.models import DEFERRED
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import aggregates, caching, leaderboards, realtime
+from .models import Tournament, Group, Golfer, Shot
+
+
+# Shot aggregate maintenance
+
+@receiver(pre_save, sender=Shot)
+def remember_shot_bucket(sender, instance, raw=False, **kwargs):
+    """Capture the shot's stored bucket so post_save can move its contribution"""
+    if raw or aggregates.is_suspended() or not instance.pk:
+        return
+    instance._previous_bucket_entry = aggregates.entries_for_pk(instance.pk)
+
+
+@receiver(post_save, sender=Shot)
+def update_aggregates_on_shot_save(sender, instance, raw=False, **kwargs):
+    if raw or aggregates.is_suspended():
+        return
+    previous = getattr(instance, '_previous_bucket_entry', None)
+    instance._previous_bucket_entry = None
+    current = aggregates.entries_for_pk(instance.pk)
+    aggregates.apply(
+        added=[current] if current else [],
+        removed=[previous] if previous else []
+    )
+
+
+@receiver(pre_delete, sender=Shot)
+def remember_deleted_shot_bucket(sender, instance, **kwargs):
+    if aggregates.is_suspended():
+        return
+    instance._previous_bucket_entry = aggregates.entries_for_pk(instance.pk)
+
+
+@receiver(post_delete, sender=Shot)
+def update_aggregates_on_shot_delete(sender, instance, **kwargs):
+    if aggregates.is_suspended():
+        return
+    previous = getattr(instance, '_previous_bucket_entry', None)
+    if previous:
+        aggregates.apply(removed=[previous])
+
+
+# Leaderboard maintenance
+
+@receiver(pre_save, sender=Shot)
+def remember_shot_ranking_row(sender, instance, raw=False, **kwargs):
+    """Capture the shot's stored row so post_save can take it off its boards"""
+    if raw or aggregates.is_suspended() or not instance.pk:
+        return
+    instance._previous_ranking_row = leaderboards.row_for_pk(instance.pk)
+
+
+@receiver(post_save, sender=Shot)
+def update_leaderboards_on_shot_save(sender, instance, raw=False, **kwargs):
+    if raw or aggregates.is_suspended():
+        return
+    previous = getattr(instance, '_previous_ranking_row', None)
+    instance._previous_ranking_row = None
+    leaderboards.apply(added=[leaderboards.row_for_pk(instance.pk)], removed=[previous])
+
+
+@receiver(pre_delete, sender=Shot)
+def remember_deleted_shot_ranking_row(sender, instance, **kwargs):
+    if aggregates.is_suspended():
+        return
+    instance._previous_ranking_row = leaderboards.row_for_pk(instance.pk)
+
+
+@receiver(post_delete, sender=Shot)
+def update_leaderboards_on_shot_delete(sender, instance, **kwargs):
+    if aggregates.is_suspended():
+        return
+    leaderboards.apply(removed=[getattr(instance, '_previous_ranking_row', None)])
+
+
+@receiver(post_save, sender=Shot)
+def publish_created_shot(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        realtime.publish_shots([instance.pk])
+
+
+@receiver(pre_save, sender=Golfer)
+def remember_golfer_group(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk:
+        return
+    instance._previous_group_id = (
+        Golfer.objects.filter(pk=instance.pk).values_list('group_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Golfer)
+def attribute_shots_on_golfer_move(sender, instance, created, raw=False, **kwargs):
+    """
+    Shots recorded while the golfer had no group join the new group.
+
+    Already attributed shots keep their snapshot so history is preserved.
+    """
+    if raw or created or not instance.group_id:
+        return
+    if getattr(instance, '_previous_group_id', None) == instance.group_id:
+        return
+    updated = Shot.objects.filter(golfer=instance, group__isnull=True).attribute_to_group(instance.group)
+    if updated:
+        caching.bump('shot', [instance.group.tournament_id])
+    if updated and not aggregates.is_suspended():
+        aggregates.refresh_golfers([instance.pk])
+
+
+@receiver(post_delete, sender=Golfer)
+def refresh_aggregates_on_golfer_delete(sender, instance, **kwargs):
+    # Remaining shots were detached (SET_NULL) and now count as unassigned
+    if not aggregates.is_suspended():
+        aggregates.refresh_golfers([instance.pk, None])
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_tournament(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk:
+        return
+    instance._previous_tournament_id = (
+        Group.objects.filter(pk=instance.pk).values_list('tournament_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Group)
+def attribute_shots_on_group_move(sender, instance, created, raw=False, **kwargs):
+    """Shots of a group recorded before it joined a tournament join that tournament"""
+    if raw or created or not instance.tournament_id:
+        return
+    if getattr(instance, '_previous_tournament_id', None) == instance.tournament_id:
+        return
+    updated = Shot.objects.filter(group=instance, tournament__isnull=True).update(
+        tournament_id=instance.tournament_id
+    )
+    if updated:
+        caching.bump('shot', [instance.tournament_id])
+    if updated and not aggregates.is_suspended():
+        aggregates.refresh_golfers(aggregates.golfers_in_buckets(group_id=instance.pk))
+
+
+@receiver(post_delete, sender=Group)
+def refresh_aggregates_on_group_delete(sender, instance, **kwargs):
+    if not aggregates.is_suspended():
+        aggregates.refresh_golfers(aggregates.golfers_in_buckets(group_id=instance.pk))
+
+
+@receiver(post_delete, sender=Tournament)
+def refresh_aggregates_on_tournament_delete(sender, instance, **kwargs):
+    if not aggregates.is_suspended():
+        aggregates.refresh_golfers(aggregates.golfers_in_buckets(tournament_id=instance.pk))
+
+
+# Response cache invalidation
+
+@receiver(post_save, sender=Tournament)
+@receiver(post_delete, sender=Tournament)
+def invalidate_tournament_responses(sender, instance, **kwargs):
+    caching.bump('tournament', [instance.pk])
+    if kwargs.get('signal') is post_delete:
+        # Groups and shots were detached with UPDATE, which sends no signals
+        caching.bump('group')
+        caching.bump('shot')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_responses(sender, instance, **kwargs):
+    caching.bump('group', [instance.tournament_id, getattr(instance, '_previous_tournament_id', None)])
+    if kwargs.get('signal') is post_delete:
+        caching.bump('golfer')
+        caching.bump('shot')
+
+
+@receiver(post_save, sender=Golfer)
+@receiver(post_delete, sender=Golfer)
+def invalidate_golfer_responses(sender, instance, **kwargs):
+    caching.bump('golfer')
+    if kwargs.get('signal') is post_delete:
+        caching.bump('shot')
+
+
+@receiver(post_save, sender=Shot)
+@receiver(post_delete, sender=Shot)
+def invalidate_shot_responses(sender, instance, **kwargs):
+    previous = getattr(instance, '_loaded_tournament_id', None)
+    if previous is DEFERRED:
+        caching.bump('shot')
+    else:
+        caching.bump('shot', [instance.tournament_id, previous])
@@ -1 +1,1608 @@
-﻿# Add your tests here
+﻿import asyncio
+import csv
+import io
+import json
+import tempfile
+import threading
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from . import (
+    aggregates, assignments, buffering, caching, exports, idempotency, ingest, instrumentation, jobs, partitions,
+    realtime, roster, views
+)
+from .models import (
+    Tournament, Group, Golfer, Shot, ShotAggregate, Job, JobCancelled, SequenceCounter, SequenceCounterQuerySet
+)
+from .pagination import KeysetPageNumberPagination
+
+
+# The response cache reads its version counters first; these count the view's own queries
+@override_settings(GOLF_CACHE_ENABLED=False)
+class TournamentQueryCountTests(APITestCase):
+    """Tournament endpoints must not issue per-row count queries"""
+
+    def create_tournament(self, name, group_count=2, golfers_per_group=3):
+        tournament = Tournament.objects.create(
+            name=name, start_date=date(2025, 6, 1), end_date=date(2025, 6, 2)
+        )
+        for group_index in range(group_count):
+            group = Group.objects.create(tournament=tournament)
+            for golfer_index in range(golfers_per_group):
+                Golfer.objects.create(
+                    golfer_id=f'{name}-{group_index}-{golfer_index}',
+                    first_name='Test',
+                    last_name=f'Golfer {golfer_index}',
+                    group=group
+                )
+        return tournament
+
+    def test_list_query_count_is_constant(self):
+        self.create_tournament('Alpha')
+        # Pagination count + annotated page query
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/tournaments/')
+        self.assertEqual(response.status_code, 200)
+
+        for index in range(5):
+            self.create_tournament(f'Extra {index}', group_count=3)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/tournaments/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_reports_annotated_totals(self):
+        self.create_tournament('Alpha', group_count=2, golfers_per_group=3)
+        self.create_tournament('Beta', group_count=4, golfers_per_group=1)
+        Group.objects.create(tournament=Tournament.objects.get(name='Beta'))
+
+        response = self.client.get('/api/tournaments/')
+        totals = {
+            row['name']: (row['total_groups'], row['total_golfers'])
+            for row in response.data['results']
+        }
+        self.assertEqual(totals, {'Alpha': (2, 6), 'Beta': (5, 4)})
+
+    def test_retrieve_with_groups_query_count_is_constant(self):
+        tournament = self.create_tournament('Alpha', group_count=2)
+        # Annotated tournament + annotated groups prefetch
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/tournaments/{tournament.id}/retrieve_with_groups/')
+        self.assertEqual(response.data['total_golfers'], 6)
+        self.assertEqual([group['current_golfer_count'] for group in response.data['groups']], [3, 3])
+
+        bigger = self.create_tournament('Beta', group_count=8)
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/tournaments/{bigger.id}/retrieve_with_groups/')
+        self.assertEqual(len(response.data['groups']), 8)
+
+    def test_model_properties_fall_back_without_annotation(self):
+        tournament = self.create_tournament('Alpha', group_count=3, golfers_per_group=2)
+        fresh = Tournament.objects.get(pk=tournament.pk)
+        self.assertEqual(fresh.total_groups, 3)
+        self.assertEqual(fresh.total_golfers, 6)
+
+
+class BulkIngestTests(APITestCase):
+    """Bulk ingest validates rows column by column and writes the valid ones in one insert"""
+
+    def setUp(self):
+        self.tournament = Tournament.objects.create(
+            name='Alpha', start_date=date(2025, 6, 1), end_date=date(2025, 6, 2)
+        )
+        self.group = Group.objects.create(tournament=self.tournament)
+        self.golfer = Golfer.objects.create(golfer_id='G1', first_name='Test', last_name='Golfer', group=self.group)
+
+    def test_invalid_rows_are_reported_without_failing_the_batch(self):
+        rows = [
+            {'golfer': self.golfer.id, 'club_used': 'driver', 'ball_speed': '150', 'club_head_speed': '100'},
+            'not a shot',
+            {'golfer': self.golfer.id, 'ball_speed': 400},
+            {'golfer': 99999},
+            {'golfer': 'abc', 'shot_type': 'slice'},
+            {'carry_distance': '180.5'},
+        ]
+        response = self.client.post('/api/shots/bulk_ingest/', rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created_count'], response.data['error_count']), (2, 4))
+        errors = {row_error['index']: row_error['errors'] for row_error in response.data['errors']}
+        self.assertEqual(set(errors), {1, 2, 3, 4})
+        self.assertIn('non_field_errors', errors[1])
+        self.assertIn('ball_speed', errors[2])
+        self.assertEqual(errors[3]['golfer'], ['Invalid pk "99999" - object does not exist.'])
+        self.assertEqual(set(errors[4]), {'golfer', 'shot_type'})
+
+        # Written with the golfer's placement and the derived smash factor, as a single POST would be
+        shot = Shot.objects.get(golfer=self.golfer)
+        self.assertEqual((shot.group_id, shot.tournament_id), (self.group.id, self.tournament.id))
+        self.assertEqual(shot.smash_factor, Decimal('1.50'))
+        self.assertIsNone(Shot.objects.get(golfer__isnull=True).group_id)
+
+    def test_ndjson_bodies_are_accepted(self):
+        body = '\n'.join(json.dumps({'golfer': self.golfer.id, 'carry_distance': carry}) for carry in (200, 210))
+        response = self.client.post('/api/shots/bulk_ingest/', body + '\n\n', content_type='application/x-ndjson')
+        self.assertEqual((response.status_code, response.data['created_count']), (201, 2))
+
+        response = self.client.post('/api/shots/bulk_ingest/', '{"golfer": 1}\n{oops',
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(GOLF_INGEST_MAX_ROWS=2)
+    def test_empty_and_oversized_batches_are_refused(self):
+        for rows in ([], {'shots': []}, [{}, {}, {}]):
+            response = self.client.post('/api/shots/bulk_ingest/', rows, format='json')
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/shots/bulk_ingest/', {'shots': [{}, {}]}, format='json')
+        self.assertEqual(response.data['created_count'], 2)
+        self.assertFalse(Shot.objects.exclude(shot_number__in=[1, 2]).exists())
+
+    @override_settings(GOLF_INGEST_COPY_THRESHOLD=1)
+    def test_copy_is_only_used_on_postgresql(self):
+        response = self.client.post('/api/shots/bulk_ingest/', [{'golfer': self.golfer.id}], format='json')
+        self.assertEqual(response.data['insert_method'], 'bulk_create')
+
+    @override_settings(GOLF_INGEST_COPY_THRESHOLD=2)
+    def test_batches_past_the_threshold_are_copied_on_postgresql(self):
+        postgresql = mock.MagicMock(vendor='postgresql', ops=connection.ops)
+        cursor = postgresql.cursor.return_value.__enter__.return_value
+        shots, _ = ingest.ShotBatchValidator().validate([
+            {'golfer': self.golfer.id, 'carry_distance': None if minute % 2 else '200.5',
+             'timestamp': f'2025-06-01T10:0{minute}:00Z'}
+            for minute in range(5)
+        ])
+        with mock.patch.object(ingest, 'connection', postgresql):
+            self.assertEqual(ingest.insert_shots(shots[:1]), (1, 'bulk_create'))
+            # Callers needing the primary keys back opt out of COPY
+            self.assertEqual(ingest.insert_shots(shots[1:3], allow_copy=False), (2, 'bulk_create'))
+            self.assertEqual(ingest.insert_shots(shots[3:]), (2, 'copy'))
+        self.assertEqual(cursor.copy_expert.call_count, 1)
+
+        statement, data = cursor.copy_expert.call_args.args
+        self.assertTrue(statement.startswith('COPY "golf_metrics_app_shot" ('))
+        self.assertNotIn('"id"', statement)
+        rows = list(csv.reader(io.StringIO(data.getvalue())))
+        columns = statement.split('(', 1)[1].split(')', 1)[0].replace('"', '').split(', ')
+        written = [dict(zip(columns, row)) for row in rows]
+        self.assertEqual([row['shot_number'] for row in written], ['4', '5'])
+        # NULLs go out as unquoted empty values
+        self.assertEqual([row['carry_distance'] for row in written], ['', '200.50'])
+        self.assertEqual({row['tournament_id'] for row in written}, {str(self.tournament.id)})
+
+
+class ResponseCacheTests(APITestCase):
+    """Cached responses are revalidated with ETags and invalidated by every write path"""
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.tournament = Tournament.objects.create(
+            name='Alpha', start_date=date(2025, 6, 1), end_date=date(2025, 6, 2)
+        )
+        self.group = Group.objects.create(tournament=self.tournament, max_golfers=4)
+        self.golfer = Golfer.objects.create(golfer_id='C1', first_name='Cal', last_name='Cache', group=self.group)
+        self.newcomer = Golfer.objects.create(golfer_id='C2', first_name='Nia', last_name='New')
+        Shot.objects.create(golfer=self.golfer, shot_number=1, ball_speed=150, club_head_speed=100)
+        self.statistics_url = f'/api/shots/statistics/?tournament_id={self.tournament.id}&live=true'
+
+    def get_json(self, url):
+        # Cache hits are plain HttpResponses, so read the rendered body
+        return json.loads(self.client.get(url).content)
+
+    def total_shots(self):
+        return self.get_json(self.statistics_url)['statistics']['total_shots']
+
+    def golfer_count(self, url):
+        data = self.get_json(url)
+        groups = data['groups'] if 'groups' in data else data['results']
+        return next(group['current_golfer_count'] for group in groups if group['id'] == self.group.id)
+
+    def endpoint_counts(self, endpoint):
+        counts = self.client.get('/api/cache/stats/').data['endpoints'].get(endpoint, {})
+        return {outcome: counts.get(outcome, 0) for outcome in ('hits', 'misses', 'not_modified')}
+
+    def test_hit_then_not_modified(self):
+        first = self.client.get(self.statistics_url)
+        etag = first['ETag']
+        second = self.client.get(self.statistics_url)
+        self.assertEqual((second.status_code, second['ETag'], second.content), (200, etag, first.content))
+
+        revalidated = self.client.get(self.statistics_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b'')
+        stale = self.client.get(self.statistics_url, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual((stale.status_code, stale.content), (200, first.content))
+
+    def test_shot_writes_change_the_statistics(self):
+        etag = self.client.get(self.statistics_url)['ETag']
+        self.assertEqual(self.total_shots(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/shots/', {'golfer': self.golfer.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.get(self.statistics_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.total_shots(), 2)
+
+        # Bulk paths write without per-row signals and bump the versions themselves
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/shots/bulk_ingest/', [{'golfer': self.golfer.id}] * 2, format='json')
+        self.assertEqual(self.total_shots(), 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/shots/bulk_delete/', {'ids': [response.data['id']]}, format='json')
+        self.assertEqual(self.total_shots(), 3)
+
+    def test_assignments_change_the_cached_group_counts(self):
+        list_url = f'/api/groups/?tournament_id={self.tournament.id}'
+        detail_url = f'/api/tournaments/{self.tournament.id}/retrieve_with_groups/'
+        self.assertEqual((self.golfer_count(list_url), self.golfer_count(detail_url)), (1, 1))
+        # Served from the cache until something changes
+        self.assertEqual(self.golfer_count(list_url), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/groups/{self.group.id}/assign_golfers/', {
+                'golfer_ids': [self.newcomer.id], 'group_id': self.group.id
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((self.golfer_count(list_url), self.golfer_count(detail_url)), (2, 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/golfers/bulk_delete/', {'ids': [self.newcomer.id]}, format='json')
+        self.assertEqual((self.golfer_count(list_url), self.golfer_count(detail_url)), (1, 1))
+
+    def test_stats_count_hits_misses_and_revalidations(self):
+        before = self.endpoint_counts('shot-statistics')
+        etag = self.client.get(self.statistics_url)['ETag']
+        self.client.get(self.statistics_url)
+        self.client.get(self.statistics_url, HTTP_IF_NONE_MATCH=etag)
+        # Different parameters are a separate entry
+        self.client.get(f'{self.statistics_url}&club_used=driver')
+        after = self.endpoint_counts('shot-statistics')
+        self.assertEqual(
+            {outcome: after[outcome] - before[outcome] for outcome in after},
+            {'hits': 1, 'misses': 2, 'not_modified': 1}
+        )
+        stats = self.client.get('/api/cache/stats/').data
+        self.assertEqual(stats['backend'], settings.CACHES[settings.GOLF_CACHE_ALIAS]['BACKEND'])
+        self.assertGreater(stats['endpoints']['shot-statistics']['hit_ratio'], 0)
+
+    @override_settings(GOLF_CACHE_ENABLED=False)
+    def test_disabled_cache_serves_every_request_live(self):
+        response = self.client.get(self.statistics_url)
+        self.assertNotIn('ETag', response)
+        Shot.objects.create(golfer=self.golfer, shot_number=2)
+        self.assertEqual(self.total_shots(), 2)
+
+
+class SparseFieldsetTests(APITestCase):
+    """?fields= and ?omit= trim both the response and the query"""
+
+    def setUp(self):
+        tournament = Tournament.objects.create(
+            name='Alpha', start_date=date(2025, 6, 1), end_date=date(2025, 6, 2)
+        )
+        golfer = Golfer.objects.create(
+            golfer_id='G1', first_name='Test', last_name='Golfer',
+            group=Group.objects.create(tournament=tournament)
+        )
+        for number in range(1, 4):
+            Shot.objects.create(golfer=golfer, shot_number=number, ball_speed=150, club_head_speed=100)
+
+    def test_fields_skip_unrequested_joins(self):
+        with self.assertNumQueries(2) as queries:
+            response = self.client.get('/api/shots/?fields=id,ball_speed,smash_factor')
+        self.assertNotIn('JOIN', queries.captured_queries[-1]['sql'])
+        self.assertEqual(response.data['results'][0], {'id': 3, 'ball_speed': '150.00', 'smash_factor': '1.50'})
+
+    def test_omit_and_columnar_layout(self):
+        response = self.client.get('/api/golfers/?omit=notes,email&layout=columns')
+        self.assertEqual(response.data['row_count'], 1)
+        self.assertNotIn('notes', response.data['results'])
+        self.assertEqual(response.data['results']['tournament_name'], ['Alpha'])
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/api/groups/?fields=id,bogus')
+        self.assertEqual(response.status_code, 400)
+
+
+class FastListTests(APITestCase):
+    """The values() list path renders the same bytes as the serializers"""
+
+    def test_shot_and_golfer_lists_match_serializer_output(self):
+        group = Group.objects.create(nickname='Early \u2028 starters')
+        golfer = Golfer.objects.create(
+            golfer_id='G1', first_name='Zo\u00eb', last_name='O"Neil', group=group, date_of_birth=date(1990, 5, 5)
+        )
+        Golfer.objects.create(golfer_id='G2', first_name='No', last_name='Group')
+        Shot.objects.create(golfer=golfer, shot_number=1, ball_speed='150.37', club_head_speed='99.9', notes='a\nb')
+        Shot.objects.create(shot_number=2)
+
+        for url in ['/api/shots/', '/api/shots/?fields=id,golfer_name,smash_factor', '/api/golfers/?cursor=',
+                    '/api/golfers/?layout=columns']:
+            fast = self.client.get(url)
+            with override_settings(GOLF_FAST_SERIALIZATION=False):
+                regular = self.client.get(url)
+            self.assertEqual(fast.content, regular.content, url)
+
+
+class FilterPathIndexTests(APITestCase):
+    """The viewset filter paths are served by the indexes of migration 0004"""
+
+    def setUp(self):
+        self.tournament = Tournament.objects.create(
+            name='Spring Open', start_date=date(2025, 6, 1), end_date=date(2025, 6, 2)
+        )
+        golfer = Golfer.objects.create(
+            golfer_id='G1', first_name='Anna', last_name='Nilsson',
+            group=Group.objects.create(tournament=self.tournament)
+        )
+        Shot.objects.create(golfer=golfer, shot_number=1, shot_type='approach', club_used='7iron', hole_number=7)
+        Shot.objects.create(golfer=golfer, shot_number=2, club_used='driver', hole_number=1)
+
+    def test_filters_use_their_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Plans are only checked on SQLite, where they do not depend on table statistics")
+        shots = Shot.objects.order_by('-timestamp', 'shot_number')
+        for queryset, index in [
+            (shots.filter(shot_type='approach'), 'shot_type_time_idx'),
+            (shots.filter(club_used='7iron'), 'shot_club_time_idx'),
+            (shots.filter(hole_number=7), 'shot_hole_time_idx'),
+        ]:
+            self.assertIn(index, queryset[:10].explain(), index)
+
+    def test_search_is_case_insensitive(self):
+        response = self.client.get('/api/golfers/?search=NILS')
+        self.assertEqual([golfer['golfer_id'] for golfer in response.data['results']], ['G1'])
+        response = self.client.get('/api/tournaments/?search=spring')
+        self.assertEqual([tournament['name'] for tournament in response.data['results']], ['Spring Open'])
+
+    def test_benchmark_restores_indexes_and_cleans_up(self):
+        out = io.StringIO()
+        call_command('benchmark_queries', '--seed-shots', '40', '--golfers', '8', '--runs', '1', '--cleanup',
+                     stdout=out)
+        self.assertIn('Summary (median ms)', out.getvalue())
+        self.assertFalse(Golfer.objects.filter(golfer_id__startswith='bench-').exists())
+        self.assertFalse(Tournament.objects.filter(name__startswith='bench-').exists())
+        # The indexes dropped for the comparison came back with the rollback
+        self.assertIn('shot_club_time_idx', Shot.objects.filter(club_used='7iron').explain())
+
+
+class KeysetPaginationTests(APITestCase):
+    """?cursor= seeks past the previous page; ?count=false skips the COUNT query"""
+
+    def setUp(self):
+        self.golfer = Golfer.objects.create(golfer_id='G1', first_name='Test', last_name='Golfer')
+        base = datetime(2025, 6, 1, 10, tzinfo=dt_timezone.utc)
+        # Batches share a timestamp, and one differs only in its microseconds
+        for index in range(23):
+            Shot.objects.create(golfer=self.golfer, timestamp=base + timedelta(minutes=index // 4))
+        Shot.objects.create(golfer=self.golfer, timestamp=base + timedelta(minutes=2, microseconds=1))
+
+    def walk(self, url):
+        """Follow next links from ``url``; returns the pages' IDs"""
+        pages = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get(url).data
+            self.assertIsNone(data['count'])
+            self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+            pages.append([row['id'] for row in data['results']])
+            url = data['next']
+        return pages
+
+    def test_cursor_pages_cover_every_shot_once_despite_timestamp_ties(self):
+        pages = self.walk('/api/shots/?cursor=&fields=id')
+        self.assertEqual([len(page) for page in pages], [10, 10, 4])
+        expected = list(Shot.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+        self.assertEqual([shot_id for page in pages for shot_id in page], expected)
+
+        # A shot written meanwhile ahead of the cursor does not shift the later pages
+        second_page = self.client.get('/api/shots/?cursor=&fields=id').data['next']
+        Shot.objects.create(golfer=self.golfer, timestamp='2025-06-01T11:00:00Z')
+        self.assertEqual([row['id'] for row in self.client.get(second_page).data['results']], pages[1])
+
+    def test_cursor_round_trip_keeps_microseconds(self):
+        paginator = KeysetPageNumberPagination()
+        moment = datetime(2025, 6, 1, 10, 2, 0, 1, tzinfo=dt_timezone.utc)
+        token = paginator.encode_cursor([moment, 42])
+        self.assertEqual(paginator.decode_cursor(token, Shot, ['timestamp', 'id']), [moment, 42])
+        for token in ('garbage', paginator.encode_cursor([moment])):
+            self.assertEqual(self.client.get(f'/api/shots/?cursor={token}').status_code, 404)
+
+    def test_golfer_cursor_breaks_name_ties_by_id(self):
+        for index in range(11):
+            Golfer.objects.create(golfer_id=f'T{index}', first_name='Same', last_name='Name')
+        pages = self.walk('/api/golfers/?cursor=')
+        expected = list(Golfer.objects.order_by('last_name', 'first_name', 'id').values_list('id', flat=True))
+        self.assertEqual([golfer_id for page in pages for golfer_id in page], expected)
+
+    def test_count_free_pages(self):
+        pages = self.walk('/api/shots/?count=false&fields=id')
+        expected = list(Shot.objects.order_by('-timestamp', 'id').values_list('id', flat=True))
+        self.assertEqual([shot_id for page in pages for shot_id in page], expected)
+        data = self.client.get('/api/shots/?count=false&page=3').data
+        self.assertEqual((data['next'], data['previous']), (None, 'http://testserver/api/shots/?count=false&page=2'))
+        self.assertEqual(self.client.get('/api/shots/?count=false&page=2').data['previous'],
+                         'http://testserver/api/shots/?count=false')
+        for page in ('4', '0', 'last'):
+            self.assertEqual(self.client.get(f'/api/shots/?count=false&page={page}').status_code, 404)
+
+
+class ShotAggregateTests(APITestCase):
+    """The incrementally maintained buckets always equal a rebuild from the Shot table"""
+
+    def setUp(self):
+        tournament = Tournament.objects.create(name='Alpha', start_date=date(2025, 6, 1), end_date=date(2025, 6, 2))
+        self.groups = [Group.objects.create(tournament=tournament) for _ in range(2)]
+        self.golfer = Golfer.objects.create(golfer_id='G1', first_name='Test', last_name='Golfer', group=self.groups[0])
+
+    def snapshot(self):
+        """Bucket keys with their counts and extremes (sums are compared by find_inconsistencies)"""
+        names = ['shot_count'] + [f'{metric}_{suffix}' for metric in aggregates.AGGREGATE_METRICS
+                                  for suffix in ('count', 'min', 'max')]
+        return sorted(ShotAggregate.objects.values_list(*aggregates.KEY_FIELDS, *names))
+
+    def assertMatchesRebuild(self):
+        self.assertEqual(aggregates.find_inconsistencies(), [])
+        stored = self.snapshot()
+        aggregates.rebuild_all()
+        self.assertEqual(self.snapshot(), stored)
+
+    def test_create_edit_and_delete_keep_the_buckets_exact(self):
+        for carry, club in ((250, 'driver'), (270, 'driver'), (150, '7iron'), (140, None)):
+            self.client.post('/api/shots/', {
+                'golfer': self.golfer.id, 'club_used': club, 'carry_distance': carry,
+                'ball_speed': 150, 'club_head_speed': 100,
+            }, format='json')
+        self.client.post('/api/shots/bulk_ingest/', [
+            {'golfer': self.golfer.id, 'club_used': '', 'carry_distance': 100},
+            {'club_used': 'driver', 'carry_distance': 230},
+        ], format='json')
+        self.assertMatchesRebuild()
+
+        # Editing away the bucket maximum has to read the new one back
+        longest = Shot.objects.get(carry_distance=270)
+        self.client.patch(f'/api/shots/{longest.id}/', {'carry_distance': 200, 'ball_speed': None}, format='json')
+        self.client.patch(f'/api/shots/{Shot.objects.get(carry_distance=150).id}/', {'club_used': 'driver'},
+                          format='json')
+        self.assertEqual(Shot.objects.filter(club_used='driver', carry_distance__lte=200).count(), 2)
+        self.assertMatchesRebuild()
+
+        self.golfer.group = self.groups[1]
+        self.golfer.save()
+        self.assertMatchesRebuild()
+
+        self.client.delete(f'/api/shots/{Shot.objects.get(carry_distance=250).id}/')
+        Shot.objects.filter(golfer__isnull=True).get().delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(sum(count for *_, count in ShotAggregate.objects.values_list('shot_count')), 4)
+
+    def test_apply_folds_entries_and_drops_emptied_buckets(self):
+        key = (self.golfer.id, self.groups[0].id, 0, 'driver', 'drive')
+        first = (key, {'carry_distance': Decimal('250'), 'ball_speed': None})
+        second = (key, {'carry_distance': Decimal('270'), 'ball_speed': Decimal('150')})
+        aggregates.apply(added=[first, second])
+        bucket = ShotAggregate.objects.get()
+        self.assertEqual((bucket.shot_count, bucket.carry_distance_count, bucket.ball_speed_count), (2, 2, 1))
+        self.assertEqual((bucket.carry_distance_sum, bucket.carry_distance_sum_sq), (520, 250 ** 2 + 270 ** 2))
+        self.assertEqual((bucket.carry_distance_min, bucket.carry_distance_max), (250, 270))
+
+        aggregates.apply(removed=[first])
+        bucket.refresh_from_db()
+        self.assertEqual((bucket.shot_count, bucket.carry_distance_sum), (1, 270))
+        aggregates.apply(removed=[second])
+        self.assertFalse(ShotAggregate.objects.exists())
+
+    def test_check_command_reports_and_fixes_drift(self):
+        for club in ('driver', 'driver', '7iron'):
+            Shot.objects.create(golfer=self.golfer, club_used=club, carry_distance=200)
+        ShotAggregate.objects.filter(club_used='driver').update(shot_count=5, carry_distance_sum=1)
+        ShotAggregate.objects.filter(club_used='7iron').delete()
+        ShotAggregate.objects.create(shot_type='putt', shot_count=1)
+
+        problems = {problem['bucket'][3:]: problem for problem in aggregates.find_inconsistencies()}
+        self.assertEqual(problems[('driver', 'drive')]['fields'], ['shot_count', 'carry_distance_sum'])
+        self.assertEqual(problems[('7iron', 'drive')]['problem'], 'missing')
+        self.assertEqual(problems[('', 'putt')]['problem'], 'unexpected')
+
+        with self.assertRaises(CommandError):
+            call_command('check_shot_aggregates', stdout=io.StringIO())
+        call_command('check_shot_aggregates', '--fix', stdout=io.StringIO())
+        call_command('check_shot_aggregates', stdout=io.StringIO())
+        self.assertMatchesRebuild()
+
+
+class ShotPlacementSnapshotTests(APITestCase):
+    """Shots keep the group and tournament their golfer was placed in when they were recorded"""
+
+    def setUp(self):
+        self.spring = Tournament.objects.create(name='Spring', start_date=date(2025, 6, 1), end_date=date(2025, 6, 2))
+        self.autumn = Tournament.objects.create(name='Autumn', start_date=date(2025, 9, 1), end_date=date(2025, 9, 2))
+        self.spring_group = Group.objects.create(tournament=self.spring)
+        self.autumn_group = Group.objects.create(tournament=self.autumn)
+        self.golfer = Golfer.objects.create(
+            golfer_id='G1', first_name='Test', last_name='Golfer', group=self.spring_group
+        )
+
+    def placement(self, shot):
+        shot.refresh_from_db()
+        return shot.group_id, shot.tournament_id
+
+    def listed(self, **params):
+        response = self.client.get('/api/shots/', params)
+        return sorted(shot['id'] for shot in response.data['results'])
+
+    def test_shot_copies_the_golfer_placement(self):
+        shot = Shot.objects.create(golfer=self.golfer, shot_number=1)
+        self.assertEqual(self.placement(shot), (self.spring_group.id, self.spring.id))
+        self.assertEqual(self.listed(tournament=self.spring.id), [shot.id])
+        self.assertEqual(self.listed(group=self.spring_group.id), [shot.id])
+
+    def test_golfer_move_keeps_recorded_shots_in_their_group(self):
+        earlier = Shot.objects.create(golfer=self.golfer, shot_number=1)
+        self.golfer.group = self.autumn_group
+        self.golfer.save()
+        later = Shot.objects.create(golfer=self.golfer, shot_number=2)
+
+        self.assertEqual(self.placement(earlier), (self.spring_group.id, self.spring.id))
+        self.assertEqual(self.placement(later), (self.autumn_group.id, self.autumn.id))
+        self.assertEqual(self.listed(tournament=self.spring.id), [earlier.id])
+        self.assertEqual(self.listed(tournament=self.autumn.id), [later.id])
+
+    def test_reattributed_assignment_moves_earlier_shots(self):
+        shot = Shot.objects.create(golfer=self.golfer, shot_number=1)
+        assignments.assign_golfers({self.autumn_group.id: [self.golfer.id]})
+        self.assertEqual(self.placement(shot), (self.spring_group.id, self.spring.id))
+
+        self.golfer.group = self.spring_group
+        self.golfer.save()
+        assignments.assign_golfers({self.autumn_group.id: [self.golfer.id]}, reattribute_shots=True)
+        self.assertEqual(self.placement(shot), (self.autumn_group.id, self.autumn.id))
+
+    def test_removed_golfer_shots_stay_unless_reattributed(self):
+        shot = Shot.objects.create(golfer=self.golfer, shot_number=1)
+        url = f'/api/groups/{self.spring_group.id}/remove_golfers/'
+        self.client.post(url, {'golfer_ids': [self.golfer.id]}, format='json')
+        self.assertEqual(self.placement(shot), (self.spring_group.id, self.spring.id))
+
+        self.golfer.group = self.spring_group
+        self.golfer.save()
+        self.client.post(url, {'golfer_ids': [self.golfer.id], 'reattribute_shots': True}, format='json')
+        self.assertEqual(self.placement(shot), (None, None))
+
+    def test_shots_recorded_without_a_group_join_the_golfer_group(self):
+        self.golfer.group = None
+        self.golfer.save()
+        shot = Shot.objects.create(golfer=self.golfer, shot_number=1)
+        self.assertEqual(self.placement(shot), (None, None))
+
+        self.golfer.group = self.autumn_group
+        self.golfer.save()
+        self.assertEqual(self.placement(shot), (self.autumn_group.id, self.autumn.id))
+
+    def test_shots_without_a_golfer_are_unassigned(self):
+        loose = Shot.objects.create(shot_number=1)
+        Shot.objects.create(golfer=self.golfer, shot_number=1)
+        self.assertEqual(self.placement(loose), (None, None))
+        self.assertEqual(self.listed(unassigned='true'), [loose.id])
+
+        loose.golfer = self.golfer
+        loose.save()
+        self.assertEqual(self.placement(loose), (self.spring_group.id, self.spring.id))
+
+    def test_group_move_only_claims_shots_without_a_tournament(self):
+        loose_group = Group.objects.create()
+        self.golfer.group = loose_group
+        self.golfer.save()
+        shot = Shot.objects.create(golfer=self.golfer, shot_number=1)
+        self.assertEqual(self.placement(shot), (loose_group.id, None))
+
+        loose_group.tournament = self.spring
+        loose_group.save()
+        self.assertEqual(self.placement(shot), (loose_group.id, self.spring.id))
+
+        # Once in a tournament, the shots stay there when the group moves on
+        loose_group.tournament = self.autumn
+        loose_group.save()
+        self.assertEqual(self.placement(shot), (loose_group.id, self.spring.id))
+
+
+class GolferAssignmentTests(APITestCase):
+    """Assignments move golfers all or nothing and respect every group's capacity"""
+
+    def setUp(self):
+        self.tournament = Tournament.objects.create(
+            name='Alpha', start_date=date(2025, 6, 1), end_date=date(2025, 6, 2)
+        )
+        self.first = Group.objects.create(tournament=self.tournament, max_golfers=2)
+        self.second = Group.objects.create(tournament=self.tournament, max_golfers=2)
+
+    def golfer(self, last_name, group=None, is_active=True):
+        return Golfer.objects.create(
+            golfer_id=f'G-{last_name}', first_name='Test', last_name=last_name, group=group, is_active=is_active
+        )
+
+    def placements(self):
+        return dict(Golfer.objects.values_list('last_name', 'group_id'))
+
+    def test_overflow_is_rejected_without_writing(self):
+        self.golfer('Seated', self.first)
+        golfers = [self.golfer('Kim'), self.golfer('Lee')]
+        park = self.golfer('Park')
+        before = self.placements()
+
+        with self.assertRaisesMessage(
+            assignments.AssignmentError,
+            f"{self.first.display_name} only has 1 available spots, but you're trying to assign 2 golfers."
+        ):
+            assignments.assign_golfers({
+                self.second.id: [park.id], self.first.id: [golfer.id for golfer in golfers]
+            })
+        self.assertEqual(self.placements(), before)
+
+    def test_golfer_in_two_groups_is_rejected(self):
+        golfer = self.golfer('Kim')
+        with self.assertRaisesMessage(
+            assignments.AssignmentError, f"Golfer {golfer.id} is assigned to more than one group."
+        ):
+            assignments.assign_golfers({self.first.id: [golfer.id], self.second.id: [golfer.id]})
+        golfer.refresh_from_db()
+        self.assertIsNone(golfer.group_id)
+
+    def test_missing_golfers_and_groups_are_reported(self):
+        golfer = self.golfer('Kim')
+        with self.assertRaisesMessage(assignments.AssignmentError, "Golfers with IDs [998, 999] do not exist."):
+            assignments.assign_golfers({self.first.id: [999, golfer.id, 998]})
+        with self.assertRaisesMessage(assignments.AssignmentError, "Groups with IDs [999] do not exist."):
+            assignments.assign_golfers({999: [golfer.id], self.first.id: []})
+        golfer.refresh_from_db()
+        self.assertIsNone(golfer.group_id)
+
+    def test_golfers_can_swap_between_full_groups(self):
+        self.first.max_golfers = self.second.max_golfers = 1
+        self.first.save()
+        self.second.save()
+        kim, lee = self.golfer('Kim', self.first), self.golfer('Lee', self.second)
+
+        result = assignments.assign_golfers({self.first.id: [lee.id], self.second.id: [kim.id, kim.id]})
+        self.assertEqual(result['assigned_count'], 2)
+        self.assertEqual(result['moved_count'], 2)
+        self.assertEqual(self.placements(), {'Kim': self.second.id, 'Lee': self.first.id})
+        self.assertEqual([group['available_spots'] for group in result['groups']], [0, 0])
+
+    def test_auto_fill_places_golfers_in_group_order_and_reports_the_rest(self):
+        self.golfer('Seated', self.first)
+        for last_name in ['Evans', 'Brown', 'Adams', 'Davis', 'Clark']:
+            self.golfer(last_name)
+        self.golfer('Inactive', is_active=False)
+
+        result = assignments.auto_fill_tournament(self.tournament.id)
+        placements = self.placements()
+        self.assertEqual(placements['Adams'], self.first.id)
+        self.assertEqual([placements[name] for name in ['Brown', 'Clark']], [self.second.id] * 2)
+        unplaced = Golfer.objects.filter(last_name__in=['Davis', 'Evans']).order_by('last_name')
+        self.assertEqual(result['unplaced_golfer_ids'], list(unplaced.values_list('id', flat=True)))
+        self.assertIsNone(placements['Inactive'])
+        self.assertEqual(result['assigned_count'], 3)
+
+    def test_auto_fill_with_chosen_golfers_skips_those_already_seated(self):
+        seated = self.golfer('Seated', self.first)
+        kim, lee, park = self.golfer('Kim'), self.golfer('Lee'), self.golfer('Park')
+
+        result = assignments.auto_fill_tournament(self.tournament.id, [lee.id, seated.id, kim.id, park.id, lee.id])
+        self.assertEqual(result['moved_count'], 3)
+        self.assertEqual(result['unplaced_golfer_ids'], [])
+        self.assertEqual(
+            self.placements(),
+            {'Seated': self.first.id, 'Lee': self.first.id, 'Kim': self.second.id, 'Park': self.second.id}
+        )
+
+    def test_assign_endpoint_rejects_a_body_naming_another_group(self):
+        golfer = self.golfer('Kim')
+        url = f'/api/groups/{self.first.id}/assign_golfers/'
+        response = self.client.post(url, {'golfer_ids': [golfer.id], 'group_id': self.second.id}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'group_id': [f'Does not match the group in the URL ({self.first.id}).']})
+        golfer.refresh_from_db()
+        self.assertIsNone(golfer.group_id)
+
+        # group_id may be left out, or repeat the URL's group
+        response = self.client.post(url, {'golfer_ids': [golfer.id]}, format='json')
+        self.assertEqual(response.data['assigned_count'], 1)
+        response = self.client.post(url, {'golfer_ids': [golfer.id], 'group_id': self.first.id}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_bulk_assign_endpoint_reports_errors(self):
+        golfers = [self.golfer(name).id for name in ['Kim', 'Lee', 'Park']]
+        response = self.client.post('/api/groups/bulk_assign/', {
+            'assignments': [{'group_id': self.first.id, 'golfer_ids': golfers}]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('only has 2 available spots', response.data['error'])
+
+        response = self.client.post('/api/groups/bulk_assign/', {
+            'tournament_id': self.tournament.id, 'assignments': []
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/groups/bulk_assign/', {
+            'tournament_id': self.tournament.id, 'golfer_ids': golfers
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['assigned_count'], 3)
+        self.assertEqual(response.data['unplaced_golfer_ids'], [])
+
+
+class RosterImportTests(APITestCase):
+    """Roster imports upsert on golfer_id and report a row-level diff"""
+
+    def setUp(self):
+        self.tournament = Tournament.objects.create(
+            name='Alpha', start_date=date(2025, 6, 1), end_date=date(2025, 6, 2)
+        )
+        self.group = Group.objects.create(tournament=self.tournament, max_golfers=2)
+        Golfer.objects.create(golfer_id='G1', first_name='Ann', last_name='Lee', handicap=Decimal('10.0'))
+        Golfer.objects.create(golfer_id='G2', first_name='Bo', last_name='Kim', group=self.group)
+
+    def golfers(self):
+        return {
+            golfer['golfer_id']: golfer
+            for golfer in Golfer.objects.values('golfer_id', 'first_name', 'handicap', 'group_id')
+        }
+
+    def test_diff_separates_created_updated_and_unchanged(self):
+        result = roster.import_roster([
+            {'golfer_id': 'G1', 'handicap': '12.5'},
+            {'golfer_id': 'G2', 'first_name': 'Bo', 'last_name': 'Kim'},
+            {'golfer_id': 'G3', 'first_name': 'Cy', 'last_name': 'Park', 'group': self.group.id},
+        ])
+        self.assertEqual(
+            (result['created_count'], result['updated_count'], result['unchanged_count'], result['error_count']),
+            (1, 1, 1, 0)
+        )
+        self.assertEqual(result['diff'], {
+            'created': ['G3'],
+            'updated': [{'golfer_id': 'G1', 'changes': {'handicap': {'old': Decimal('10.0'), 'new': Decimal('12.5')}}}],
+        })
+        golfers = self.golfers()
+        # Columns left out of an update keep their values
+        self.assertEqual((golfers['G1']['first_name'], golfers['G1']['handicap']), ('Ann', Decimal('12.5')))
+        self.assertEqual(golfers['G3']['group_id'], self.group.id)
+
+    def test_invalid_and_duplicate_rows_are_reported_and_skipped(self):
+        result = roster.import_roster([
+            {'golfer_id': 'G4', 'first_name': 'Di', 'last_name': 'Ng'},
+            {'golfer_id': 'G4', 'first_name': 'Dee', 'last_name': 'Ng'},
+            {'golfer_id': 'G5', 'first_name': 'Ed'},
+            {'golfer_id': 'G1', 'handicap': '99'},
+            {'first_name': 'No', 'last_name': 'Id'},
+        ])
+        self.assertEqual(result['created_count'], 1)
+        errors = {error['index']: error['errors'] for error in result['errors']}
+        self.assertEqual(sorted(errors), [1, 2, 3, 4])
+        self.assertEqual(errors[1], {'golfer_id': ['Duplicate of row 0 in this import.']})
+        self.assertEqual(errors[2], {'last_name': ['This field is required.']})
+        self.assertIn('handicap', errors[3])
+        self.assertEqual(errors[4], {'golfer_id': ['This field is required.']})
+        golfers = self.golfers()
+        self.assertEqual(golfers['G4']['first_name'], 'Di')
+        self.assertNotIn('G5', golfers)
+        self.assertEqual(golfers['G1']['handicap'], Decimal('10.0'))
+
+    def test_full_group_rejects_rows_beyond_its_spots(self):
+        result = roster.import_roster([
+            {'golfer_id': 'G3', 'first_name': 'Cy', 'last_name': 'Park', 'group_number': self.group.group_number},
+            {'golfer_id': 'G4', 'first_name': 'Di', 'last_name': 'Ng', 'group_number': self.group.group_number},
+            {'golfer_id': 'G5', 'first_name': 'Ed', 'last_name': 'Oh', 'group_number': 99},
+        ], tournament_id=self.tournament.id)
+        self.assertEqual(result['created_count'], 1)
+        errors = {error['golfer_id']: error['errors'] for error in result['errors']}
+        self.assertEqual(errors['G4'], {'group': [f'{self.group.display_name} is full.']})
+        self.assertEqual(errors['G5'], {'group_number': ['Group 99 does not exist in this tournament.']})
+        self.assertEqual(Golfer.objects.filter(group=self.group).count(), 2)
+
+    def test_golfer_leaving_a_full_group_frees_a_spot_in_the_same_import(self):
+        Golfer.objects.create(golfer_id='G3', first_name='Cy', last_name='Park', group=self.group)
+        result = roster.import_roster([
+            {'golfer_id': 'G2', 'group': None},
+            {'golfer_id': 'G1', 'group': self.group.id},
+        ])
+        self.assertEqual((result['updated_count'], result['error_count']), (2, 0))
+        golfers = self.golfers()
+        self.assertEqual((golfers['G1']['group_id'], golfers['G2']['group_id']), (self.group.id, None))
+
+    def test_dry_run_reports_without_writing(self):
+        before = self.golfers()
+        result = roster.import_roster([
+            {'golfer_id': 'G1', 'handicap': '12.5'},
+            {'golfer_id': 'G3', 'first_name': 'Cy', 'last_name': 'Park'},
+        ], dry_run=True)
+        self.assertTrue(result['dry_run'])
+        self.assertEqual((result['created_count'], result['updated_count']), (1, 1))
+        self.assertEqual(self.golfers(), before)
+
+    def test_csv_upload_through_the_endpoint(self):
+        body = 'golfer_id,first_name,last_name,group_number\nG3,Cy,Park,1\nG1,Ann,Lee,\n'
+        response = self.client.post(
+            f'/api/golfers/import_roster/?tournament_id={self.tournament.id}&dry_run=true',
+            body, content_type='text/csv'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['message'], 'Would import 1 of 2 golfers (1 created, 0 updated)')
+        self.assertFalse(Golfer.objects.filter(golfer_id='G3').exists())
+
+
+class ShotAnalyticsTests(APITestCase):
+    """/api/shots/analytics/ summaries and array invalidation"""
+
+    def setUp(self):
+        # Version counters only move on commit, which TestCase never does
+        caching.get_cache().clear()
+        self.tournament = Tournament.objects.create(
+            name='Alpha', start_date=date(2025, 6, 1), end_date=date(2025, 6, 2)
+        )
+        self.golfer = Golfer.objects.create(
+            golfer_id='G1', first_name='Test', last_name='Golfer',
+            group=Group.objects.create(tournament=self.tournament)
+        )
+        for number, (club, carry) in enumerate([('driver', 240), ('driver', 260), ('7iron', 150), ('7iron', 160)]):
+            Shot.objects.create(golfer=self.golfer, shot_number=number + 1, club_used=club, carry_distance=carry,
+                                side_angle=2, ball_speed=150, club_head_speed=100)
+
+    def test_percentiles_and_gapping(self):
+        response = self.client.get(f'/api/shots/analytics/?tournament_id={self.tournament.id}&percentiles=50')
+        self.assertEqual(response.data['shot_count'], 4)
+        self.assertEqual(response.data['metrics']['carry_distance']['percentiles'], {'p50': 200.0})
+        self.assertEqual(response.data['smash_factor']['mean'], 1.5)
+        gapping = [(row['club_used'], row['median_carry'], row['gap_to_next']) for row in response.data['club_gapping']]
+        self.assertEqual(gapping, [('driver', 250.0, 95.0), ('7iron', 155.0, None)])
+
+    def test_shot_writes_refresh_the_arrays(self):
+        url = f'/api/shots/analytics/?tournament_id={self.tournament.id}&club_used=driver'
+        self.assertEqual(self.client.get(url).data['shot_count'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Shot.objects.create(golfer=self.golfer, shot_number=5, club_used='driver', carry_distance=250)
+        self.assertEqual(self.client.get(url).data['shot_count'], 3)
+
+    def test_writes_from_other_processes_refresh_the_arrays(self):
+        url = f'/api/shots/analytics/?tournament_id={self.tournament.id}&club_used=driver'
+        self.assertEqual(self.client.get(url).data['shot_count'], 2)
+        # A job worker or management command: its own response cache, the same database
+        other_process = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'other-process'}
+        with override_settings(CACHES={**settings.CACHES, settings.GOLF_CACHE_ALIAS: other_process}):
+            with self.captureOnCommitCallbacks(execute=True):
+                Shot.objects.create(golfer=self.golfer, shot_number=5, club_used='driver', carry_distance=250)
+        self.assertEqual(self.client.get(url).data['shot_count'], 3)
+
+
+class StoredSmashFactorTests(APITestCase):
+    """The stored smash factor follows speed writes and backs filtering and ordering"""
+
+    def setUp(self):
+        caching.get_cache().clear()
+        for number, (ball, club) in enumerate([(150, 100), (140, 100), (None, 100)]):
+            Shot.objects.create(shot_number=number + 1, ball_speed=ball, club_head_speed=club)
+
+    def smash_factors(self):
+        return list(Shot.objects.order_by('shot_number').values_list('smash_factor', flat=True))
+
+    def test_saves_and_bulk_updates_recompute_it(self):
+        self.assertEqual(self.smash_factors(), [Decimal('1.50'), Decimal('1.40'), None])
+        Shot.objects.filter(shot_number=2).update(club_head_speed=70)
+        shot = Shot.objects.get(shot_number=1)
+        shot.ball_speed = 120
+        shot.save(update_fields=['ball_speed'])
+        self.assertEqual(self.smash_factors(), [Decimal('1.20'), Decimal('2.00'), None])
+
+    def test_filter_and_order_by_smash_factor(self):
+        response = self.client.get('/api/shots/?ordering=-smash_factor&fields=shot_number')
+        self.assertEqual([row['shot_number'] for row in response.data['results']], [1, 2, 3])
+        response = self.client.get('/api/shots/?min_smash_factor=1.45&fields=shot_number')
+        self.assertEqual([row['shot_number'] for row in response.data['results']], [1])
+        self.assertEqual(self.client.get('/api/shots/?ordering=notes').status_code, 400)
+
+    def test_statistics_match_the_filtered_list(self):
+        for query in ('min_smash_factor=1.45', 'max_smash_factor=1.45', 'min_smash_factor=1.3&max_smash_factor=1.6'):
+            listed = self.client.get(f'/api/shots/?{query}').data['count']
+            statistics = self.client.get(f'/api/shots/statistics/?{query}').data['statistics']
+            self.assertEqual(statistics['total_shots'], listed, query)
+
+    def test_malformed_smash_factor_bounds_are_rejected(self):
+        for url in ['/api/shots/', '/api/shots/statistics/', '/api/shots/export/']:
+            for query, field in [('min_smash_factor=abc', 'min_smash_factor'),
+                                 ('max_smash_factor=NaN', 'max_smash_factor')]:
+                response = self.client.get(f'{url}?{query}')
+                self.assertEqual(response.status_code, 400, url)
+                self.assertEqual(response.data, {field: ['A valid number is required.']}, url)
+
+
+@override_settings(GOLF_LEADERBOARD_SIZE=2)
+class LeaderboardTests(APITestCase):
+    """Leaderboard snapshots follow shot inserts, edits and deletes"""
+
+    def setUp(self):
+        self.tournament = Tournament.objects.create(
+            name='Alpha', start_date=date(2025, 6, 1), end_date=date(2025, 6, 2)
+        )
+        self.golfer = Golfer.objects.create(
+            golfer_id='G1', first_name='Test', last_name='Golfer',
+            group=Group.objects.create(tournament=self.tournament)
+        )
+        self.shots = [
+            Shot.objects.create(golfer=self.golfer, shot_number=number + 1, club_used='driver', carry_distance=carry)
+            for number, carry in enumerate([250, 270, 260])
+        ]
+        self.url = f'/api/tournaments/{self.tournament.id}/leaderboard/?metric=carry_distance'
+
+    def board(self):
+        response = self.client.get(self.url)
+        return [(row['rank'], row['value']) for row in response.data['leaderboards']['carry_distance']]
+
+    def test_inserts_update_the_persisted_snapshot(self):
+        self.assertEqual(self.board(), [(1, '270.00'), (2, '260.00')])
+        Shot.objects.create(golfer=self.golfer, shot_number=4, club_used='7iron', carry_distance=270)
+        self.assertEqual(self.board(), [(1, '270.00'), (1, '270.00')])
+        # Tournament, snapshot row and golfer names, however many shots there are
+        with self.assertNumQueries(3):
+            self.client.get(f'/api/tournaments/{self.tournament.id}/leaderboard/?club_used=7iron')
+
+    def test_edits_and_deletes_refill_from_the_shot_table(self):
+        self.assertEqual(self.board(), [(1, '270.00'), (2, '260.00')])
+        self.shots[1].carry_distance = 200
+        self.shots[1].save()
+        self.assertEqual(self.board(), [(1, '260.00'), (2, '250.00')])
+        self.shots[2].delete()
+        self.assertEqual(self.board(), [(1, '250.00'), (2, '200.00')])
+
+
+@override_settings(GOLF_DELETE_BATCH_SIZE=2, GOLF_JOB_RUNNER='inline')
+class ChunkedBulkDeleteTests(APITestCase):
+    """bulk_delete removes rows in raw chunks, optionally as a background job"""
+
+    def setUp(self):
+        self.tournament = Tournament.objects.create(
+            name='Alpha', start_date=date(2025, 6, 1), end_date=date(2025, 6, 2)
+        )
+        self.group = Group.objects.create(tournament=self.tournament)
+        self.golfer = Golfer.objects.create(golfer_id='G1', first_name='Test', last_name='Golfer', group=self.group)
+        for number in range(5):
+            Shot.objects.create(golfer=self.golfer, shot_number=number + 1, carry_distance=200)
+
+    def test_children_are_deleted_in_chunks(self):
+        response = self.client.post('/api/tournaments/bulk_delete/', {
+            'ids': [self.tournament.id], 'delete_children': True
+        }, format='json')
+        self.assertEqual(response.data['deleted_count'], 1)
+        self.assertFalse(Shot.objects.exists() or Golfer.objects.exists() or Group.objects.exists())
+
+    def test_without_children_references_are_detached(self):
+        self.client.post('/api/tournaments/bulk_delete/', {'ids': [self.tournament.id]}, format='json')
+        self.assertEqual(Shot.objects.filter(tournament__isnull=True, group=self.group).count(), 5)
+        self.assertIsNone(Group.objects.get(pk=self.group.pk).tournament_id)
+
+    def test_background_delete_returns_a_job(self):
+        response = self.client.post('/api/golfers/bulk_delete/', {
+            'ids': [self.golfer.id], 'delete_children': True, 'background': True
+        }, format='json')
+        self.assertEqual(response.status_code, 202)
+        job = self.client.get(f"/api/jobs/{response.data['job_id']}/").data
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['progress']['deleted'], {'shot': 5, 'golfer': 1})
+
+
+@override_settings(GOLF_JOB_RUNNER='worker', GOLF_JOB_RETRY_DELAY=10)
+class ShotExportTests(APITestCase):
+    """Exports stream every filtered shot in the requested format, chunk by chunk"""
+
+    def setUp(self):
+        self.golfer = Golfer.objects.create(golfer_id='G1', first_name='Test', last_name='Golfer')
+        for minute, carry in enumerate((200, None, 215)):
+            Shot.objects.create(golfer=self.golfer, club_used='driver', carry_distance=carry,
+                                ball_speed=150, club_head_speed=100, timestamp=f'2025-06-01T10:0{minute}:00Z')
+        Shot.objects.create(notes='Range, "warm-up"', timestamp='2025-06-01T09:00:00Z')
+
+    def export(self, query):
+        response = self.client.get(f'/api/shots/export/?{query}')
+        return response, b''.join(response.streaming_content).decode()
+
+    @override_settings(GOLF_EXPORT_CHUNK_SIZE=2)
+    def test_csv_export(self):
+        response, content = self.export('export_format=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="shots.csv"')
+        header, *rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(header, [name for name, _ in exports.SHOT_EXPORT_COLUMNS])
+        rows = [dict(zip(header, row)) for row in rows]
+        # Newest first, across chunk boundaries; NULLs are empty cells and text is quoted as needed
+        self.assertEqual([row['carry_distance'] for row in rows], ['215.00', '', '200.00', ''])
+        self.assertEqual((rows[0]['smash_factor'], rows[0]['timestamp']), ('1.50', '2025-06-01T10:02:00+00:00'))
+        self.assertEqual((rows[3]['golfer'], rows[3]['notes']), ('', 'Range, "warm-up"'))
+
+    def test_ndjson_export_follows_the_list_filters(self):
+        response, content = self.export(f'export_format=ndjson&golfer_id={self.golfer.id}&since=2025-06-01T10:02:00Z')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="shots.ndjson"')
+        [row] = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(list(row), [name for name, _ in exports.SHOT_EXPORT_COLUMNS])
+        self.assertEqual((row['golfer'], row['carry_distance'], row['is_simulated']), (self.golfer.id, '215.00', False))
+
+    def test_format_negotiation(self):
+        # Defaults to CSV; ?format= stays with DRF's renderer selection
+        response, content = self.export('')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        response = self.client.get('/api/shots/export/?export_format=xlsx')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('csv, ndjson, parquet, arrow', response.data['error'])
+        with mock.patch.object(views, 'arrow_available', return_value=False):
+            response = self.client.get('/api/shots/export/?export_format=PARQUET')
+        self.assertEqual(response.data['error'], 'The parquet export format requires pyarrow to be installed.')
+        self.assertEqual([exports.export_extension(name) for name in exports.EXPORT_CONTENT_TYPES],
+                         ['csv', 'ndjson', 'parquet', 'arrows'])
+
+    @skipUnless(exports.arrow_available(), 'pyarrow is not installed')
+    def test_arrow_stream_export(self):
+        import pyarrow as pa
+
+        response = self.client.get('/api/shots/export/?export_format=arrow')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="shots.arrows"')
+        table = pa.ipc.open_stream(b''.join(response.streaming_content)).read_all()
+        self.assertEqual(table.num_rows, 4)
+        self.assertEqual(table.schema.names, [name for name, _ in exports.SHOT_EXPORT_COLUMNS])
+
+
+class JobQueueTests(APITestCase):
+    """Queued jobs are claimed by workers, retried with back-off and can be cancelled"""
+
+    def test_failed_job_is_retried_with_backoff(self):
+        job = jobs.enqueue('bulk_delete', {'model': 'unknown', 'ids': [1]}, max_attempts=2)
+        job = jobs.execute(jobs.claim_next('worker-1'))
+        self.assertEqual((job.status, job.attempts), ('pending', 1))
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=5))
+        self.assertIsNone(jobs.claim_next('worker-1'))
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        job = jobs.execute(jobs.claim_next('worker-2'))
+        self.assertEqual((job.status, job.attempts, job.worker), ('failed', 2, 'worker-2'))
+
+        response = self.client.post(f'/api/jobs/{job.id}/retry/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(Job.objects.get(pk=job.pk).attempts, 0)
+
+    def test_cancel(self):
+        pending = jobs.enqueue('rebuild_aggregates')
+        response = self.client.post(f'/api/jobs/{pending.id}/cancel/')
+        self.assertEqual(response.data['job']['status'], 'cancelled')
+        self.assertIsNone(jobs.claim_next('worker-1'))
+        self.assertEqual(self.client.post(f'/api/jobs/{pending.id}/retry/').status_code, 202)
+
+        running = jobs.claim_next('worker-1')
+        self.client.post(f'/api/jobs/{running.id}/cancel/')
+        with self.assertRaises(JobCancelled):
+            running.report(step=1)
+
+    def test_background_export_can_be_downloaded(self):
+        Shot.objects.create(shot_number=1, carry_distance=200)
+        with tempfile.TemporaryDirectory() as output_dir, \
+                override_settings(GOLF_JOB_RUNNER='inline', GOLF_JOB_OUTPUT_DIR=output_dir):
+            response = self.client.get('/api/shots/export/?background=true&export_format=ndjson')
+            self.assertEqual(response.data['status'], 'succeeded')
+            download = self.client.get(f"/api/jobs/{response.data['job_id']}/download/")
+            expected = self.client.get('/api/shots/export/?export_format=ndjson')
+            self.assertEqual(b''.join(download.streaming_content), b''.join(expected.streaming_content))
+            download.close()
+
+
+class RequestMetricsTests(APITestCase):
+    """The metrics middleware records per-view timings and query counts for /api/_metrics"""
+
+    def setUp(self):
+        caching.get_cache().clear()
+        instrumentation.reset()
+        tournament = Tournament.objects.create(name='Alpha', start_date=date(2025, 6, 1), end_date=date(2025, 6, 2))
+        for number in range(3):
+            Group.objects.create(tournament=tournament, group_number=number + 1)
+
+    def test_prometheus_export(self):
+        self.client.get('/api/tournaments/')
+        self.client.get('/api/tournaments/')
+        text = self.client.get('/api/_metrics').content.decode()
+        self.assertIn('golf_http_requests_total{method="GET",view="tournament-list",status="200"} 2', text)
+        self.assertIn('golf_http_request_db_queries_count{method="GET",view="tournament-list"} 2', text)
+        self.assertIn('golf_http_response_size_bytes_bucket{method="GET",view="tournament-list",le="+Inf"} 2', text)
+        self.assertIn('# TYPE golf_http_request_serializer_duration_seconds histogram', text)
+
+    @override_settings(GOLF_SLOW_REQUEST_MS=0.001, GOLF_CACHE_ENABLED=False)
+    def test_slow_requests_are_logged_and_counted(self):
+        with self.assertLogs('golf_metrics_app.instrumentation', 'WARNING') as logs:
+            with override_settings(GOLF_FAST_SERIALIZATION=False):
+                self.client.get('/api/groups/')
+        self.assertIn('Slow request: GET /api/groups/ (group-list) -> 200', logs.output[0])
+        self.assertIn('golf_http_slow_requests_total{method="GET",view="group-list"} 1',
+                      self.client.get('/api/_metrics').content.decode())
+
+
+class NestedDetailTests(APITestCase):
+    """Detail actions embed a bounded shot window and an aggregate summary at a fixed query count"""
+
+    def setUp(self):
+        caching.get_cache().clear()
+        tournament = Tournament.objects.create(name='Alpha', start_date=date(2025, 6, 1), end_date=date(2025, 6, 2))
+        self.group = Group.objects.create(tournament=tournament)
+        self.golfer = Golfer.objects.create(golfer_id='G1', first_name='Test', last_name='Golfer', group=self.group)
+        for number in range(5):
+            Shot.objects.create(golfer=self.golfer, group=self.group, tournament=tournament,
+                                shot_number=number + 1, ball_speed=150, club_head_speed=100)
+
+    def test_golfer_shots_are_paged_with_a_cursor(self):
+        url = f'/api/golfers/{self.golfer.id}/retrieve_with_shots/?shot_limit=2'
+        seen = []
+        while url:
+            with self.assertNumQueries(3):
+                data = self.client.get(url).data
+            self.assertEqual(data['shots_count'], 5)
+            seen += [shot['id'] for shot in data['shots']]
+            url = data['shots_next']
+        self.assertEqual(seen, list(Shot.objects.order_by('-timestamp', '-id').values_list('id', flat=True)))
+        self.assertEqual(data['summary']['statistics']['avg_smash_factor'], Decimal('1.5'))
+
+    def test_group_detail_includes_summary(self):
+        with self.assertNumQueries(3):
+            data = self.client.get(f'/api/groups/{self.group.id}/retrieve_with_golfers/').data
+        self.assertEqual([golfer['id'] for golfer in data['golfers']], [self.golfer.id])
+        self.assertEqual(data['summary']['statistics']['total_shots'], 5)
+
+
+class ShotStreamTests(APITestCase):
+    """Shot events reach matching subscribers; reconnecting clients replay what they missed"""
+
+    def setUp(self):
+        self.golfer = Golfer.objects.create(golfer_id='S1', first_name='Sam', last_name='Stream')
+        self.other = Golfer.objects.create(golfer_id='S2', first_name='Ola', last_name='Other')
+
+    def test_broker_delivers_to_matching_subscribers_only(self):
+        async def scenario():
+            broker = realtime.InProcessBroker()
+            everyone = broker.subscribe({}, queue_size=10)
+            tournament = broker.subscribe({'tournament': 1}, queue_size=10)
+            group = broker.subscribe({'group': 2, 'tournament': 1}, queue_size=10)
+            golfer = broker.subscribe({'golfer': 5}, queue_size=10)
+            self.assertEqual(group.index_key, ('group', 2))
+
+            broker.publish({'golfer': 5, 'group': 2, 'tournament': 1}, b'first')
+            broker.publish({'golfer': 6, 'group': 3, 'tournament': 1}, b'second')
+            broker.publish({'golfer': 7, 'group': None, 'tournament': None}, b'third')
+            await asyncio.sleep(0)
+
+            def drain(subscription):
+                return [subscription.queue.get_nowait() for _ in range(subscription.queue.qsize())]
+            self.assertEqual(drain(everyone), [b'first', b'second', b'third'])
+            self.assertEqual(drain(tournament), [b'first', b'second'])
+            self.assertEqual(drain(group), [b'first'])
+            self.assertEqual(drain(golfer), [b'first'])
+
+            for subscription in (everyone, tournament, group, golfer):
+                broker.unsubscribe(subscription)
+            self.assertFalse(broker.has_subscribers())
+
+        async_to_sync(scenario)()
+
+    def test_overflowing_subscription_is_closed(self):
+        async def scenario():
+            subscription = realtime.Subscription({}, asyncio.get_running_loop(), queue_size=2)
+            for frame in (b'a', b'b', b'c', b'd'):
+                subscription.offer(frame)
+            self.assertTrue(subscription.overflowed)
+            # Only the end-of-stream marker is left, so the client reconnects and replays
+            self.assertEqual(subscription.queue.qsize(), 1)
+            self.assertIsNone(subscription.queue.get_nowait())
+
+        async_to_sync(scenario)()
+
+    def open_stream(self, query_string=b'', headers=()):
+        """Run one stream request that disconnects once it goes idle; returns (status, body)"""
+        messages = []
+
+        async def receive():
+            await asyncio.sleep(0.05)
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': '/api/shots/stream/',
+            'query_string': query_string, 'headers': list(headers),
+        }
+        app = realtime.ShotStreamApplication(None)
+        async_to_sync(app)(scope, receive, send)
+        return messages[0]['status'], b''.join(message.get('body', b'') for message in messages[1:])
+
+    def test_last_event_id_replays_missed_shots(self):
+        seen, *missed = [
+            Shot.objects.create(golfer=self.golfer, timestamp=f'2025-05-01T10:0{minute}:00Z')
+            for minute in range(3)
+        ]
+        Shot.objects.create(golfer=self.other, timestamp='2025-05-01T10:05:00Z')
+
+        status_code, body = self.open_stream(
+            f'golfer={self.golfer.id}'.encode(), [(b'last-event-id', str(seen.id).encode())]
+        )
+        self.assertEqual(status_code, 200)
+        self.assertTrue(body.startswith(b'retry: 2000\n\n'))
+        replayed = [line.split(b': ', 1)[1] for line in body.split(b'\n') if line.startswith(b'id: ')]
+        self.assertEqual(replayed, [str(shot.id).encode() for shot in missed])
+        event = json.loads(body.split(b'\n\n')[1].split(b'data: ', 1)[1])
+        self.assertEqual(event['id'], missed[0].id)
+
+        # Without Last-Event-ID a new client only gets events from now on
+        status_code, body = self.open_stream(f'golfer={self.golfer.id}'.encode())
+        self.assertEqual(body, b'retry: 2000\n\n')
+
+    def test_invalid_filters_are_rejected(self):
+        status_code, _ = self.open_stream(b'golfer=abc')
+        self.assertEqual(status_code, 400)
+        status_code, _ = self.open_stream(headers=[(b'last-event-id', b'latest')])
+        self.assertEqual(status_code, 400)
+
+    def test_wsgi_deployment_reports_the_stream_unavailable(self):
+        response = self.client.get('/api/shots/stream/')
+        self.assertEqual(response.status_code, 503)
+
+    def test_export_streams_asynchronously_under_asgi(self):
+        Shot.objects.create(golfer=self.golfer, timestamp='2025-05-01T10:00:00Z')
+
+        async def export():
+            response = await self.async_client.get('/api/shots/export/?export_format=ndjson')
+            return response, b''.join([part async for part in response.streaming_content])
+
+        response, content = async_to_sync(export)()
+        # A synchronous iterator would be read into memory whole before the first byte is sent
+        self.assertTrue(response.is_async)
+        self.assertEqual(json.loads(content)['golfer'], self.golfer.id)
+
+
+@override_settings(GOLF_SHOT_BUFFER_ENABLED=True, GOLF_SHOT_BUFFER_DURABILITY='memory',
+                   GOLF_SHOT_BUFFER_MAX_ROWS=100, GOLF_SHOT_BUFFER_MAX_DELAY_MS=60000)
+class ShotWriteBufferTests(APITestCase):
+    """Buffered single-shot POSTs are accepted with a provisional ID and written in batches"""
+
+    def tearDown(self):
+        buffering.shutdown()
+
+    def test_buffered_post_is_written_on_flush(self):
+        golfer = Golfer.objects.create(golfer_id='G1', first_name='Test', last_name='Golfer')
+        response = self.client.post('/api/shots/?buffered=true', {
+            'golfer': golfer.id, 'shot_number': 1, 'ball_speed': '150', 'club_head_speed': '100'
+        }, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(Shot.objects.exists())
+        self.assertEqual(self.client.get(response.data['status_url']).data['status'], 'pending')
+
+        self.assertEqual(buffering.get_buffer().flush(), 1)
+        status = self.client.get(response.data['status_url']).data
+        shot = Shot.objects.get()
+        self.assertEqual((status['status'], status['shot_id']), ('written', shot.id))
+        self.assertEqual(shot.smash_factor, Decimal('1.50'))
+
+    def test_invalid_shots_are_rejected_synchronously(self):
+        response = self.client.post('/api/shots/?buffered=true', {'shot_number': 1, 'ball_speed': 400}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ball_speed', response.data)
+        self.assertEqual(self.client.get('/api/shots/buffer/').data['rejected'], 1)
+
+    def test_spill_segments_of_dead_processes_are_recovered(self):
+        with tempfile.TemporaryDirectory() as spill_dir:
+            with open(f'{spill_dir}/deadbeef0000-000001.ndjson', 'w') as segment:
+                segment.write(json.dumps({'provisional_id': 'deadbeef0000-1', 'row': {'shot_number': 7}}) + '\n')
+                segment.write('{"provisional_id": "deadbeef0000-2", "ro')
+            buffer = buffering.ShotWriteBuffer(max_rows=100, max_delay=60, durability='fsync', spill_dir=spill_dir)
+            self.assertEqual(buffer.recover(older_than=0), 1)
+            self.assertEqual(buffer.flush(), 1)
+            self.assertEqual(buffer.resolve('deadbeef0000-1')['shot_id'], Shot.objects.get(shot_number=7).id)
+            self.assertEqual(list(buffer.spill_dir.iterdir()), [])
+
+    def test_failing_batches_are_retried_a_limited_number_of_times(self):
+        golfer = Golfer.objects.create(golfer_id='G1', first_name='Test', last_name='Golfer')
+        with tempfile.TemporaryDirectory() as dead_letter_dir:
+            buffer = buffering.ShotWriteBuffer(max_rows=100, max_delay=60, durability='memory', retry_delay=0,
+                                               max_attempts=2, dead_letter_dir=dead_letter_dir)
+            provisional_id, _ = buffer.submit({'golfer': golfer.id, 'shot_number': 1})
+            with mock.patch.object(buffering, 'insert_once', side_effect=OperationalError('database is locked')):
+                self.assertEqual(buffer.flush(), 0)
+                self.assertEqual(buffer.resolve(provisional_id)['status'], 'pending')
+                self.assertEqual(buffer.flush(), 1)
+            self.assertEqual(buffer.resolve(provisional_id)['status'], 'failed')
+            self.assertEqual(buffer.pending_count(), 0)
+            statistics = buffer.statistics()
+            self.assertEqual((statistics['failed_flushes'], statistics['dead_lettered']), (2, 1))
+            [record] = [json.loads(line) for path in Path(dead_letter_dir).iterdir() for line in path.open()]
+            self.assertEqual(record['error'], 'database is locked')
+
+
+class ShotWriteBufferDeadLetterTests(APITransactionTestCase):
+    """A shot the database refuses is set aside without holding back the rest of its batch"""
+
+    def test_refused_shots_are_written_to_the_dead_letter_file(self):
+        keeper = Golfer.objects.create(golfer_id='G1', first_name='Kept', last_name='Golfer')
+        leaver = Golfer.objects.create(golfer_id='G2', first_name='Gone', last_name='Golfer')
+        with tempfile.TemporaryDirectory() as dead_letter_dir:
+            buffer = buffering.ShotWriteBuffer(max_rows=100, max_delay=60, durability='memory',
+                                               dead_letter_dir=dead_letter_dir)
+            kept_id, _ = buffer.submit({'golfer': keeper.id, 'shot_number': 1})
+            refused_id, _ = buffer.submit({'golfer': leaver.id, 'shot_number': 1})
+            # Deleted after validation, so the batch now breaks the golfer foreign key
+            leaver_id = leaver.id
+            leaver.delete()
+
+            self.assertEqual(buffer.flush(), 2)
+            shot = Shot.objects.get()
+            self.assertEqual(buffer.resolve(kept_id), {'status': 'written', 'shot_id': shot.id})
+            self.assertEqual(buffer.resolve(refused_id), {'status': 'failed', 'shot_id': None})
+            self.assertEqual(buffer.statistics()['dead_lettered'], 1)
+            [record] = [json.loads(line) for path in Path(dead_letter_dir).iterdir() for line in path.open()]
+            self.assertEqual((record['provisional_id'], record['row']['golfer_id']), (refused_id, leaver_id))
+
+
+class IdempotentIngestTests(APITestCase):
+    """Retried launch monitor submissions return the original shot instead of a duplicate"""
+
+    payload = {'shot_number': 1, 'launch_monitor_id': 'bay-3', 'timestamp': '2025-06-01T10:00:00Z', 'ball_speed': '150'}
+
+    def setUp(self):
+        idempotency.reset()
+
+    def test_retry_is_replayed_with_one_query(self):
+        first = self.client.post('/api/shots/', self.payload, format='json')
+        self.assertEqual(first.status_code, 201)
+        with self.assertNumQueries(1):
+            retry = self.client.post('/api/shots/', self.payload, format='json')
+        self.assertEqual((retry.status_code, retry['Idempotent-Replayed']), (200, 'true'))
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(Shot.objects.count(), 1)
+
+    def test_constraint_catches_retries_this_process_has_not_seen(self):
+        self.client.post('/api/shots/', self.payload, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        idempotency.reset()
+        retry = self.client.post('/api/shots/', {**self.payload, 'timestamp': '2025-06-01T10:00:01Z'},
+                                 format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(Shot.objects.count(), 1)
+
+    def test_bulk_ingest_reports_duplicates(self):
+        existing = self.client.post('/api/shots/', self.payload, format='json').data['id']
+        idempotency.reset()
+        rows = [
+            self.payload,
+            {**self.payload, 'timestamp': '2025-06-01T10:05:00Z'},
+            {**self.payload, 'timestamp': '2025-06-01T10:05:00Z'},
+            {'shot_number': 4},
+        ]
+        response = self.client.post('/api/shots/bulk_ingest/', rows, format='json')
+        self.assertEqual((response.data['created_count'], response.data['duplicate_count']), (2, 2))
+        created = Shot.objects.get(timestamp='2025-06-01T10:05:00Z').id
+        self.assertEqual(response.data['duplicates'], [{'index': 0, 'id': existing}, {'index': 2, 'id': created}])
+
+        response = self.client.post('/api/shots/bulk_ingest/', rows[:3], format='json')
+        self.assertEqual((response.status_code, response.data['created_count']), (200, 0))
+        self.assertEqual(Shot.objects.count(), 3)
+
+
+class ShotNumberAllocationTests(APITestCase):
+    """The server numbers shots per golfer, and per hole within a tournament"""
+
+    def setUp(self):
+        tournament = Tournament.objects.create(name='Open', start_date=date(2025, 6, 1), end_date=date(2025, 6, 2))
+        group = Group.objects.create(tournament=tournament)
+        self.golfer = Golfer.objects.create(golfer_id='N1', first_name='Ann', last_name='Number', group=group)
+
+    def post_shot(self, **fields):
+        response = self.client.post('/api/shots/', {'golfer': self.golfer.id, **fields}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['shot_number']
+
+    def test_single_posts_are_numbered_per_golfer_and_hole(self):
+        Shot.objects.create(golfer=self.golfer, shot_number=3)
+        self.assertEqual([self.post_shot(), self.post_shot()], [4, 5])
+        self.assertEqual([self.post_shot(hole_number=7), self.post_shot(hole_number=7)], [1, 2])
+        # A number chosen by hand moves the counter past it
+        self.assertEqual(self.post_shot(shot_number=20), 20)
+        self.assertEqual(self.post_shot(), 21)
+
+    def test_bulk_ingest_allocates_one_block_per_scope(self):
+        rows = [
+            {'golfer': self.golfer.id, 'timestamp': f'2025-06-01T10:0{minute}:00Z'} for minute in (2, 0, 1)
+        ] + [{'golfer': self.golfer.id, 'hole_number': 1}, {'golfer': self.golfer.id, 'shot_number': 9}]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/shots/bulk_ingest/', rows, format='json')
+        self.assertEqual(response.data['created_count'], 5)
+        counter_updates = [query for query in queries if query['sql'].startswith('UPDATE') and 'sequencecounter' in query['sql']]
+        # Golfer scope: advance past 9, then one increment for all three; hole scope: a miss, then created
+        self.assertEqual(len(counter_updates), 3)
+        numbers = Shot.objects.filter(hole_number__isnull=True).order_by('timestamp').values_list('shot_number', flat=True)
+        self.assertEqual(sorted(numbers[:3]), [10, 11, 12])
+        self.assertEqual(list(Shot.objects.filter(shot_number__in=[10, 11, 12]).order_by('shot_number').values_list(
+            'timestamp__minute', flat=True)), [0, 1, 2])
+        self.assertEqual(Shot.objects.get(hole_number=1).shot_number, 1)
+
+    def test_reserved_numbers_are_skipped(self):
+        response = self.client.post('/api/shots/reserve_numbers/', {'golfer_id': self.golfer.id, 'count': 5},
+                                    format='json')
+        self.assertEqual((response.data['first_shot_number'], response.data['last_shot_number']), (1, 5))
+        self.assertEqual(self.post_shot(), 6)
+        response = self.client.post('/api/shots/reserve_numbers/', {'golfer_id': 0, 'count': 1}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+
+class ShotPartitionTests(APITestCase):
+    """Tournament shot windows bound tournament filters; whole finished tournaments are archived"""
+
+    def setUp(self):
+        self.tournament = Tournament.objects.create(
+            name='Spring', start_date=date(2025, 3, 1), end_date=date(2025, 3, 2), is_active=False
+        )
+        self.group = Group.objects.create(tournament=self.tournament)
+        self.golfer = Golfer.objects.create(golfer_id='P1', first_name='Pat', last_name='Part', group=self.group)
+
+    def window(self, tournament=None):
+        tournament = Tournament.objects.get(pk=(tournament or self.tournament).pk)
+        return tournament.shots_from.date().isoformat(), tournament.shots_until.date().isoformat()
+
+    def test_every_write_path_keeps_the_window_covering(self):
+        Shot.objects.create(golfer=self.golfer, shot_number=1, timestamp='2025-03-14T09:00:00Z')
+        self.assertEqual(self.window(), ('2025-03-01', '2025-04-01'))
+        self.client.post('/api/shots/bulk_ingest/', [
+            {'golfer': self.golfer.id, 'timestamp': '2025-01-31T23:00:00Z'},
+        ], format='json')
+        self.assertEqual(self.window(), ('2025-01-01', '2025-04-01'))
+        Shot.objects.filter(golfer=self.golfer).update(timestamp='2025-06-02T00:00:00Z')
+        self.assertEqual(self.window(), ('2025-01-01', '2025-07-01'))
+
+        # Shots recorded before the golfer joined a group follow them into the tournament
+        loner = Golfer.objects.create(golfer_id='P2', first_name='Lee', last_name='Late')
+        Shot.objects.create(golfer=loner, shot_number=1, timestamp='2024-12-24T10:00:00Z')
+        loner.group = self.group
+        loner.save()
+        self.assertEqual(self.window(), ('2024-12-01', '2025-07-01'))
+
+        response = self.client.get(f'/api/shots/?tournament_id={self.tournament.id}&fields=id')
+        self.assertEqual(response.data['count'], 3)
+        response = self.client.get(f'/api/shots/?tournament_id={self.tournament.id}'
+                                   '&since=2025-01-01T00:00:00Z&until=2025-07-01T00:00:00Z')
+        self.assertEqual(response.data['count'], 2)
+        response = self.client.get(f'/api/shots/statistics/?tournament_id={self.tournament.id}'
+                                   '&since=2025-01-01T00:00:00Z&until=2025-07-01T00:00:00Z')
+        self.assertEqual(response.data['statistics']['total_shots'], 2)
+
+    def test_malformed_time_range_is_rejected(self):
+        Shot.objects.create(golfer=self.golfer, shot_number=1, timestamp='2025-03-14T09:00:00Z')
+        for url in ['/api/shots/', '/api/shots/statistics/', '/api/shots/export/',
+                    '/api/shots/export/?background=true&']:
+            separator = '' if url.endswith('&') else '?'
+            response = self.client.get(f'{url}{separator}since=garbage&until=2025-02-30')
+            self.assertEqual(response.status_code, 400, url)
+            self.assertEqual(set(response.data), {'since'}, url)
+            response = self.client.get(f'{url}{separator}until=2025-02-30')
+            self.assertEqual(set(response.data), {'until'}, url)
+        self.assertFalse(Job.objects.exists())
+
+        # Dates stand for their midnight
+        response = self.client.get('/api/shots/statistics/?since=2025-03-14&until=2025-03-15')
+        self.assertEqual(response.data['statistics']['total_shots'], 1)
+
+    def test_archive_plan_keeps_running_tournaments_whole(self):
+        months = [datetime(2025, month, 1, tzinfo=dt_timezone.utc) for month in range(1, 8)]
+        attached = [partitions.Partition(f'p{index}', start, end)
+                    for index, (start, end) in enumerate(zip(months, months[1:]))]
+        Tournament.objects.filter(pk=self.tournament.pk).update(shots_from=months[0], shots_until=months[2])
+        spanning = Tournament.objects.create(name='Summer', start_date=date(2025, 2, 1), end_date=date(2025, 2, 2),
+                                             is_active=False, shots_from=months[1], shots_until=months[4])
+        cutoff = months[5]
+        self.assertEqual([p.name for p in partitions.plan_archive(attached, cutoff)], ['p0', 'p1', 'p2', 'p3', 'p4'])
+
+        # A tournament still running holds back every month it shares with the others
+        Tournament.objects.filter(pk=spanning.pk).update(is_active=True)
+        self.assertEqual(partitions.plan_archive(attached, cutoff), [])
+        Tournament.objects.filter(pk=spanning.pk).update(is_active=False, shots_from=months[2])
+        Tournament.objects.create(name='Late', start_date=date(2025, 5, 1), end_date=date(2025, 7, 1),
+                                  shots_from=months[3], shots_until=months[5])
+        self.assertEqual([p.name for p in partitions.plan_archive(attached, cutoff)], ['p0', 'p1'])
+
+    def test_command_degrades_to_a_single_table(self):
+        output = io.StringIO()
+        call_command('manage_shot_partitions', stdout=output)
+        self.assertIn('not partitioned', output.getvalue())
+
+
+# SQLite's shared in-memory test database cannot take concurrent writers
+@skipUnlessDBFeature('has_select_for_update')
+class GroupNumberConcurrencyTests(APITransactionTestCase):
+    """Groups created at the same time in one tournament draw distinct numbers from its counter"""
+
+    def setUp(self):
+        self.tournament = Tournament.objects.create(
+            name='Open', start_date=date(2025, 6, 1), end_date=date(2025, 6, 2)
+        )
+        Group.objects.create(tournament=self.tournament, group_number=4)
+
+    def run_concurrently(self, target, workers=4):
+        start = threading.Barrier(workers)
+        errors = []
+
+        def run():
+            try:
+                start.wait()
+                target()
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_creation_gets_distinct_numbers(self):
+        def create_groups():
+            for _ in range(5):
+                Group.objects.create(tournament=self.tournament)
+
+        self.run_concurrently(create_groups)
+        numbers = Group.objects.filter(tournament=self.tournament).values_list('group_number', flat=True)
+        self.assertEqual(sorted(numbers), list(range(4, 25)))
+
+    def test_concurrent_bulk_creation_gets_disjoint_blocks(self):
+        def bulk_create():
+            response = self.client_class().post('/api/groups/bulk_create_groups/', {
+                'tournament_id': self.tournament.id, 'count': 3, 'max_golfers': 4
+            }, format='json')
+            assert response.status_code == 201, response.data
+
+        self.run_concurrently(bulk_create)
+        numbers = Group.objects.filter(tournament=self.tournament).values_list('group_number', flat=True)
+        self.assertEqual(sorted(numbers), list(range(4, 17)))
+
+
+class GroupNumberCounterTests(APITestCase):
+    """Group numbers come from one counter row per tournament"""
+
+    def setUp(self):
+        self.tournament = Tournament.objects.create(
+            name='Open', start_date=date(2025, 6, 1), end_date=date(2025, 6, 2)
+        )
+
+    def test_counter_is_seeded_from_existing_numbers_and_kept_ahead(self):
+        Group.objects.bulk_create([Group(tournament=self.tournament, group_number=number) for number in (2, 6)])
+        self.assertEqual(Group.objects.create(tournament=self.tournament).group_number, 7)
+        Group.objects.create(tournament=self.tournament, group_number=12)
+        self.assertEqual(Group.objects.create(tournament=self.tournament).group_number, 13)
+        # Other tournaments count on their own
+        other = Tournament.objects.create(name='Other', start_date=date(2025, 7, 1), end_date=date(2025, 7, 2))
+        self.assertEqual(Group.objects.create(tournament=other).group_number, 1)
+
+    def test_losing_the_race_to_create_the_counter_uses_the_winners_row(self):
+        scope = Group.number_scope(self.tournament.id)
+        increment = SequenceCounterQuerySet._increment
+        calls = []
+
+        def racing_increment(queryset, *args):
+            calls.append(args)
+            if len(calls) == 1:
+                # Another creator inserts the counter right after this one found it missing
+                SequenceCounter.objects.create(scope=scope, last_value=3)
+                return None
+            return increment(queryset, *args)
+
+        with mock.patch.object(SequenceCounterQuerySet, '_increment', autospec=True, side_effect=racing_increment):
+            group = Group.objects.create(tournament=self.tournament)
+        self.assertEqual(group.group_number, 4)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(SequenceCounter.objects.get(scope=scope).last_value, 4)
@@ -1,6 +1,7 @@
-﻿from django.urls import path, include
+﻿from django.conf import settings
+from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import instrumentation, views
 
 # Create a router and register our viewsets with it
 router = DefaultRouter()
@@ -8,8 +9,13 @@ router.register(r'tournaments', views.TournamentViewSet, basename='tournament')
 router.register(r'groups', views.GroupViewSet, basename='group')
 router.register(r'golfers', views.GolferViewSet, basename='golfer')
 router.register(r'shots', views.ShotViewSet, basename='shot')
+router.register(r'jobs', views.JobViewSet, basename='job')
 
 # The API URLs are now determined automatically by the router
 urlpatterns = [
+    # Ahead of the router, which would take the stream path for a shot detail route
+    path(settings.GOLF_REALTIME_PATH.lstrip('/'), views.shot_stream_unavailable, name='shot-stream'),
     path('api/', include(router.urls)),
+    path('api/cache/stats/', views.cache_statistics, name='cache-statistics'),
+    path('api/_metrics', instrumentation.metrics_view, name='metrics'),
 ]
\ No newline at end of file
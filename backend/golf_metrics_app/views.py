@@ -1,18 +1,89 @@
 ﻿from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
-from django.db.models import Q, Count, Avg, Max, Min
-from django.db import transaction
-from .models import Tournament, Group, Golfer, Shot
+from rest_framework.reverse import reverse
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, StreamingHttpResponse
+from django.db.models import Q, F, Count, Avg, Max, Min, Prefetch
+from django.db import IntegrityError, transaction
+from .models import Tournament, Group, Golfer, Shot, Job
 from .serializers import (
     TournamentSerializer, TournamentWithGroupsSerializer,
     GroupSerializer, GroupWithGolfersSerializer,
     GolferSerializer, GolferWithShotsSerializer,
-    ShotSerializer, BulkDeleteSerializer, GroupAssignmentSerializer
+    ShotSerializer, BulkDeleteSerializer, GroupAssignmentSerializer,
+    BulkAssignmentSerializer, BulkGroupCreateSerializer, JobSerializer, ShotNumberReservationSerializer
 )
+from . import (
+    aggregates, analytics, assignments, buffering, caching, deletion, details, idempotency, jobs, leaderboards, roster
+)
+from .caching import cached_response
+from .exports import EXPORT_CONTENT_TYPES, arrow_available, export_extension, export_path, stream_shots
+from .fastpath import FastListMixin
+from .fieldsets import FieldSelectionMixin
+from .ingest import ingest_shots
+from .pagination import KeysetPageNumberPagination
+from .parsers import CSVParser, NDJSONParser
+
+
+def job_accepted(request, job, message):
+    """202 Accepted response pointing at a queued job's status"""
+    return Response({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': reverse('job-detail', args=[job.id], request=request),
+        'message': message
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+class BulkDeleteMixin:
+    """
+    bulk_delete action backed by the chunked deletes in golf_metrics_app.deletion.
 
+    With ``background`` set the delete runs as a job and its ID is returned
+    with 202 Accepted; poll /api/jobs/{id}/ for progress.
+    """
+
+    @action(detail=False, methods=['post'])
+    def bulk_delete(self, request):
+        """Bulk delete the given IDs, with their children when delete_children is set"""
+        serializer = BulkDeleteSerializer(data=request.data)
+        if serializer.is_valid():
+            model = self.queryset.model
+            ids = serializer.validated_data['ids']
+            delete_children = serializer.validated_data.get('delete_children', False)
+            noun = model._meta.verbose_name_plural.lower()
 
-class TournamentViewSet(viewsets.ModelViewSet):
+            try:
+                if serializer.validated_data.get('background'):
+                    job = jobs.enqueue('bulk_delete', {
+                        'model': model._meta.model_name,
+                        'ids': ids,
+                        'delete_children': delete_children,
+                    })
+                    return job_accepted(request, job, f'Deleting {len(ids)} {noun} in the background')
+
+                deleted_count = deletion.bulk_delete(model._meta.model_name, ids, delete_children)['deleted_count']
+                return Response({
+                    'success': True,
+                    'deleted_count': deleted_count,
+                    'message': f'Successfully deleted {deleted_count} {noun}'
+                })
+            except Exception as e:
+                return Response({
+                    'success': False,
+                    'error': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class TournamentViewSet(BulkDeleteMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     """
     ViewSet for Tournament CRUD operations
     """
@@ -22,6 +93,13 @@ class TournamentViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Filter tournaments based on query parameters"""
         queryset = Tournament.objects.all()
+        if self.action != 'leaderboard' and self.wants_fields('total_groups', 'total_golfers'):
+            queryset = queryset.with_counts()
+
+        if self.action == 'retrieve_with_groups':
+            queryset = queryset.prefetch_related(
+                Prefetch('groups', queryset=Group.objects.with_golfer_count().order_by('group_number'))
+            )
 
         # Filter by active status
         is_active = self.request.query_params.get('is_active')
@@ -33,55 +111,53 @@ class TournamentViewSet(viewsets.ModelViewSet):
         if search:
             queryset = queryset.filter(name__icontains=search)
 
-        return queryset.order_by('-start_date', 'name')
+        return self.select_fields(queryset).order_by('-start_date', 'name')
 
     @action(detail=True, methods=['get'])
+    @cached_response('tournament-with-groups', ('tournament', 'group', 'golfer'), tournament_from='pk')
     def retrieve_with_groups(self, request, pk=None):
         """Retrieve tournament with all its groups"""
         tournament = self.get_object()
         serializer = TournamentWithGroupsSerializer(tournament)
         return Response(serializer.data)
 
-    @action(detail=False, methods=['post'])
-    def bulk_delete(self, request):
-        """Bulk delete tournaments"""
-        serializer = BulkDeleteSerializer(data=request.data)
-        if serializer.is_valid():
-            ids = serializer.validated_data['ids']
-            delete_children = serializer.validated_data.get('delete_children', False)
-
-            try:
-                with transaction.atomic():
-                    tournaments = Tournament.objects.filter(id__in=ids)
-                    deleted_count = tournaments.count()
-
-                    if delete_children:
-                        # Delete all related data
-                        for tournament in tournaments:
-                            # Delete shots first
-                            Shot.objects.filter(golfer__group__tournament=tournament).delete()
-                            # Delete golfers
-                            Golfer.objects.filter(group__tournament=tournament).delete()
-                            # Delete groups
-                            Group.objects.filter(tournament=tournament).delete()
-
-                    tournaments.delete()
+    @action(detail=True, methods=['get'])
+    def leaderboard(self, request, pk=None):
+        """
+        Top shots per metric from the tournament's persisted leaderboard snapshot.
 
-                return Response({
-                    'success': True,
-                    'deleted_count': deleted_count,
-                    'message': f'Successfully deleted {deleted_count} tournaments'
-                })
-            except Exception as e:
-                return Response({
-                    'success': False,
-                    'error': str(e)
-                }, status=status.HTTP_400_BAD_REQUEST)
+        ?metric= (comma separated) picks the boards, ?shot_type= and ?club_used=
+        narrow them to one shot type and/or club, ?limit= trims each board.
+        """
+        tournament = self.get_object()
+        params = request.query_params
+        metrics = [name.strip() for name in params.get('metric', '').split(',') if name.strip()]
+        unknown = [name for name in metrics if name not in leaderboards.METRICS]
+        if unknown:
+            return Response({
+                'success': False,
+                'error': f"Unknown metric(s): {', '.join(unknown)}. Choose from: {', '.join(leaderboards.METRICS)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(params['limit']) if params.get('limit') else None
+            if limit is not None and limit < 1:
+                raise ValueError
+        except ValueError:
+            return Response({
+                'success': False,
+                'error': 'limit must be a positive integer'
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(leaderboards.read(
+            tournament.id,
+            metrics=metrics,
+            shot_type=params.get('shot_type', ''),
+            club_used=params.get('club_used', ''),
+            limit=limit,
+        ))
 
 
-class GroupViewSet(viewsets.ModelViewSet):
+class GroupViewSet(BulkDeleteMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     """
     ViewSet for Group CRUD operations
     """
@@ -90,7 +166,17 @@ class GroupViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Filter groups based on query parameters"""
-        queryset = Group.objects.select_related('tournament').prefetch_related('golfers')
+        queryset = Group.objects.select_related('tournament')
+
+        # Annotated counts go stale once golfers are moved, so only read actions use them
+        if self.action in ('list', 'retrieve', 'retrieve_with_golfers') and \
+                self.wants_fields('current_golfer_count', 'is_full', 'available_spots'):
+            queryset = queryset.with_golfer_count()
+        if self.action == 'retrieve_with_golfers':
+            # Prefetching sets each golfer's group, so nested group and tournament names need no queries
+            queryset = queryset.prefetch_related(
+                Prefetch('golfers', queryset=Golfer.objects.order_by('last_name', 'first_name', 'id'))
+            )
 
         # Filter by tournament
         tournament_id = self.request.query_params.get('tournament_id') or self.request.query_params.get('tournament')
@@ -110,36 +196,34 @@ class GroupViewSet(viewsets.ModelViewSet):
                 Q(group_number__icontains=search)
             )
 
-        return queryset.order_by('tournament__name', 'group_number')
+        return self.select_fields(queryset).order_by('tournament__name', 'group_number')
+
+    @cached_response('group-list', ('tournament', 'group', 'golfer'), tournament_from=('tournament_id', 'tournament'))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
     @action(detail=True, methods=['get'])
     def retrieve_with_golfers(self, request, pk=None):
-        """Retrieve group with all its golfers"""
+        """Retrieve group with all its golfers and a summary of the group's shots"""
         group = self.get_object()
-        serializer = GroupWithGolfersSerializer(group)
+        serializer = GroupWithGolfersSerializer(group, context={
+            'summary': aggregates.read_statistics(group_id=group.id),
+        })
         return Response(serializer.data)
 
     @action(detail=True, methods=['post'])
     def assign_golfers(self, request, pk=None):
         """Assign golfers to this group"""
         group = self.get_object()
-        serializer = GroupAssignmentSerializer(data=request.data)
+        serializer = GroupAssignmentSerializer(data=request.data, context={'group_id': group.id})
 
         if serializer.is_valid():
             golfer_ids = serializer.validated_data['golfer_ids']
+            reattribute_shots = serializer.validated_data.get('reattribute_shots', False)
 
             try:
-                with transaction.atomic():
-                    golfers = Golfer.objects.filter(id__in=golfer_ids)
-                    assigned_count = 0
-
-                    for golfer in golfers:
-                        if group.available_spots > 0:
-                            golfer.group = group
-                            golfer.save()
-                            assigned_count += 1
-                        else:
-                            break
+                result = assignments.assign_golfers({group.id: golfer_ids}, reattribute_shots)
+                assigned_count = result['assigned_count']
 
                 return Response({
                     'success': True,
@@ -154,17 +238,99 @@ class GroupViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'])
+    def bulk_create_groups(self, request):
+        """Create many groups with one contiguous block of group numbers"""
+        serializer = BulkGroupCreateSerializer(data=request.data)
+        if serializer.is_valid():
+            tournament_id = serializer.validated_data.get('tournament_id')
+            count = serializer.validated_data['count']
+            max_golfers = serializer.validated_data['max_golfers']
+
+            try:
+                tournament = Tournament.objects.get(id=tournament_id) if tournament_id else None
+                with transaction.atomic():
+                    numbers = Group.allocate_numbers(tournament_id, count)
+                    groups = Group.objects.bulk_create([
+                        Group(tournament=tournament, group_number=number, max_golfers=max_golfers)
+                        for number in numbers
+                    ])
+                    # bulk_create sends no signals
+                    caching.bump('group', [tournament_id])
+
+                for group in groups:
+                    group.golfer_count = 0
+                return Response({
+                    'success': True,
+                    'created_count': len(groups),
+                    'message': f'Successfully created {len(groups)} groups',
+                    'groups': GroupSerializer(groups, many=True).data
+                }, status=status.HTTP_201_CREATED)
+            except Exception as e:
+                return Response({
+                    'success': False,
+                    'error': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'])
+    def bulk_assign(self, request):
+        """
+        Assign golfers across many groups in one locked operation.
+
+        Takes either explicit ``assignments`` per group or a ``tournament_id``
+        whose open spots are filled in group number order.
+        """
+        serializer = BulkAssignmentSerializer(data=request.data)
+        if serializer.is_valid():
+            data = serializer.validated_data
+
+            try:
+                if 'tournament_id' in data:
+                    result = assignments.auto_fill_tournament(
+                        data['tournament_id'], data.get('golfer_ids'), data['reattribute_shots']
+                    )
+                else:
+                    plan = {}
+                    for placement in data['assignments']:
+                        plan.setdefault(placement['group_id'], []).extend(placement['golfer_ids'])
+                    result = assignments.assign_golfers(plan, data['reattribute_shots'])
+
+                return Response({
+                    'success': True,
+                    'message': f"Successfully assigned {result['assigned_count']} golfers to "
+                               f"{sum(1 for group in result['groups'] if group['assigned_count'])} groups",
+                    **result
+                })
+            except Exception as e:
+                return Response({
+                    'success': False,
+                    'error': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
     @action(detail=True, methods=['post'])
     def remove_golfers(self, request, pk=None):
         """Remove golfers from this group"""
         group = self.get_object()
         golfer_ids = request.data.get('golfer_ids', [])
+        reattribute_shots = str(request.data.get('reattribute_shots', False)).lower() == 'true'
 
         try:
             with transaction.atomic():
                 golfers = Golfer.objects.filter(id__in=golfer_ids, group=group)
-                removed_count = golfers.count()
+                removed_ids = list(golfers.values_list('id', flat=True))
+                removed_count = len(removed_ids)
                 golfers.update(group=None)
+                caching.bump('golfer')
+
+                # Shots keep the group they were recorded in unless asked otherwise
+                if reattribute_shots:
+                    Shot.objects.filter(golfer_id__in=removed_ids, group=group).attribute_to_group(None)
+                    caching.bump('shot', [group.tournament_id])
+                aggregates.refresh_golfers(removed_ids)
 
             return Response({
                 'success': True,
@@ -177,54 +343,19 @@ class GroupViewSet(viewsets.ModelViewSet):
                 'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
 
-    @action(detail=False, methods=['post'])
-    def bulk_delete(self, request):
-        """Bulk delete groups"""
-        serializer = BulkDeleteSerializer(data=request.data)
-        if serializer.is_valid():
-            ids = serializer.validated_data['ids']
-            delete_children = serializer.validated_data.get('delete_children', False)
-
-            try:
-                with transaction.atomic():
-                    groups = Group.objects.filter(id__in=ids)
-                    deleted_count = groups.count()
-
-                    if delete_children:
-                        # Delete all shots for golfers in these groups
-                        Shot.objects.filter(golfer__group__in=groups).delete()
-                        # Delete all golfers in these groups
-                        Golfer.objects.filter(group__in=groups).delete()
-                    else:
-                        # Just unassign golfers from groups
-                        Golfer.objects.filter(group__in=groups).update(group=None)
 
-                    groups.delete()
-
-                return Response({
-                    'success': True,
-                    'deleted_count': deleted_count,
-                    'message': f'Successfully deleted {deleted_count} groups'
-                })
-            except Exception as e:
-                return Response({
-                    'success': False,
-                    'error': str(e)
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-
-class GolferViewSet(viewsets.ModelViewSet):
+class GolferViewSet(BulkDeleteMixin, FastListMixin, viewsets.ModelViewSet):
     """
     ViewSet for Golfer CRUD operations
     """
     queryset = Golfer.objects.all()
     serializer_class = GolferSerializer
+    pagination_class = KeysetPageNumberPagination
+    keyset_ordering = ('last_name', 'first_name', 'id')
 
     def get_queryset(self):
         """Filter golfers based on query parameters"""
-        queryset = Golfer.objects.select_related('group__tournament').prefetch_related('shots')
+        queryset = Golfer.objects.select_related('group__tournament')
 
         # Filter by group
         group_id = self.request.query_params.get('group_id') or self.request.query_params.get('group')
@@ -256,13 +387,74 @@ class GolferViewSet(viewsets.ModelViewSet):
                 Q(email__icontains=search)
             )
 
-        return queryset.order_by('last_name', 'first_name')
+        return self.select_fields(queryset).order_by('last_name', 'first_name')
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser, CSVParser])
+    def import_roster(self, request):
+        """
+        Import or update golfers from a JSON, NDJSON or CSV roster, upserting on golfer_id.
+
+        Options: ?tournament_id= (to resolve group_number columns), ?dry_run=true,
+        ?reattribute_shots=true and ?background=true (run as a job, 202 Accepted).
+        """
+        rows = request.data
+        if isinstance(rows, dict):
+            rows = rows.get('golfers')
+        if not isinstance(rows, list) or not rows:
+            return Response({
+                'success': False,
+                'error': 'Expected a non-empty list of golfers.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > settings.GOLF_ROSTER_MAX_ROWS:
+            return Response({
+                'success': False,
+                'error': f'At most {settings.GOLF_ROSTER_MAX_ROWS} golfers can be imported per request.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        params = request.query_params
+        try:
+            tournament_id = params.get('tournament_id') or params.get('tournament')
+            options = {
+                'tournament_id': int(tournament_id) if tournament_id else None,
+                'dry_run': params.get('dry_run', '').lower() == 'true',
+                'reattribute_shots': params.get('reattribute_shots', '').lower() == 'true',
+            }
+            if params.get('background', '').lower() == 'true':
+                job = jobs.enqueue('import_roster', {'rows': rows, **options})
+                return job_accepted(request, job, f'Importing {len(rows)} golfers in the background')
+            result = roster.import_roster(rows, **options)
+        except Exception as e:
+            return Response({
+                'success': False,
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        written = result['created_count'] + result['updated_count']
+        verb = 'Would import' if result['dry_run'] else 'Imported'
+        return Response({
+            'success': result['error_count'] == 0,
+            **result,
+            'message': f"{verb} {written} of {result['received']} golfers "
+                       f"({result['created_count']} created, {result['updated_count']} updated)"
+        })
 
     @action(detail=True, methods=['get'])
     def retrieve_with_shots(self, request, pk=None):
-        """Retrieve golfer with all their shots"""
+        """
+        Retrieve golfer with their latest shots and a summary of all of them.
+
+        ?shot_limit= sizes the shot window (default GOLF_NESTED_SHOT_LIMIT);
+        follow shots_next (?shots_cursor=) for older shots. The summary and
+        shots_count come from the ShotAggregate store, so the query count does
+        not depend on how many shots the golfer has.
+        """
         golfer = self.get_object()
-        serializer = GolferWithShotsSerializer(golfer)
+        shots, shots_next = details.shot_window(Shot.objects.filter(golfer_id=golfer.id), request)
+        serializer = GolferWithShotsSerializer(golfer, context={
+            'shots': shots,
+            'shots_next': shots_next,
+            'summary': aggregates.read_statistics(golfer_id=golfer.id),
+        })
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
@@ -272,86 +464,173 @@ class GolferViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
-    @action(detail=False, methods=['post'])
-    def bulk_delete(self, request):
-        """Bulk delete golfers"""
-        serializer = BulkDeleteSerializer(data=request.data)
-        if serializer.is_valid():
-            ids = serializer.validated_data['ids']
-            delete_children = serializer.validated_data.get('delete_children', False)
-
-            try:
-                with transaction.atomic():
-                    golfers = Golfer.objects.filter(id__in=ids)
-                    deleted_count = golfers.count()
-
-                    if delete_children:
-                        # Delete all shots for these golfers
-                        Shot.objects.filter(golfer__in=golfers).delete()
-
-                    golfers.delete()
-
-                return Response({
-                    'success': True,
-                    'deleted_count': deleted_count,
-                    'message': f'Successfully deleted {deleted_count} golfers'
-                })
-            except Exception as e:
-                return Response({
-                    'success': False,
-                    'error': str(e)
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-
-class ShotViewSet(viewsets.ModelViewSet):
+class ShotViewSet(BulkDeleteMixin, FastListMixin, viewsets.ModelViewSet):
     """
     ViewSet for Shot CRUD operations
     """
     queryset = Shot.objects.all()
     serializer_class = ShotSerializer
+    pagination_class = KeysetPageNumberPagination
+    keyset_ordering = ('-timestamp', '-id')
+    # Columns accepted by ?ordering= (prefix with '-' for descending)
+    ordering_fields = (
+        'timestamp', 'shot_number', 'ball_speed', 'carry_distance', 'total_distance', 'smash_factor',
+    )
 
     def get_queryset(self):
         """Filter shots based on query parameters"""
-        queryset = Shot.objects.select_related('golfer__group__tournament')
-
-        # Filter by golfer
-        golfer_id = self.request.query_params.get('golfer_id') or self.request.query_params.get('golfer')
-        if golfer_id:
-            queryset = queryset.filter(golfer_id=golfer_id)
-
-        # Filter by group
-        group_id = self.request.query_params.get('group_id') or self.request.query_params.get('group')
-        if group_id:
-            queryset = queryset.filter(golfer__group_id=group_id)
-
-        # Filter by tournament
-        tournament_id = self.request.query_params.get('tournament_id') or self.request.query_params.get('tournament')
-        if tournament_id:
-            queryset = queryset.filter(golfer__group__tournament_id=tournament_id)
-
-        # Filter by unassigned (no golfer)
-        unassigned = self.request.query_params.get('unassigned')
-        if unassigned and unassigned.lower() == 'true':
-            queryset = queryset.filter(golfer__isnull=True)
-
-        # Filter by shot type
-        shot_type = self.request.query_params.get('shot_type')
-        if shot_type:
-            queryset = queryset.filter(shot_type=shot_type)
+        queryset = self.select_fields(Shot.objects.select_related('golfer', 'group', 'tournament'))
+        return self.filter_by_params(queryset).order_by(*self.get_ordering())
+
+    def get_ordering(self):
+        """
+        Order from ?ordering=, e.g. -smash_factor,timestamp. Missing values sort
+        last and id breaks ties. Keyset pages (?cursor=) keep keyset_ordering.
+        """
+        requested = [name.strip() for name in self.request.query_params.get('ordering', '').split(',') if name.strip()]
+        if not requested:
+            return ['-timestamp', 'shot_number']
+        unknown = [name for name in requested if name.lstrip('-') not in self.ordering_fields]
+        if unknown:
+            raise ValidationError({
+                'ordering': [f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(self.ordering_fields)}."]
+            })
+        ordering = [
+            F(name[1:]).desc(nulls_last=True) if name.startswith('-') else F(name).asc(nulls_last=True)
+            for name in requested
+        ]
+        return ordering + ['id']
+
+    def filter_by_params(self, queryset):
+        """Apply the query parameter filters shared by list, statistics and export"""
+        try:
+            return queryset.filter_by_params(self.request.query_params)
+        except DjangoValidationError as e:
+            raise ValidationError(e.message_dict)
+
+    def create(self, request, *args, **kwargs):
+        """
+        Create a shot, once per launch monitor submission.
+
+        A retry carrying the same Idempotency-Key header (or idempotency_key
+        field), or the same launch_monitor_id and timestamp, gets the original
+        shot back with 200 and an Idempotent-Replayed header.
+
+        With the write buffer enabled (GOLF_SHOT_BUFFER_ENABLED), ?buffered=true
+        validates the shot, queues it for the next bulk insert and returns 202
+        with a provisional ID; /api/shots/buffer/?provisional_id= reports the
+        shot's ID once it is written.
+        """
+        row = request.data.dict() if hasattr(request.data, 'dict') else request.data
+        if not isinstance(row, dict):
+            return Response({
+                'success': False,
+                'error': 'Expected a single shot object.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        header_key = request.headers.get(idempotency.IDEMPOTENCY_HEADER)
+        if header_key:
+            row = {**row, 'idempotency_key': header_key}
+        try:
+            key = idempotency.payload_key(row)
+        except ValidationError as e:
+            return Response({'idempotency_key': e.detail}, status=status.HTTP_400_BAD_REQUEST)
+
+        original = idempotency.find_original(key) if key else None
+        if original is not None:
+            return self.replay(original)
+        if buffering.is_enabled() and request.query_params.get('buffered', '').lower() == 'true':
+            return self.create_buffered(request, row)
+
+        serializer = self.get_serializer(data=row)
+        serializer.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                serializer.save(ingest_key=key)
+        except IntegrityError:
+            # Another request wrote the same submission first
+            original = idempotency.find_original(key, check_database=True) if key else None
+            if original is None:
+                raise
+            return self.replay(original)
+        if key:
+            idempotency.get_recent_keys().add(key, serializer.instance.pk)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=self.get_success_headers(serializer.data))
+
+    def replay(self, shot):
+        """The response to a retried submission: the shot it created the first time"""
+        return Response(self.get_serializer(shot).data, headers={idempotency.REPLAYED_HEADER: 'true'})
+
+    def create_buffered(self, request, row):
+        """Queue a validated shot in the write buffer and return its provisional ID"""
+        try:
+            provisional_id, errors = buffering.get_buffer().submit(row)
+        except buffering.BufferFull as e:
+            response = Response({
+                'success': False,
+                'error': str(e)
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = '1'
+            return response
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
 
-        # Filter by club
-        club_used = self.request.query_params.get('club_used')
-        if club_used:
-            queryset = queryset.filter(club_used=club_used)
+        status_url = reverse('shot-buffer', request=request)
+        return Response({
+            'success': True,
+            'provisional_id': provisional_id,
+            'status_url': f'{status_url}?provisional_id={provisional_id}',
+            'message': 'Shot queued for writing'
+        }, status=status.HTTP_202_ACCEPTED)
 
-        # Filter by hole number
-        hole_number = self.request.query_params.get('hole_number')
-        if hole_number:
-            queryset = queryset.filter(hole_number=hole_number)
+    @action(detail=False, methods=['get'])
+    def buffer(self, request):
+        """
+        Write buffer counters for this worker process, or with ?provisional_id=
+        whether that buffered shot has been written and its ID.
+        """
+        if not buffering.is_enabled():
+            return Response({'enabled': False})
+        buffer = buffering.get_buffer()
+        provisional_id = request.query_params.get('provisional_id')
+        if provisional_id:
+            return Response({'provisional_id': provisional_id, **buffer.resolve(provisional_id)})
+        return Response({'enabled': True, **buffer.statistics()})
 
-        return queryset.order_by('-timestamp', 'shot_number')
+    @action(detail=False, methods=['post'])
+    def reserve_numbers(self, request):
+        """
+        Reserve a contiguous block of shot numbers for a golfer (or their
+        strokes on a hole of their current tournament), for clients that
+        number shots before they can submit them. Shots posted without a
+        shot_number are numbered by the server and need no reservation.
+        """
+        serializer = ShotNumberReservationSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        golfer_id = serializer.validated_data.get('golfer_id')
+        hole_number = serializer.validated_data.get('hole_number')
+        count = serializer.validated_data['count']
+
+        tournament_id = None
+        if golfer_id is not None:
+            placement = Golfer.objects.filter(pk=golfer_id).values_list('group__tournament_id', flat=True)
+            if not placement:
+                return Response({
+                    'success': False,
+                    'error': f'Golfer {golfer_id} does not exist.'
+                }, status=status.HTTP_404_NOT_FOUND)
+            tournament_id = placement[0]
+        numbers = Shot.allocate_numbers(golfer_id, count, tournament_id if hole_number else None, hole_number)
+        return Response({
+            'success': True,
+            'golfer_id': golfer_id,
+            'tournament_id': tournament_id if hole_number else None,
+            'hole_number': hole_number,
+            'first_shot_number': numbers[0],
+            'last_shot_number': numbers[-1],
+            'count': len(numbers)
+        }, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['get'])
     def unassigned(self, request):
@@ -361,22 +640,22 @@ class ShotViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
+    @cached_response('shot-statistics', ('shot',), tournament_from=('tournament_id', 'tournament'))
     def statistics(self, request):
-        """Get shot statistics"""
-        queryset = self.get_queryset()
+        """
+        Get shot statistics.
 
-        # Apply same filters as main queryset
-        golfer_id = self.request.query_params.get('golfer_id')
-        if golfer_id:
-            queryset = queryset.filter(golfer_id=golfer_id)
+        Served from the incrementally maintained ShotAggregate store unless a
+        filter is not part of the bucket key (hole_number, smash factor range,
+        since/until) or ?live=true.
+        """
+        params = self.request.query_params
+        live = params.get('live', '').lower() == 'true'
+        bucket_filters = self.aggregate_filters()
+        if not live and bucket_filters is not None:
+            return Response(aggregates.read_statistics(**bucket_filters))
 
-        group_id = self.request.query_params.get('group_id')
-        if group_id:
-            queryset = queryset.filter(golfer__group_id=group_id)
-
-        tournament_id = self.request.query_params.get('tournament_id')
-        if tournament_id:
-            queryset = queryset.filter(golfer__group__tournament_id=tournament_id)
+        queryset = self.filter_by_params(Shot.objects.all())
 
         # Calculate statistics
         stats = queryset.aggregate(
@@ -387,12 +666,15 @@ class ShotViewSet(viewsets.ModelViewSet):
             avg_spin_rate=Avg('spin_rate'),
             avg_carry_distance=Avg('carry_distance'),
             avg_total_distance=Avg('total_distance'),
+            avg_smash_factor=Avg('smash_factor'),
             max_ball_speed=Max('ball_speed'),
             max_carry_distance=Max('carry_distance'),
             max_total_distance=Max('total_distance'),
+            max_smash_factor=Max('smash_factor'),
             min_ball_speed=Min('ball_speed'),
             min_carry_distance=Min('carry_distance'),
             min_total_distance=Min('total_distance'),
+            min_smash_factor=Min('smash_factor'),
         )
 
         # Add shot type breakdown
@@ -406,7 +688,7 @@ class ShotViewSet(viewsets.ModelViewSet):
         club_breakdown = list(
             queryset.exclude(club_used__isnull=True)
             .values('club_used')
-            .annotate(count=Count('id'))
+            .annotate(count=Count('id'), avg_smash_factor=Avg('smash_factor'), max_smash_factor=Max('smash_factor'))
             .order_by('-count')
         )
 
@@ -416,28 +698,246 @@ class ShotViewSet(viewsets.ModelViewSet):
             'club_breakdown': club_breakdown
         })
 
+    @action(detail=False, methods=['get'])
+    @cached_response('shot-analytics', ('shot',), tournament_from=('tournament_id', 'tournament'))
+    def analytics(self, request):
+        """
+        Distributions, percentiles, smash factor, dispersion ellipses and club gapping.
+
+        Computed with NumPy over per-tournament column arrays. Accepts the list
+        filters plus ?metrics=, ?percentiles=, ?bins= and ?confidence=.
+        """
+        params = request.query_params
+        try:
+            tournament_id = params.get('tournament_id') or params.get('tournament')
+            golfer_id = params.get('golfer_id') or params.get('golfer')
+            group_id = params.get('group_id') or params.get('group')
+            filters = {
+                'golfer_id': int(golfer_id) if golfer_id else None,
+                'group_id': int(group_id) if group_id else None,
+                'unassigned': params.get('unassigned', '').lower() == 'true',
+                'shot_type': params.get('shot_type') or None,
+                'club_used': params.get('club_used') or None,
+                'hole_number': int(params['hole_number']) if params.get('hole_number') else None,
+            }
+            result = analytics.analyze(
+                tournament_id=int(tournament_id) if tournament_id else None,
+                filters=filters,
+                metrics=[name for name in params.get('metrics', '').split(',') if name] or None,
+                percentiles=[float(value) for value in params.get('percentiles', '').split(',') if value] or None,
+                bins=int(params.get('bins', 20)),
+                confidence=float(params.get('confidence', 0.95))
+            )
+        except (ValueError, analytics.AnalyticsError) as e:
+            return Response({
+                'success': False,
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+    def aggregate_filters(self):
+        """Translate query parameters into ShotAggregate filters, or None if unsupported"""
+        params = self.request.query_params
+        # Shot fields the buckets are not keyed on can only be answered by the live query
+        unbucketed = ('hole_number', 'min_smash_factor', 'max_smash_factor', 'since', 'until')
+        if any(params.get(name) for name in unbucketed):
+            return None
+
+        filters = {}
+        for name, keys in (
+            ('golfer_id', ('golfer_id', 'golfer')),
+            ('group_id', ('group_id', 'group')),
+            ('tournament_id', ('tournament_id', 'tournament')),
+        ):
+            value = params.get(keys[0]) or params.get(keys[1])
+            if value:
+                try:
+                    filters[name] = int(value)
+                except ValueError:
+                    return None
+        unassigned = params.get('unassigned')
+        if unassigned and unassigned.lower() == 'true':
+            filters['golfer_id'] = 0
+        for name in ('shot_type', 'club_used'):
+            if params.get(name):
+                filters[name] = params[name]
+        return filters
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream filtered shots as CSV, NDJSON, Parquet or Arrow.
+
+        The format is chosen with ?export_format= (DRF reserves ?format= for
+        renderer selection). Rows are read with a server-side cursor and
+        written chunk by chunk, so memory use does not grow with the export.
+        With ?background=true the file is written by a job instead and fetched
+        from /api/jobs/{id}/download/ once it succeeds.
+        """
+        file_format = request.query_params.get('export_format', 'csv').lower()
+        if file_format not in EXPORT_CONTENT_TYPES:
+            return Response({
+                'success': False,
+                'error': f"Unsupported export format '{file_format}'. "
+                         f"Choose one of: {', '.join(EXPORT_CONTENT_TYPES)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if file_format in ('parquet', 'arrow') and not arrow_available():
+            return Response({
+                'success': False,
+                'error': f'The {file_format} export format requires pyarrow to be installed.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.filter_by_params(Shot.objects.all()).order_by('-timestamp', 'shot_number')
+        if request.query_params.get('background', '').lower() == 'true':
+            filters = {
+                name: value for name, value in request.query_params.items()
+                if name not in ('background', 'export_format', 'format')
+            }
+            job = jobs.enqueue('export_shots', {'filters': filters, 'file_format': file_format})
+            return job_accepted(request, job, f'Exporting shots as {file_format} in the background')
+
+        response = StreamingHttpResponse(
+            stream_shots(queryset, file_format, asynchronous=isinstance(request._request, ASGIRequest)),
+            content_type=EXPORT_CONTENT_TYPES[file_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="shots.{export_extension(file_format)}"'
+        return response
+
     @action(detail=False, methods=['post'])
-    def bulk_delete(self, request):
-        """Bulk delete shots"""
-        serializer = BulkDeleteSerializer(data=request.data)
-        if serializer.is_valid():
-            ids = serializer.validated_data['ids']
+    def rebuild_aggregates(self, request):
+        """Recompute the per-golfer statistics aggregates as a background job"""
+        job = jobs.enqueue('rebuild_aggregates')
+        return job_accepted(request, job, 'Rebuilding shot aggregates in the background')
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk_ingest(self, request):
+        """
+        Bulk ingest launch monitor shots from a JSON array or NDJSON body.
+
+        Rows repeating a submission already ingested (same idempotency_key, or
+        same launch_monitor_id and timestamp) are listed under duplicates with
+        the original shot's ID instead of being written again.
+        """
+        rows = request.data
+        if isinstance(rows, dict):
+            rows = rows.get('shots')
+        if not isinstance(rows, list) or not rows:
+            return Response({
+                'success': False,
+                'error': 'Expected a non-empty list of shots.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > settings.GOLF_INGEST_MAX_ROWS:
+            return Response({
+                'success': False,
+                'error': f'At most {settings.GOLF_INGEST_MAX_ROWS} shots can be ingested per request.'
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-            try:
-                with transaction.atomic():
-                    shots = Shot.objects.filter(id__in=ids)
-                    deleted_count = shots.count()
-                    shots.delete()
+        try:
+            result = ingest_shots(rows)
+        except Exception as e:
+            return Response({
+                'success': False,
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if result['created_count']:
+            response_status = status.HTTP_201_CREATED
+        elif result['duplicate_count']:
+            # Every valid row was a retry of shots already written
+            response_status = status.HTTP_200_OK
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({
+            'success': response_status != status.HTTP_400_BAD_REQUEST,
+            **result,
+            'message': f"Ingested {result['created_count']} of {result['received']} shots"
+                       f" ({result['duplicate_count']} already ingested)"
+        }, status=response_status)
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Status and progress of background jobs
+    """
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        """Filter jobs based on query parameters"""
+        queryset = Job.objects.all()
+
+        # Filter by status
+        job_status = self.request.query_params.get('status')
+        if job_status:
+            queryset = queryset.filter(status=job_status)
+
+        # Filter by kind
+        kind = self.request.query_params.get('kind')
+        if kind:
+            queryset = queryset.filter(kind=kind)
+
+        return queryset
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Cancel a pending job, or ask a running one to stop at its next progress report"""
+        job = self.get_object()
+        if not jobs.cancel(job):
+            return Response({
+                'success': False,
+                'error': f'Job {job.id} has already {job.status}.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        job.refresh_from_db()
+        return Response({
+            'success': True,
+            'job': JobSerializer(job).data,
+            'message': 'Job cancelled' if job.status == 'cancelled' else 'Cancellation requested'
+        })
+
+    @action(detail=True, methods=['post'])
+    def retry(self, request, pk=None):
+        """Queue a failed or cancelled job again"""
+        job = self.get_object()
+        if not jobs.retry(job):
+            return Response({
+                'success': False,
+                'error': f'Only failed or cancelled jobs can be retried; job {job.id} is {job.status}.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return job_accepted(request, job, f'Job {job.id} queued again')
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Download the file written by a succeeded export_shots job"""
+        job = self.get_object()
+        if job.kind != 'export_shots' or job.status != 'succeeded':
+            return Response({
+                'success': False,
+                'error': f'Job {job.id} has no file to download.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        path = export_path(job.id, job.params['file_format'])
+        if not path.exists():
+            return Response({
+                'success': False,
+                'error': f'The export file of job {job.id} no longer exists.'
+            }, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename=job.result['file_name'],
+            content_type=job.result['content_type']
+        )
+
+
+@api_view(['GET'])
+def cache_statistics(request):
+    """Response cache hit/miss counters for this worker process"""
+    return Response(caching.statistics())
 
-                return Response({
-                    'success': True,
-                    'deleted_count': deleted_count,
-                    'message': f'Successfully deleted {deleted_count} shots'
-                })
-            except Exception as e:
-                return Response({
-                    'success': False,
-                    'error': str(e)
-                }, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+@api_view(['GET'])
+def shot_stream_unavailable(request):
+    """Reached only when the app is not served through asgi.py, whose wrapper answers the stream itself"""
+    return Response({
+        'success': False,
+        'error': 'The shot stream needs the ASGI server: run uvicorn gcagolfapp_backend.asgi:application'
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
@@ -20,7 +20,6 @@ import { useForm } from '@mantine/form';
 import { IconAlertCircle, IconTarget, IconClock, IconRuler } from '@tabler/icons-react';
 import { Shot, ShotCreate } from '../../types';
 import { useGolfers } from '../../hooks/useGolfers';
-import { useShots } from '../../hooks/useShots';
 import { SHOT_TYPES, CLUBS } from '../../utils/constants';
 
 interface ShotFormProps {
@@ -40,25 +39,11 @@ export const ShotForm: React.FC<ShotFormProps> = ({
 }) => {
   const isEdit = Boolean(shot);
   const { golfers } = useGolfers();
-  const { shots } = useShots(); // Get existing shots to determine next shot number
-
-  // Auto-generate shot number
-  const generateShotNumber = (golferId?: number) => {
-    if (!golferId) return 1;
-
-    // Find the highest shot number for this golfer
-    const golferShots = shots.filter(s => s.golfer === golferId);
-    const maxShotNumber = golferShots.length > 0
-      ? Math.max(...golferShots.map(s => s.shot_number))
-      : 0;
-
-    return maxShotNumber + 1;
-  };
 
   const form = useForm<ShotCreate>({
     initialValues: {
       golfer: shot?.golfer || preselectedGolfer || undefined,
-      shot_number: shot?.shot_number || 1,
+      shot_number: shot?.shot_number || undefined,
       hole_number: shot?.hole_number || undefined,
       shot_type: shot?.shot_type || 'drive',
       club_used: shot?.club_used || '',
@@ -82,7 +67,8 @@ export const ShotForm: React.FC<ShotFormProps> = ({
         return null;
       },
       shot_number: (value) => {
-        if (!value || value < 1) {
+        // Left blank, the backend assigns the golfer's next shot number
+        if (value !== undefined && value !== null && value < 1) {
           return 'Shot number must be 1 or greater';
         }
         return null;
@@ -158,28 +144,20 @@ export const ShotForm: React.FC<ShotFormProps> = ({
   useEffect(() => {
     if (preselectedGolfer && !isEdit) {
       form.setFieldValue('golfer', preselectedGolfer);
-      // Auto-generate shot number for this golfer
-      const nextShotNumber = generateShotNumber(preselectedGolfer);
-      form.setFieldValue('shot_number', nextShotNumber);
     }
   }, [preselectedGolfer, isEdit]); // eslint-disable-line react-hooks/exhaustive-deps
 
-  // Update shot number when golfer changes
   const handleGolferChange = (golferId: number | undefined) => {
     form.setFieldValue('golfer', golferId);
-    if (golferId && !isEdit) {
-      const nextShotNumber = generateShotNumber(golferId);
-      form.setFieldValue('shot_number', nextShotNumber);
-    }
   };
 
   const handleSubmit = async (values: ShotCreate) => {
     try {
-      // Ensure shot_number is set
-      const submitData: ShotCreate = {
-        ...values,
-        shot_number: values.shot_number || generateShotNumber(values.golfer),
-      };
+      // Without a shot_number the backend allocates the next one atomically
+      const submitData: ShotCreate = { ...values };
+      if (!submitData.shot_number) {
+        delete submitData.shot_number;
+      }
 
       await onSubmit(submitData);
 
@@ -188,7 +166,6 @@ export const ShotForm: React.FC<ShotFormProps> = ({
         // Keep golfer selection if it was preselected
         if (preselectedGolfer) {
           form.setFieldValue('golfer', preselectedGolfer);
-          form.setFieldValue('shot_number', generateShotNumber(preselectedGolfer));
         }
         form.setFieldValue('shot_type', 'drive');
         form.setFieldValue('is_simulated', false);
@@ -264,12 +241,12 @@ export const ShotForm: React.FC<ShotFormProps> = ({
             <Grid.Col span={2}>
               <NumberInput
                 label="Shot #"
-                placeholder="1"
+                placeholder="Auto"
                 min={1}
                 max={999}
                 {...form.getInputProps('shot_number')}
                 disabled={loading}
-                description="Auto-generated"
+                description="Assigned by the server when blank"
               />
             </Grid.Col>
             <Grid.Col span={2}>
@@ -2,6 +2,7 @@
 // ------------------------------------
 import { useState, useEffect, useCallback } from 'react';
 import { apiService } from '../services/api';
+import { API_BASE_URL } from '../utils/constants';
 import { Shot, ShotCreate, BulkDeleteRequest } from '../types';
 import { notifications } from '@mantine/notifications';
 
@@ -150,6 +151,29 @@ export const useShots = (options?: UseShotsOptions) => {
     fetchShots();
   }, [fetchShots]);
 
+  // Live shots pushed by the backend instead of re-polling the list
+  useEffect(() => {
+    if (typeof EventSource === 'undefined') return;
+
+    const params = new URLSearchParams();
+    if (options?.golferId) params.set('golfer', String(options.golferId));
+    if (options?.groupId) params.set('group', String(options.groupId));
+    if (options?.tournamentId) params.set('tournament', String(options.tournamentId));
+    const source = new EventSource(`${API_BASE_URL}/shots/stream/?${params.toString()}`);
+
+    source.addEventListener('shot', (event) => {
+      const shot: Shot = JSON.parse((event as MessageEvent).data);
+      if (options?.unassigned && shot.golfer) return;
+      setShots(prev => (prev.some(s => s.id === shot.id) ? prev : [shot, ...prev]));
+    });
+    // Sent after bulk loads whose shots could not be pushed individually
+    source.addEventListener('resync', () => {
+      fetchShots();
+    });
+
+    return () => source.close();
+  }, [options?.golferId, options?.groupId, options?.tournamentId, options?.unassigned, fetchShots]);
+
   return {
     shots,
     loading,
@@ -9,6 +9,8 @@ Write-Host "Running Django makemigrations and migrate..."
 Push-Location $BackendPath
 python manage.py makemigrations golf_metrics_app
 python manage.py migrate
+Write-Host "Verifying shot aggregates (rebuilds them if they are out of date)..."
+python manage.py check_shot_aggregates --fix
 Pop-Location
 Write-Host "Migrations complete."
 Read-Host -Prompt "Press Enter to exit"
@@ -14,8 +14,12 @@ if (Test-Path $BackendEnvFile) {
 if (-not (Test-Path $VenvPath)) { Write-Error "Venv not found: $VenvPath"; exit 1 }
 Write-Host "Activating venv..."
 & $VenvPath
-Write-Host "Starting Waitress on port $BackendPort for gcagolfapp_backend..."
+Write-Host "Starting Uvicorn on port $BackendPort for gcagolfapp_backend..."
 Push-Location $BackendPath
-waitress-serve --port=$BackendPort gcagolfapp_backend.wsgi:application
+Write-Host "Writing shots left in shot buffer spill files..."
+python manage.py flush_shot_buffer --older-than 0
+Write-Host "Creating upcoming monthly shot partitions..."
+python manage.py manage_shot_partitions
+uvicorn --port $BackendPort gcagolfapp_backend.asgi:application
 Pop-Location
 Read-Host -Prompt "Press Enter to exit"
@@ -5,8 +5,8 @@ $BackendPath = Join-Path -Path $ProjectRoot -ChildPath "backend"
 if (-not (Test-Path $VenvPath)) { Write-Error "Venv not found: $VenvPath"; exit 1 }
 Write-Host "Activating venv..."
 & $VenvPath
-Write-Host "Starting Django development server..."
+Write-Host "Starting Uvicorn with auto-reload (runserver cannot serve the shot stream)..."
 Push-Location $BackendPath
-python manage.py runserver
+uvicorn --reload --port 8000 gcagolfapp_backend.asgi:application
 Pop-Location
 Read-Host -Prompt "Press Enter to exit"
@@ -0,0 +1,21 @@
+﻿# start_workers.ps1
+$ProjectRoot = $PSScriptRoot | Split-Path
+$VenvPath = Join-Path -Path $ProjectRoot -ChildPath "venv_backend\Scripts\Activate.ps1"
+$BackendPath = Join-Path -Path $ProjectRoot -ChildPath "backend"
+$BackendEnvFile = Join-Path -Path $BackendPath -ChildPath ".env.backend"
+$WorkerProcesses = "2"
+
+if (Test-Path $BackendEnvFile) {
+    Get-Content $BackendEnvFile | ForEach-Object {
+        if ($_ -match "^\s*GOLF_WORKER_PROCESSES\s*=\s*(.+)") { $WorkerProcesses = $Matches[1].Trim() }
+    }
+} else { Write-Warning ".env.backend not found. Using $WorkerProcesses workers." }
+
+if (-not (Test-Path $VenvPath)) { Write-Error "Venv not found: $VenvPath"; exit 1 }
+Write-Host "Activating venv..."
+& $VenvPath
+Write-Host "Starting $WorkerProcesses background job workers for gcagolfapp_backend..."
+Push-Location $BackendPath
+python manage.py run_workers --processes $WorkerProcesses
+Pop-Location
+Read-Host -Prompt "Press Enter to exit"
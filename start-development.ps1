@@ -55,12 +55,12 @@ function Start-Backend {
 
     if ($ProductionMode) {
         $backendScript = @"
-Write-Host 'Starting GCAGolfApp Backend (Production - Waitress)...' -ForegroundColor Green
+Write-Host 'Starting GCAGolfApp Backend (Production - Uvicorn)...' -ForegroundColor Green
 Set-Location '$BackendPath'
 & '$VenvPath'
 Write-Host 'Virtual environment activated' -ForegroundColor Yellow
-Write-Host 'Starting Waitress server...' -ForegroundColor Yellow
-waitress-serve --port=8000 gcagolfapp_backend.wsgi:application
+Write-Host 'Starting Uvicorn server...' -ForegroundColor Yellow
+uvicorn --port 8000 gcagolfapp_backend.asgi:application
 "@
     } else {
         $backendScript = @"
@@ -68,8 +68,8 @@ Write-Host 'Starting GCAGolfApp Backend (Development)...' -ForegroundColor Green
 Set-Location '$BackendPath'
 & '$VenvPath'
 Write-Host 'Virtual environment activated' -ForegroundColor Yellow
-Write-Host 'Starting Django development server...' -ForegroundColor Yellow
-python manage.py runserver
+Write-Host 'Starting Uvicorn with auto-reload (runserver cannot serve the shot stream)...' -ForegroundColor Yellow
+uvicorn --reload --port 8000 gcagolfapp_backend.asgi:application
 "@
     }
 